@@ -3,6 +3,10 @@ ASGI config for aquaalert_project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serving the project through this entry point (for example with uvicorn or daphne)
+enables the live dashboard stream at /api/dashboard-stream/. Under WSGI the
+dashboard falls back to polling /api/dashboard-data/.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -9,7 +9,8 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = os.environ.get('SECRET_KEY', 'a-default-secret-key-for-local-development')
 DEBUG = os.environ.get('DEBUG', 'False').lower() == 'true'
 
-ALLOWED_HOSTS = []
+# Comma-separated extra hosts, e.g. ALLOWED_HOSTS=127.0.0.1,localhost for local load tests
+ALLOWED_HOSTS = [host for host in os.environ.get('ALLOWED_HOSTS', '').split(',') if host]
 RENDER_EXTERNAL_HOSTNAME = os.environ.get('RENDER_EXTERNAL_HOSTNAME')
 if RENDER_EXTERNAL_HOSTNAME:
     ALLOWED_HOSTS.append(RENDER_EXTERNAL_HOSTNAME)
@@ -27,6 +28,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware', # Per-view latency/DB metrics, served at /metrics/
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware', # For static files
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -66,6 +68,48 @@ DATABASES = {
     )
 }
 
+# Dashboard, history and export reads can go to a separate read alias (see core/routers.py).
+# DATABASE_READ_URL names a replica; with SQLite it can simply be the same file, which gives
+# those reads their own query-only connections.
+DATABASE_READ_ALIAS = 'read'
+if os.environ.get('DATABASE_READ_URL'):
+    DATABASES[DATABASE_READ_ALIAS] = dj_database_url.parse(os.environ['DATABASE_READ_URL'], conn_max_age=600)
+    DATABASES[DATABASE_READ_ALIAS]['TEST'] = {'MIRROR': 'default'}
+DATABASE_ROUTERS = ['core.routers.ReadWriteRouter']
+
+# SQLite: wait for locks instead of failing at once, and take the write lock when a transaction
+# starts. A deferred transaction that reads and then writes can't wait its turn in WAL mode if
+# another write committed in between, and fails with "database is locked" instead.
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    DATABASES['default'].setdefault('OPTIONS', {}).update({
+        'timeout': float(os.environ.get('SQLITE_BUSY_TIMEOUT', 20)),
+        'transaction_mode': 'IMMEDIATE',
+    })
+# Pragmas set on every new SQLite connection (core.signals.tune_sqlite_connection). WAL lets
+# readers run alongside a writer, and synchronous=NORMAL is durable across application crashes
+# in WAL mode (only a power cut can lose the last commits). cache_size is negative KiB per connection.
+SQLITE_PRAGMAS = {
+    'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'cache_size': -int(os.environ.get('SQLITE_CACHE_KB', 20000)),
+    'temp_store': 'MEMORY',
+}
+
+# --- CACHE ---
+# Local memory by default, so nothing external is needed. Point CACHE_BACKEND/CACHE_LOCATION
+# at a shared cache (e.g. Redis) when running several worker processes.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'aquaalert'),
+    }
+}
+
+# --- SESSIONS ---
+# Sessions are read from the cache and written through to the database, so polling endpoints
+# such as the session heartbeat don't query the sessions table.
+SESSION_ENGINE = os.environ.get('SESSION_ENGINE', 'django.contrib.sessions.backends.cached_db')
+
 # --- PASSWORD AND USER SETTINGS ---
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -74,6 +118,8 @@ AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator'},
 ]
 AUTH_USER_MODEL = 'core.CustomUser'
+# Log in with a username, email or phone number (see core/backends.py)
+AUTHENTICATION_BACKENDS = ['core.backends.IdentifierBackend']
 
 # --- INTERNATIONALIZATION ---
 LANGUAGE_CODE = 'en-us'
@@ -88,4 +134,40 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 
 # --- OTHER SETTINGS ---
-DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
\ No newline at end of file
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# --- AQUAALERT SETTINGS ---
+# Largest number of readings accepted in one batched water quality request
+WATER_QUALITY_MAX_BATCH = int(os.environ.get('WATER_QUALITY_MAX_BATCH', 5000))
+# Largest number of offline health reports accepted in one sync request
+HEALTH_REPORT_MAX_BATCH = int(os.environ.get('HEALTH_REPORT_MAX_BATCH', 500))
+# Oldest report time accepted from a device, in days; older reports are rejected
+HEALTH_REPORT_MAX_AGE_DAYS = int(os.environ.get('HEALTH_REPORT_MAX_AGE_DAYS', 30))
+# How often a live dashboard stream checks for new data, and how long before it is recycled
+DASHBOARD_STREAM_CHECK_SECONDS = int(os.environ.get('DASHBOARD_STREAM_CHECK_SECONDS', 1))
+DASHBOARD_STREAM_MAX_SECONDS = int(os.environ.get('DASHBOARD_STREAM_MAX_SECONDS', 300))
+# How long a built dashboard payload stays cached (it is also replaced whenever data changes)
+DASHBOARD_CACHE_SECONDS = int(os.environ.get('DASHBOARD_CACHE_SECONDS', 3600))
+# Dashboard clients that poll with ?since=<cursor> get deltas, and a full payload again after this long
+DASHBOARD_DELTA_RESYNC_SECONDS = int(os.environ.get('DASHBOARD_DELTA_RESYNC_SECONDS', 3600))
+# Dashboard map: most individual points returned per village/grid cell, and the default grid cell size
+MAP_POINTS_PER_CELL = int(os.environ.get('MAP_POINTS_PER_CELL', 200))
+MAP_GRID_CELL_DEGREES = float(os.environ.get('MAP_GRID_CELL_DEGREES', 0.5))
+# Most buckets returned per page by the water quality series API
+HISTORY_SERIES_MAX_POINTS = int(os.environ.get('HISTORY_SERIES_MAX_POINTS', 5000))
+# Outbreak detection for dashboard alerts (see core/detection.py for every option and its default).
+# METHOD is 'ewma', 'cusum', or 'threshold' for the original "more than 4 cases in 48 hours" rule.
+# CLUSTER_RADIUS_KM is how far apart villages can be and still count towards one cluster alert (0 turns them off).
+OUTBREAK_DETECTION = {
+    'METHOD': os.environ.get('OUTBREAK_DETECTION_METHOD', 'ewma'),
+    'CLUSTER_RADIUS_KM': float(os.environ.get('OUTBREAK_CLUSTER_RADIUS_KM', 15)),
+}
+# Write-behind buffering for water quality ingestion (see core/ingest_buffer.py). Off by default.
+WATER_INGEST_BUFFERED = os.environ.get('WATER_INGEST_BUFFERED', 'False').lower() == 'true'
+WATER_INGEST_QUEUE_SIZE = int(os.environ.get('WATER_INGEST_QUEUE_SIZE', 10000))
+WATER_INGEST_FLUSH_SIZE = int(os.environ.get('WATER_INGEST_FLUSH_SIZE', 500))
+WATER_INGEST_FLUSH_SECONDS = float(os.environ.get('WATER_INGEST_FLUSH_SECONDS', 1.0))
+# Request metrics (see core/metrics.py). Scrapers authenticate with "Authorization: Bearer <METRICS_TOKEN>";
+# staff users can open /metrics/ without it. Set SLOW_QUERY_MS to log queries slower than that.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+SLOW_QUERY_MS = float(os.environ['SLOW_QUERY_MS']) if os.environ.get('SLOW_QUERY_MS') else None
@@ -1,3 +1,18 @@
 from django.contrib import admin
 
+from .models import Alert, Village
+
 # Register your models here.
+@admin.register(Village)
+class VillageAdmin(admin.ModelAdmin):
+    list_display = ('id', 'code', 'name', 'region', 'latitude', 'longitude')
+    list_filter = ('region',)
+    search_fields = ('id', 'name', 'region')
+
+
+@admin.register(Alert)
+class AlertAdmin(admin.ModelAdmin):
+    list_display = ('village', 'kind', 'state', 'cases', 'opened_at', 'escalated_at', 'resolved_at')
+    list_filter = ('state', 'kind')
+    search_fields = ('village', 'message')
+    date_hierarchy = 'opened_at'
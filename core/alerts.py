@@ -0,0 +1,169 @@
+# core/alerts.py
+# Persisted dashboard alerts (see the Alert model).
+# Alerts are evaluated when data arrives rather than on every dashboard poll: saving health
+# reports re-scores the villages they came from (and cluster alerts around them), and saving
+# water readings re-checks the water side of those villages' alerts. Each evaluation moves the
+# villages' Alert rows through open -> escalated -> resolved, and the dashboard just reads the
+# active rows. Cases also leave the window as time passes with no new data, which no ingestion
+# notices, so the first dashboard poll of every hour re-evaluates every village (see
+# core.live.refresh_alerts_hourly). That first poll also fills the alert table after an upgrade;
+# the `refresh_alerts` command does the same on demand.
+
+from datetime import timedelta
+
+import numpy as np
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .detection import case_matrix, detection_settings, find_clusters, score_outbreaks
+from .models import Alert, LatestWaterReading, VillageCaseBucket
+from .spatial import get_spatial_index
+from .villages import get_villages
+
+# Dashboard order: outbreaks, then contaminated water, then clusters
+KIND_ORDER = {'outbreak': 0, 'water': 1, 'cluster': 2}
+
+
+def active_alerts():
+    """The open and escalated alerts as dashboard dicts, by kind and then oldest first."""
+    alerts = sorted(
+        Alert.objects.filter(state__in=Alert.ACTIVE_STATES),
+        key=lambda alert: (KIND_ORDER.get(alert.kind, len(KIND_ORDER)), alert.opened_at, alert.id),
+    )
+    return [alert.as_dict() for alert in alerts]
+
+
+def _outbreak_message(name, count, turbidity):
+    if turbidity is None:
+        return f"OUTBREAK: {count} cases reported in {name}. Immediate action required."
+    return f"CRITICAL: Outbreak in {name} ({count} cases) linked to contaminated water (Turbidity: {turbidity})."
+
+
+def _transition(alert, want, kind, village, now, escalate=False, **fields):
+    """
+    Moves one (village, kind) alert towards the wanted state: opens it, escalates or
+    de-escalates it, updates its details or resolves it. `alert` is the active row, if any. Returns True if anything changed.
+    """
+    if alert is None:
+        if not want:
+            return False
+        alert = Alert(village=village, kind=kind, opened_at=now, **fields)
+        if escalate:
+            alert.state, alert.escalated_at = Alert.ESCALATED, now
+        try:
+            with transaction.atomic():
+                alert.save()
+        except IntegrityError:
+            # A concurrent evaluation of the same data opened it first
+            return False
+        return True
+
+    if not want:
+        alert.state, alert.resolved_at = Alert.RESOLVED, now
+        alert.save(update_fields=['state', 'resolved_at', 'updated_at'])
+        return True
+
+    changed = [name for name, value in fields.items() if getattr(alert, name) != value]
+    for name in changed:
+        setattr(alert, name, fields[name])
+    if escalate and alert.state == Alert.OPEN:
+        alert.state, alert.escalated_at = Alert.ESCALATED, now
+        changed += ['state', 'escalated_at']
+    elif not escalate and alert.state == Alert.ESCALATED:
+        # The water that escalated it is back within limits
+        alert.state, alert.escalated_at = Alert.OPEN, None
+        changed += ['state', 'escalated_at']
+    if changed:
+        alert.save(update_fields=changed + ['updated_at'])
+    return bool(changed)
+
+
+def update_alerts(villages=None, now=None, rescore=True):
+    """
+    Re-evaluates the alerts of `villages` (default: every village) and applies any transitions.
+    With `rescore` off, as after new water readings, the villages' cases are not re-scored: their
+    outbreak status is read from their active outbreak alerts, and cluster alerts are left alone.
+    Returns the number of alerts that changed.
+    """
+    now = now or timezone.now()
+    config = detection_settings()
+    registry = get_villages()
+    all_villages = list(registry)
+    if villages is None:
+        evaluated = all_villages
+    else:
+        evaluated = [village for village in dict.fromkeys(villages) if village in registry]
+    if not evaluated:
+        return 0
+
+    # Cluster alerts centred up to one radius away include the evaluated villages, and their
+    # members lie up to one more radius away, so that is the neighbourhood that gets scored
+    radius = config['CLUSTER_RADIUS_KM'] if rescore else 0
+    centres = scored = evaluated
+    if radius and villages is not None:
+        index = get_spatial_index()
+        centres = index.around(evaluated, radius)
+        scored = index.around(centres, radius)
+
+    alert_villages = set(evaluated) | set(centres)
+    active = Alert.objects.filter(state__in=Alert.ACTIVE_STATES)
+    if villages is not None:
+        active = active.filter(village__in=alert_villages)
+    active = {(alert.village, alert.kind): alert for alert in active}
+
+    latest = LatestWaterReading.for_villages(evaluated)
+    contaminated = {
+        village: reading.turbidity for village, reading in latest.items()
+        if float(reading.turbidity) > config['TURBIDITY_LIMIT']
+    }
+
+    changed = 0
+    if rescore:
+        positions = {village: i for i, village in enumerate(all_villages)}
+        window_start = VillageCaseBucket.bucket_start(now) - timedelta(hours=config['WINDOW_HOURS'] - 1)
+        window = case_matrix(scored, window_start, config['WINDOW_HOURS'])
+        cases, scores, flagged = score_outbreaks(
+            all_villages, window, window_start, config, rows=np.array([positions[v] for v in scored], dtype=np.int64),
+        )
+        row = {village: i for i, village in enumerate(scored)}
+        outbreaks = {village for village in evaluated if flagged[row[village]]}
+    else:
+        outbreaks = {village for village in evaluated if (village, 'outbreak') in active}
+
+    for village in evaluated:
+        name = registry[village]['name']
+        outbreak = active.get((village, 'outbreak'))
+        turbidity = contaminated.get(village)
+        if rescore:
+            i = row[village]
+            count = int(cases[i])
+            changed += _transition(
+                outbreak, village in outbreaks, 'outbreak', village, now, escalate=turbidity is not None,
+                cases=count, score=round(float(scores[i]), 2),
+                message=_outbreak_message(name, count, turbidity),
+            )
+        elif outbreak is not None:
+            changed += _transition(
+                outbreak, True, 'outbreak', village, now, escalate=turbidity is not None,
+                message=_outbreak_message(name, outbreak.cases, turbidity),
+            )
+        changed += _transition(
+            active.get((village, 'water')), turbidity is not None and village not in outbreaks, 'water', village, now,
+            message=f"PREDICTIVE: Water in {name} is contaminated (Turbidity: {turbidity}). High risk of an outbreak.",
+        )
+
+    if rescore:
+        radius = config['CLUSTER_RADIUS_KM']
+        clusters = {
+            scored[centre]: ([scored[i] for i in members], total)
+            for centre, members, total in find_clusters(scored, cases, flagged, config)
+        }
+        for centre in centres:
+            members, total = clusters.get(centre, ([], 0))
+            name = registry[centre]['name']
+            changed += _transition(
+                active.get((centre, 'cluster')), centre in clusters, 'cluster', centre, now,
+                cases=total, villages=members,
+                message=f"CLUSTER: {total} cases across {len(members)} villages within {radius:g} km of {name}. Possible shared water source.",
+            )
+    return changed
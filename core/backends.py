@@ -0,0 +1,37 @@
+# core/backends.py
+# Authentication backend for the shared login form, where workers sign in with their phone
+# number and officials with their email. The identifier is resolved against username, email
+# and phone number in one query on their unique indexes, and the password is hashed once.
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.db.models import Q
+
+
+class IdentifierBackend(ModelBackend):
+    """ModelBackend that accepts a username, email address or phone number as the username."""
+
+    # When an identifier matches different users in different fields, the earlier field wins
+    FIELDS = ('username', 'email', 'phone_number')
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if not username or password is None:
+            return None
+        query = Q()
+        for field in self.FIELDS:
+            query |= Q(**{field: username})
+        candidates = list(UserModel._default_manager.filter(query)[:len(self.FIELDS)])
+        user = next(
+            (user for field in self.FIELDS for user in candidates if getattr(user, field) == username),
+            None,
+        )
+        if user is None:
+            # Hash anyway, so unknown identifiers take as long as wrong passwords
+            UserModel().set_password(password)
+            return None
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
@@ -0,0 +1,31 @@
+# core/checks.py
+# System checks, registered in CoreConfig.ready().
+
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+# Backends whose entries are private to one process
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    The village registry generation and the dashboard version, payload cache and ETags are
+    coordinated through the default cache, which only works across worker processes if they share it.
+    """
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    if backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [Warning(
+        f"The default cache ({backend}) is local to each process.",
+        hint=(
+            "With several worker processes, village changes and new reports are not seen by the "
+            "other processes' village registries and cached dashboards. Set CACHE_BACKEND and "
+            "CACHE_LOCATION to a shared cache such as Redis, or run a single worker process."
+        ),
+        id='core.W001',
+    )]
@@ -0,0 +1,202 @@
+# core/detection.py
+# Outbreak and contamination detection for the dashboard alerts.
+# Case counts are loaded as a village x hour matrix from the hourly case buckets, and every
+# village is scored at once with NumPy. Three detectors are available (settings.OUTBREAK_DETECTION):
+# - 'threshold': the original rule, more than N cases in the window.
+# - 'ewma': compares the window's cases against an exponentially weighted baseline of earlier hours.
+# - 'cusum': a one-sided CUSUM of the window's hourly counts against that same baseline.
+# The baseline is kept per process and only folds in the hours that left the window since
+# the last evaluation, so each poll reads just the window plus any newly expired hours.
+# Cluster detection adds up each village's window cases with its neighbours' within CLUSTER_RADIUS_KM
+# (from the spatial index in core.spatial), to catch a shared water source showing up as a few
+# cases in each of several nearby villages.
+# core.alerts turns these scores into persisted alerts.
+
+import threading
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+
+from .models import VillageCaseBucket
+from .spatial import get_spatial_index
+
+DETECTORS = ('threshold', 'ewma', 'cusum')
+
+DEFAULTS = {
+    'METHOD': 'ewma',
+    'WINDOW_HOURS': 48,
+    'CASE_THRESHOLD': 4, # 'threshold' method: alert when cases in the window exceed this
+    'TURBIDITY_LIMIT': 5.0, # NTU above which water counts as contaminated
+    'BASELINE_HOURS': 14 * 24, # History used to start a new baseline
+    'EWMA_ALPHA': 0.02, # Weight of each newly expired hour in the baseline
+    'Z_THRESHOLD': 3.0, # 'ewma' method: alert when the window is this many std devs above baseline
+    'CUSUM_K': 0.5, # 'cusum' method: slack per hour, in std devs
+    'CUSUM_H': 5.0, # 'cusum' method: alarm level
+    'MIN_CASES': 3, # Statistical methods never alert below this many cases in the window
+    'CLUSTER_RADIUS_KM': 15.0, # Neighbourhood summed for cluster alerts; 0 turns them off
+    'CLUSTER_MIN_CASES': 8, # Alert when a neighbourhood has at least this many cases in the window...
+    'CLUSTER_MIN_VILLAGES': 2, # ...spread over at least this many villages
+}
+
+
+def detection_settings():
+    return {**DEFAULTS, **getattr(settings, 'OUTBREAK_DETECTION', {})}
+
+
+def case_matrix(villages, first_hour, hours):
+    """Hourly case counts as a (len(villages), hours) array, starting at `first_hour`."""
+    matrix = np.zeros((len(villages), hours), dtype=np.float64)
+    if hours <= 0:
+        return matrix
+    index = {village: i for i, village in enumerate(villages)}
+    rows = VillageCaseBucket.objects.filter(
+        hour__gte=first_hour, hour__lt=first_hour + timedelta(hours=hours)
+    ).values_list('village', 'hour', 'count')
+    village_idx, hour_idx, counts = [], [], []
+    for village, hour, count in rows:
+        i = index.get(village)
+        if i is not None:
+            village_idx.append(i)
+            hour_idx.append(int((hour - first_hour).total_seconds() // 3600))
+            counts.append(count)
+    if counts:
+        np.add.at(matrix, (np.array(village_idx), np.array(hour_idx)), np.array(counts, dtype=np.float64))
+    return matrix
+
+
+class Baseline:
+    """Per-village EWMA mean and variance of hourly case counts before the current window."""
+
+    def __init__(self, villages, mean, var, next_hour):
+        self.villages = villages
+        self.mean = mean
+        self.var = var
+        self.next_hour = next_hour # First hour not yet folded in
+
+    @classmethod
+    def build(cls, villages, window_start, hours):
+        history = case_matrix(villages, window_start - timedelta(hours=hours), hours)
+        return cls(villages, history.mean(axis=1), history.var(axis=1), window_start)
+
+    def advance(self, window_start, alpha):
+        """Folds the hours between the last update and the start of the window into the baseline."""
+        expired = int((window_start - self.next_hour).total_seconds() // 3600)
+        if expired <= 0:
+            return
+        columns = case_matrix(self.villages, self.next_hour, expired)
+        for x in columns.T:
+            diff = x - self.mean
+            increment = alpha * diff
+            self.mean = self.mean + increment
+            self.var = (1 - alpha) * (self.var + diff * increment)
+        self.next_hour = window_start
+
+
+_baseline = {'key': None, 'state': None}
+_baseline_lock = threading.Lock()
+
+
+def _current_baseline(villages, window_start, config):
+    key = (tuple(villages), config['BASELINE_HOURS'], config['EWMA_ALPHA'])
+    with _baseline_lock:
+        state = _baseline['state']
+        stale = (
+            state is None or _baseline['key'] != key
+            or window_start - state.next_hour > timedelta(hours=config['BASELINE_HOURS'])
+            or window_start < state.next_hour
+        )
+        if stale:
+            state = Baseline.build(villages, window_start, config['BASELINE_HOURS'])
+            _baseline.update(key=key, state=state)
+        else:
+            state.advance(window_start, config['EWMA_ALPHA'])
+        return state.mean.copy(), state.var.copy()
+
+
+def score_outbreaks(villages, window, window_start, config=None, rows=None):
+    """
+    Scores villages at once. `window` is the case matrix for the alert window that starts at
+    `window_start` and ends with the current hour. By default it has a row per village in
+    `villages`; `rows` instead gives the index into `villages` of each of its rows, to score a
+    subset while the baseline still covers every village.
+    Returns (cases, scores, flagged) arrays aligned with the rows of `window`.
+    """
+    config = config or detection_settings()
+    cases = window.sum(axis=1)
+    method = config['METHOD']
+    if method not in DETECTORS:
+        method = 'threshold'
+    if method == 'threshold':
+        return cases, cases, cases > config['CASE_THRESHOLD']
+
+    mean, var = _current_baseline(villages, window_start, config)
+    if rows is not None:
+        mean, var = mean[rows], var[rows]
+    # Case counts are at least as noisy as a Poisson process with the same mean
+    hourly_var = np.maximum(var, mean)
+    if method == 'ewma':
+        hours = window.shape[1]
+        expected = mean * hours
+        std = np.maximum(np.sqrt(hourly_var * hours), 1.0)
+        scores = (cases - expected) / std
+        flagged = scores >= config['Z_THRESHOLD']
+    else:
+        std = np.maximum(np.sqrt(hourly_var), 0.5)
+        cusum = np.zeros(len(window))
+        for x in window.T:
+            cusum = np.maximum(0.0, cusum + (x - mean) / std - config['CUSUM_K'])
+        scores = cusum
+        flagged = cusum >= config['CUSUM_H']
+    return cases, scores, flagged & (cases >= config['MIN_CASES'])
+
+
+def find_clusters(villages, cases, flagged, config=None):
+    """
+    Finds groups of nearby villages whose combined window cases reach CLUSTER_MIN_CASES.
+    `cases` and `flagged` are aligned with `villages`, as returned by score_outbreaks().
+    Returns [(centre index, [member indices], total cases)], largest first. Each village belongs
+    to at most one cluster, and clusters whose villages already all have an outbreak alert are left out.
+    """
+    config = config or detection_settings()
+    radius = config['CLUSTER_RADIUS_KM']
+    if not radius or not len(villages):
+        return []
+    index = get_spatial_index()
+    if index.ids != villages:
+        # Align with the index (normally the same registry order, so this is skipped)
+        positions = np.array([index.positions[v] for v in villages])
+        aligned = np.zeros(len(index.ids))
+        aligned[positions] = cases
+        cases = aligned
+        aligned_flagged = np.zeros(len(index.ids), dtype=bool)
+        aligned_flagged[positions] = flagged
+        flagged = aligned_flagged
+    else:
+        positions = None
+
+    totals = index.neighborhood_sums(cases, radius)
+    affected = index.neighborhood_sums((cases > 0).astype(np.int64), radius)
+    candidates = np.flatnonzero((totals >= config['CLUSTER_MIN_CASES']) & (affected >= config['CLUSTER_MIN_VILLAGES']))
+    if not len(candidates):
+        return []
+
+    indptr, indices = index.neighbors(radius)
+    covered = np.zeros(len(index.ids), dtype=bool)
+    clusters = []
+    for centre in candidates[np.argsort(-totals[candidates], kind='stable')]:
+        members = indices[indptr[centre]:indptr[centre + 1]]
+        members = members[(cases[members] > 0) & ~covered[members]]
+        total = cases[members].sum()
+        if len(members) < config['CLUSTER_MIN_VILLAGES'] or total < config['CLUSTER_MIN_CASES']:
+            continue
+        covered[members] = True
+        if flagged[members].all():
+            continue
+        clusters.append((int(centre), members.tolist(), int(total)))
+
+    if positions is not None:
+        # Back to indices into `villages`
+        to_caller = {int(p): i for i, p in enumerate(positions)}
+        clusters = [(to_caller[c], [to_caller[m] for m in members], total) for c, members, total in clusters]
+    return clusters
@@ -0,0 +1,120 @@
+# core/export.py
+# Streaming CSV and NDJSON exports of raw health and water quality reports, used by the
+# export API and the `export_reports` command.
+# Rows are read with a server-side iterator in id order and written out in chunks, so memory
+# use stays flat however many rows match. The symptoms and contaminants JSON fields are
+# flattened into one column per known symptom/contaminant plus an "other" column.
+
+import csv
+import json
+
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .binary_format import CONTAMINANTS
+from .models import HealthReport, WaterQualityReport
+
+FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+# The symptoms offered by the worker form, in form order
+SYMPTOMS = ('Diarrhea', 'Vomiting', 'Fever', 'Nausea', 'Stomach Cramps', 'Dehydration', 'Headache', 'Jaundice')
+
+ROWS_PER_CHUNK = 500
+
+
+def _symptom_column(name):
+    return 'symptom_' + name.lower().replace(' ', '_')
+
+
+def _contaminant_column(name):
+    return 'contaminant_' + name.lower().replace('-', '_')
+
+
+def _health_rows(queryset):
+    fields = ('id', 'timestamp', 'village', 'age_group', 'reported_by__username', 'client_id', 'symptoms')
+    for id, timestamp, village, age_group, reported_by, client_id, symptoms in queryset.values_list(*fields).iterator(chunk_size=2000):
+        symptoms = symptoms or []
+        row = {
+            'id': id, 'timestamp': timestamp.isoformat(), 'village': village, 'age_group': age_group,
+            'reported_by': reported_by, 'client_id': str(client_id) if client_id else '',
+        }
+        for name in SYMPTOMS:
+            row[_symptom_column(name)] = 1 if name in symptoms else 0
+        row['symptoms_other'] = ';'.join(s for s in symptoms if s not in SYMPTOMS)
+        yield row
+
+
+def _water_rows(queryset):
+    fields = ('id', 'timestamp', 'village', 'ph', 'turbidity', 'contaminants')
+    for id, timestamp, village, ph, turbidity, contaminants in queryset.values_list(*fields).iterator(chunk_size=2000):
+        contaminants = contaminants or {}
+        row = {'id': id, 'timestamp': timestamp.isoformat(), 'village': village, 'ph': str(ph), 'turbidity': str(turbidity)}
+        for name in CONTAMINANTS:
+            row[_contaminant_column(name)] = contaminants.get(name, '')
+        other = {name: level for name, level in contaminants.items() if name not in CONTAMINANTS}
+        row['contaminants_other'] = json.dumps(other) if other else ''
+        yield row
+
+
+# kind -> (model, column names, row generator)
+EXPORTS = {
+    'health': (
+        HealthReport,
+        ['id', 'timestamp', 'village', 'age_group', 'reported_by', 'client_id']
+        + [_symptom_column(name) for name in SYMPTOMS] + ['symptoms_other'],
+        _health_rows,
+    ),
+    'water': (
+        WaterQualityReport,
+        ['id', 'timestamp', 'village', 'ph', 'turbidity']
+        + [_contaminant_column(name) for name in CONTAMINANTS] + ['contaminants_other'],
+        _water_rows,
+    ),
+}
+
+
+def parse_time(value, name):
+    """Parses an ISO 8601 date and time, treating naive values as the current time zone."""
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError(f"'{name}' must be an ISO 8601 date and time.")
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+
+def export_queryset(kind, villages=None, start=None, end=None):
+    model = EXPORTS[kind][0]
+    queryset = model.objects.order_by('id')
+    if villages:
+        queryset = queryset.filter(village__in=villages)
+    if start is not None:
+        queryset = queryset.filter(timestamp__gte=start)
+    if end is not None:
+        queryset = queryset.filter(timestamp__lt=end)
+    return queryset
+
+
+class _Echo:
+    """A file-like object whose write() just returns the text, so csv.writer can build lines for us."""
+
+    def write(self, value):
+        return value
+
+
+def iter_export(kind, fmt, queryset):
+    """Yields the export as text chunks of up to ROWS_PER_CHUNK rows each."""
+    _, columns, rows = EXPORTS[kind]
+    if fmt == 'csv':
+        writer = csv.DictWriter(_Echo(), fieldnames=columns)
+        encode = writer.writerow
+        yield writer.writeheader()
+    else:
+        def encode(row):
+            return json.dumps(row) + '\n'
+    chunk = []
+    for row in rows(queryset):
+        chunk.append(encode(row))
+        if len(chunk) >= ROWS_PER_CHUNK:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
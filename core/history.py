@@ -0,0 +1,202 @@
+# core/history.py
+# Hourly and daily history of water quality and health cases for a village.
+# Old raw rows are rolled up into summary tables by `rollup_reports` and then deleted, so every
+# history query combines the summaries with the raw rows that are still present. A raw row is
+# deleted in the same transaction that adds it to the summaries, so nothing is counted twice.
+# water_quality_series() serves multi-village charts: it buckets in the database (down to
+# 5 minutes for raw rows that haven't been rolled up yet) and pages through (village, time)
+# with a keyset cursor instead of OFFSET.
+
+import base64
+from datetime import timedelta
+
+from django.db.models import Avg, Count, Max, Min, Value
+from django.db.models.functions import ExtractMinute, Floor, TruncDay, TruncHour
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import HealthReport, HealthSummary, WaterQualityReport, WaterQualitySummary
+
+RESOLUTIONS = {'hour': TruncHour, 'day': TruncDay}
+
+# Series intervals and their length. Sub-hour buckets only exist for raw readings, since
+# the summary tables are hourly and daily.
+INTERVALS = {
+    '5min': timedelta(minutes=5),
+    '15min': timedelta(minutes=15),
+    '30min': timedelta(minutes=30),
+    'hour': timedelta(hours=1),
+    'day': timedelta(days=1),
+}
+
+WATER_AGGREGATES = {
+    'count': Count('id'), 'ph_min': Min('ph'), 'ph_max': Max('ph'), 'ph_mean': Avg('ph'),
+    'turbidity_min': Min('turbidity'), 'turbidity_max': Max('turbidity'), 'turbidity_mean': Avg('turbidity'),
+}
+WATER_SUMMARY_FIELDS = (
+    'reading_count', 'ph_min', 'ph_max', 'ph_mean', 'turbidity_min', 'turbidity_max', 'turbidity_mean',
+)
+
+
+def _merge_water(points, key, time, count, ph_min, ph_max, ph_mean, turbidity_min, turbidity_max, turbidity_mean):
+    """Adds an aggregate of `count` readings to points[key], combining it with what is already there."""
+    point = points.get(key)
+    if point is None:
+        points[key] = {
+            'time': time, 'readings': count,
+            'ph_min': float(ph_min), 'ph_max': float(ph_max), 'ph_mean': float(ph_mean),
+            'turbidity_min': float(turbidity_min), 'turbidity_max': float(turbidity_max), 'turbidity_mean': float(turbidity_mean),
+        }
+        return
+    total = point['readings'] + count
+    point['ph_mean'] = (point['ph_mean'] * point['readings'] + float(ph_mean) * count) / total
+    point['turbidity_mean'] = (point['turbidity_mean'] * point['readings'] + float(turbidity_mean) * count) / total
+    point['ph_min'] = min(point['ph_min'], float(ph_min))
+    point['ph_max'] = max(point['ph_max'], float(ph_max))
+    point['turbidity_min'] = min(point['turbidity_min'], float(turbidity_min))
+    point['turbidity_max'] = max(point['turbidity_max'], float(turbidity_max))
+    point['readings'] = total
+
+
+def water_quality_history(village, start, end, resolution='hour'):
+    """Returns [{'time', 'readings', 'ph_min', 'ph_max', 'ph_mean', 'turbidity_min', 'turbidity_max', 'turbidity_mean'}]."""
+    points = {}
+    summaries = WaterQualitySummary.objects.filter(
+        village=village, period=resolution, period_start__gte=start, period_start__lt=end
+    ).values_list('period_start', *WATER_SUMMARY_FIELDS)
+    for time, *aggregates in summaries:
+        _merge_water(points, time, time, *aggregates)
+
+    raw = (
+        WaterQualityReport.objects.filter(village=village, timestamp__gte=start, timestamp__lt=end)
+        .annotate(time=RESOLUTIONS[resolution]('timestamp'))
+        .values('time')
+        .annotate(**WATER_AGGREGATES)
+        .order_by()
+    )
+    for row in raw:
+        _merge_water(points, row['time'], row['time'], *(row[name] for name in WATER_AGGREGATES))
+    return [points[time] for time in sorted(points)]
+
+
+def case_history(village, start, end, resolution='hour'):
+    """Returns [{'time', 'cases', 'symptoms': {name: count}}]."""
+    points = {}
+    summaries = HealthSummary.objects.filter(
+        village=village, period=resolution, period_start__gte=start, period_start__lt=end
+    ).values_list('period_start', 'case_count', 'symptom_counts')
+    for time, cases, symptoms in summaries:
+        points[time] = {'time': time, 'cases': cases, 'symptoms': dict(symptoms)}
+
+    raw = (
+        HealthReport.objects.filter(village=village, timestamp__gte=start, timestamp__lt=end)
+        .annotate(time=RESOLUTIONS[resolution]('timestamp'))
+        .values_list('time', 'symptoms')
+    )
+    for time, symptoms in raw.iterator(chunk_size=2000):
+        point = points.setdefault(time, {'time': time, 'cases': 0, 'symptoms': {}})
+        point['cases'] += 1
+        for symptom in symptoms or []:
+            point['symptoms'][symptom] = point['symptoms'].get(symptom, 0) + 1
+    return [points[time] for time in sorted(points)]
+
+
+def encode_cursor(village, time):
+    return base64.urlsafe_b64encode(f"{village}|{time.isoformat()}".encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Returns the (village, time) a page ended with. Raises ValueError if the cursor is malformed."""
+    try:
+        village, _, time = base64.urlsafe_b64decode(cursor.encode()).decode().partition('|')
+        time = parse_datetime(time)
+    except ValueError:
+        village, time = None, None
+    # Cursors are always issued with an offset; a naive time could not be compared with them
+    if not village or time is None or timezone.is_naive(time):
+        raise ValueError("Invalid cursor.")
+    return village, time
+
+
+def bucket_floor(time, interval):
+    """The start of the `interval` bucket that `time` falls into (in the current time zone, like Trunc)."""
+    local = timezone.localtime(time).replace(second=0, microsecond=0)
+    if interval == 'day':
+        return local.replace(hour=0, minute=0)
+    step = INTERVALS[interval].seconds // 60
+    return local.replace(minute=local.minute - local.minute % step)
+
+
+def _first_water_time(village, start, end, interval):
+    """The earliest raw reading or summary of a village in [start, end), or None."""
+    times = [
+        WaterQualityReport.objects.filter(village=village, timestamp__gte=start, timestamp__lt=end)
+        .aggregate(first=Min('timestamp'))['first']
+    ]
+    if interval in RESOLUTIONS:
+        times.append(
+            WaterQualitySummary.objects.filter(village=village, period=interval, period_start__gte=start, period_start__lt=end)
+            .aggregate(first=Min('period_start'))['first']
+        )
+    times = [time for time in times if time is not None]
+    return min(times) if times else None
+
+
+def _water_buckets(village, start, end, interval):
+    """One village's buckets in [start, end), aggregated in the database and merged with any summaries."""
+    points = {}
+    readings = WaterQualityReport.objects.filter(village=village, timestamp__gte=start, timestamp__lt=end)
+    if interval in RESOLUTIONS:
+        rows = readings.annotate(time=RESOLUTIONS[interval]('timestamp')).values('time')
+        for row in rows.annotate(**WATER_AGGREGATES).order_by():
+            _merge_water(points, row['time'], row['time'], *(row[name] for name in WATER_AGGREGATES))
+        summaries = WaterQualitySummary.objects.filter(
+            village=village, period=interval, period_start__gte=start, period_start__lt=end,
+        ).values_list('period_start', *WATER_SUMMARY_FIELDS)
+        for time, *aggregates in summaries:
+            _merge_water(points, time, time, *aggregates)
+    else:
+        # Sub-hour buckets: truncate to the hour, then split the hour into equal minute slots
+        length = INTERVALS[interval]
+        rows = readings.annotate(
+            hour=TruncHour('timestamp'), slot=Floor(ExtractMinute('timestamp') / Value(length.seconds // 60)),
+        ).values('hour', 'slot')
+        for row in rows.annotate(**WATER_AGGREGATES).order_by():
+            time = row['hour'] + int(row['slot']) * length
+            _merge_water(points, time, time, *(row[name] for name in WATER_AGGREGATES))
+    return [points[time] for time in sorted(points)]
+
+
+def water_quality_series(villages, start, end, interval='hour', after=None, limit=1000):
+    """
+    Downsampled pH and turbidity for several villages, at most `limit` buckets per page in
+    (village, time) order. `after` is the (village, time) cursor of the previous page.
+    Returns ({village: [point, ...]}, next_cursor), where next_cursor is None on the last page.
+
+    Each query is bounded to one village and a time range of at most `limit` buckets, so it only
+    reads the rows of the page from the (village, timestamp) index; gaps without data are skipped.
+    """
+    length = INTERVALS[interval]
+    series = {}
+    remaining = limit
+    covered = None # (village, start of the last bucket this page has covered)
+    for village in sorted(villages):
+        since = start
+        if after is not None:
+            if village < after[0]:
+                continue
+            if village == after[0]:
+                since = max(start, after[1] + length)
+        first = _first_water_time(village, since, end, interval)
+        while first is not None:
+            if remaining == 0:
+                return series, encode_cursor(*covered)
+            low = bucket_floor(first, interval)
+            high = low + remaining * length
+            points = _water_buckets(village, max(low, since), min(high, end), interval)
+            if points:
+                series.setdefault(village, []).extend(points)
+            remaining -= len(points)
+            covered = (village, high - length)
+            first = _first_water_time(village, high, end, interval) if high < end else None
+    return series, None
@@ -0,0 +1,263 @@
+# core/ingest.py
+# Validation and bulk persistence for incoming sensor data and health reports.
+# The water quality API accepts a single JSON reading, a JSON array of readings, an NDJSON
+# body or a packed binary batch (core/binary_format.py). Every reading in a request is validated before anything is written, and valid
+# batches are saved with a single bulk insert.
+# Health reports synced from offline devices carry a client-generated id, so replaying
+# the same report twice only stores it once.
+
+import json
+import uuid
+from collections import Counter
+from datetime import timedelta, timezone as dt_timezone
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import binary_format
+from .alerts import update_alerts
+from .live import bump_dashboard_version
+from .models import HealthReport, LatestWaterReading, VillageCaseBucket, WaterQualityReport
+from .symptoms import link_symptoms
+from .villages import get_villages, get_villages_by_code
+
+NDJSON_CONTENT_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonlines')
+
+
+class BatchValidationError(ValueError):
+    """Raised when one or more readings in a batch are invalid. Nothing in the batch is saved."""
+
+    def __init__(self, errors):
+        self.errors = errors # List of {'index': ..., 'message': ...}
+        super().__init__(f"{len(errors)} invalid reading(s); nothing was saved.")
+
+
+def _to_decimal(value, field, minimum, maximum):
+    if isinstance(value, bool) or value is None:
+        raise ValueError(f"'{field}' must be a number.")
+    try:
+        number = Decimal(str(value))
+        if not number.is_finite():
+            raise ValueError
+        number = number.quantize(Decimal('0.01'))
+    except (InvalidOperation, ValueError):
+        raise ValueError(f"'{field}' must be a number.")
+    if not minimum <= number <= maximum:
+        raise ValueError(f"'{field}' must be between {minimum} and {maximum}.")
+    return number
+
+
+def clean_water_reading(data, villages=None):
+    """
+    Validates one reading and returns the cleaned field values. Raises ValueError on bad input.
+    Batches pass the village registry in as `villages`, so it is looked up once per batch.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Each reading must be a JSON object.")
+    village = data.get('village')
+    if not isinstance(village, str) or not village:
+        raise ValueError("'village' is required.")
+    if village not in (villages if villages is not None else get_villages()):
+        raise ValueError(f"Unknown village '{village}'.")
+    contaminants = data.get('contaminants') or {}
+    if not isinstance(contaminants, dict):
+        raise ValueError("'contaminants' must be an object.")
+    return {
+        'village': village,
+        'ph': _to_decimal(data.get('ph'), 'ph', Decimal('0'), Decimal('14')),
+        'turbidity': _to_decimal(data.get('turbidity'), 'turbidity', Decimal('0'), Decimal('999.99')),
+        'contaminants': contaminants,
+    }
+
+
+def parse_water_payload(body, content_type):
+    """
+    Decodes a request body into a list of raw readings and whether it was sent as a batch.
+    A JSON object is a single reading; a JSON array or an NDJSON body is a batch.
+    """
+    text = body.decode('utf-8')
+    if content_type in NDJSON_CONTENT_TYPES:
+        items = []
+        for line_number, line in enumerate(text.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Invalid JSON on line {line_number}: {e}")
+        return items, True
+    data = json.loads(text)
+    if isinstance(data, list):
+        return data, True
+    return [data], False
+
+
+def clean_water_batch(items):
+    """Validates every reading in a batch, collecting per-item errors instead of stopping at the first."""
+    max_batch = getattr(settings, 'WATER_QUALITY_MAX_BATCH', 5000)
+    if not items:
+        raise ValueError("The batch is empty.")
+    if len(items) > max_batch:
+        raise ValueError(f"A batch may contain at most {max_batch} readings.")
+    villages = get_villages()
+    cleaned, errors = [], []
+    for index, item in enumerate(items):
+        try:
+            cleaned.append(clean_water_reading(item, villages))
+        except ValueError as e:
+            errors.append({'index': index, 'message': str(e)})
+    if errors:
+        raise BatchValidationError(errors)
+    return cleaned
+
+
+def clean_binary_water_batch(payload):
+    """
+    Decodes and validates a binary batch (see core.binary_format). The records are unpacked straight
+    from the request body and their scaled integers become two-place Decimals without going through
+    strings. Raises BatchValidationError listing every bad record, or ValueError for a bad payload.
+    """
+    max_batch = getattr(settings, 'WATER_QUALITY_MAX_BATCH', 5000)
+    villages = get_villages_by_code()
+    levels = binary_format.LEVELS
+    cleaned, errors = [], []
+    for index, (code, ph, turbidity, ecoli, arsenic) in enumerate(binary_format.iter_records(payload)):
+        if index >= max_batch:
+            raise ValueError(f"A batch may contain at most {max_batch} readings.")
+        village = villages.get(code)
+        if village is None:
+            errors.append({'index': index, 'message': f"Unknown village code {code}."})
+        elif ph > 1400:
+            errors.append({'index': index, 'message': "'ph' must be between 0 and 14."})
+        elif turbidity > 99999:
+            errors.append({'index': index, 'message': "'turbidity' must be between 0 and 999.99."})
+        elif ecoli >= len(levels) or arsenic >= len(levels):
+            errors.append({'index': index, 'message': "Unknown contaminant level code."})
+        else:
+            contaminants = {}
+            if ecoli:
+                contaminants['e-coli'] = levels[ecoli]
+            if arsenic:
+                contaminants['arsenic'] = levels[arsenic]
+            cleaned.append({
+                'village': village['id'],
+                'ph': Decimal(ph).scaleb(-2),
+                'turbidity': Decimal(turbidity).scaleb(-2),
+                'contaminants': contaminants,
+            })
+    if errors:
+        raise BatchValidationError(errors)
+    if not cleaned:
+        raise ValueError("The batch is empty.")
+    return cleaned
+
+
+def save_water_readings(readings):
+    """
+    Saves cleaned readings with one bulk insert, refreshes the latest reading of each
+    village they touch and re-checks those villages' alerts. Returns the created WaterQualityReport objects.
+    """
+    reports = [WaterQualityReport(**reading) for reading in readings]
+    with transaction.atomic():
+        reports = WaterQualityReport.objects.bulk_create(reports)
+        newest = {}
+        for report in reports:
+            current = newest.get(report.village)
+            if current is None or report.timestamp >= current.timestamp:
+                newest[report.village] = report
+        for report in newest.values():
+            LatestWaterReading.record(report)
+        update_alerts(newest, rescore=False)
+        bump_dashboard_version()
+    return reports
+
+
+def clean_health_report(data, require_client_id=False, villages=None):
+    """
+    Validates one health report as sent by the worker app and returns model field values.
+    Batches pass the village registry in as `villages`, so it is looked up once per batch.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Each report must be a JSON object.")
+    village = data.get('village')
+    if not isinstance(village, str) or not village:
+        raise ValueError("'village' is required.")
+    if village not in (villages if villages is not None else get_villages()):
+        raise ValueError(f"Unknown village '{village}'.")
+    symptoms = data.get('symptoms')
+    if not isinstance(symptoms, list) or not symptoms or not all(isinstance(s, str) for s in symptoms):
+        raise ValueError("'symptoms' must be a non-empty list.")
+
+    cleaned = {
+        'village': village,
+        'age_group': str(data.get('ageGroup') or ''),
+        'symptoms': symptoms,
+    }
+
+    client_id = data.get('clientId')
+    if client_id is not None:
+        try:
+            cleaned['client_id'] = uuid.UUID(str(client_id))
+        except ValueError:
+            raise ValueError("'clientId' must be a UUID.")
+    elif require_client_id:
+        raise ValueError("'clientId' is required.")
+
+    # Keep the time the worker made the report, but never trust a clock that is ahead of ours,
+    # and refuse times so old that no device could have held the report that long
+    now = timezone.now()
+    timestamp = data.get('timestamp')
+    if timestamp:
+        parsed = parse_datetime(str(timestamp))
+        if parsed is None:
+            raise ValueError("'timestamp' must be an ISO 8601 date and time.")
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed, dt_timezone.utc)
+        max_age = getattr(settings, 'HEALTH_REPORT_MAX_AGE_DAYS', 30)
+        if parsed < now - timedelta(days=max_age):
+            raise ValueError(f"'timestamp' is more than {max_age} days old.")
+        cleaned['timestamp'] = min(parsed, now)
+    else:
+        cleaned['timestamp'] = now
+    return cleaned
+
+
+def save_health_reports(user, reports):
+    """
+    Saves cleaned health reports for `user` with one bulk insert, skipping any whose client_id
+    is already stored. Updates the per-village case buckets, the symptom index and the alerts for the reports that were new.
+    Returns the client ids that are now safely stored (new or duplicate).
+    """
+    by_client_id = {}
+    for report in reports:
+        by_client_id.setdefault(report.get('client_id'), report)
+    keys = [key for key in by_client_id if key is not None]
+    without_keys = [report for report in reports if report.get('client_id') is None]
+
+    for attempt in range(2):
+        try:
+            with transaction.atomic():
+                existing = set(HealthReport.objects.filter(client_id__in=keys).values_list('client_id', flat=True))
+                new_reports = [
+                    HealthReport(reported_by=user, **report)
+                    for key, report in by_client_id.items() if key is not None and key not in existing
+                ] + [HealthReport(reported_by=user, **report) for report in without_keys]
+                HealthReport.objects.bulk_create(new_reports)
+                link_symptoms(new_reports)
+
+                buckets = Counter(
+                    (report.village, VillageCaseBucket.bucket_start(report.timestamp)) for report in new_reports
+                )
+                for (village, hour), count in buckets.items():
+                    VillageCaseBucket.record(village, hour, count=count)
+                if new_reports:
+                    update_alerts({report.village for report in new_reports})
+                    bump_dashboard_version()
+            return keys
+        except IntegrityError:
+            # Another sync of the same reports committed first; on the retry they are found as existing
+            if attempt:
+                raise
@@ -0,0 +1,142 @@
+# core/ingest_buffer.py
+# Optional write-behind buffer for water quality readings (settings.WATER_INGEST_BUFFERED).
+# water_quality_api validates readings, stamps them with the time they were received and
+# puts them on a bounded in-process queue, then answers 202 straight away. A background thread
+# writes them with save_water_readings() whenever FLUSH_SIZE readings are waiting or
+# FLUSH_SECONDS have passed. When the queue is full the API answers 429 instead (backpressure).
+# Whatever is still queued is flushed when the process exits.
+#
+# Readings in the queue are lost if the process is killed, so only enable this where sensors
+# can tolerate that (they normally resend on the next tick anyway).
+
+import atexit
+import logging
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    def __init__(self, save, max_size=10000, flush_size=500, flush_seconds=1.0, max_attempts=3):
+        self.save = save # Called with a list of cleaned readings
+        self.max_size = max_size
+        self.flush_size = flush_size
+        self.flush_seconds = flush_seconds
+        self.max_attempts = max_attempts
+        self._items = deque()
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._stopping = False
+        self.stats = {
+            'accepted': 0, 'rejected': 0, 'written': 0, 'dropped': 0,
+            'flushes': 0, 'flush_errors': 0, 'last_flush_ms': 0.0, 'max_flush_ms': 0.0, 'total_flush_ms': 0.0,
+        }
+
+    def offer(self, readings):
+        """Queues all of `readings`, or none of them if that would exceed the capacity. Returns True if queued."""
+        with self._condition:
+            if self._stopping or len(self._items) + len(readings) > self.max_size:
+                self.stats['rejected'] += len(readings)
+                return False
+            self._items.extend(readings)
+            self.stats['accepted'] += len(readings)
+            if len(self._items) >= self.flush_size:
+                self._condition.notify()
+        self._ensure_started()
+        return True
+
+    def metrics(self):
+        with self._condition:
+            return {'depth': len(self._items), 'capacity': self.max_size, **self.stats}
+
+    def flush(self):
+        """Writes everything currently queued, in batches of flush_size. Safe to call from any thread."""
+        with self._flush_lock:
+            while True:
+                with self._condition:
+                    if not self._items:
+                        return
+                    batch = [self._items.popleft() for _ in range(min(self.flush_size, len(self._items)))]
+                self._write(batch)
+
+    def _write(self, batch):
+        for attempt in range(1, self.max_attempts + 1):
+            started = time.perf_counter()
+            try:
+                close_old_connections()
+                self.save(batch)
+            except Exception:
+                with self._condition:
+                    self.stats['flush_errors'] += 1
+                logger.exception("Flushing %d buffered readings failed (attempt %d of %d)", len(batch), attempt, self.max_attempts)
+                time.sleep(min(2 ** attempt * 0.1, 2))
+                continue
+            elapsed = (time.perf_counter() - started) * 1000
+            # Stats are read by metrics() on request threads, under the same lock
+            with self._condition:
+                self.stats['flushes'] += 1
+                self.stats['written'] += len(batch)
+                self.stats['last_flush_ms'] = elapsed
+                self.stats['max_flush_ms'] = max(self.stats['max_flush_ms'], elapsed)
+                self.stats['total_flush_ms'] += elapsed
+            return
+        with self._condition:
+            self.stats['dropped'] += len(batch)
+        logger.error("Dropped %d buffered readings after %d failed attempts", len(batch), self.max_attempts)
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._condition:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='water-ingest-flusher', daemon=True)
+                self._thread.start()
+                atexit.register(self.stop)
+
+    def _run(self):
+        try:
+            while True:
+                with self._condition:
+                    if not self._stopping and len(self._items) < self.flush_size:
+                        self._condition.wait(timeout=self.flush_seconds)
+                    stopping = self._stopping
+                self.flush()
+                if stopping:
+                    return
+        finally:
+            connection.close()
+
+    def stop(self, timeout=30):
+        """Stops accepting readings, flushes what is queued and waits for the flusher thread."""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+
+
+_water_buffer = None
+_water_buffer_lock = threading.Lock()
+
+
+def get_water_buffer():
+    """The process-wide buffer for water quality readings, created from settings on first use."""
+    global _water_buffer
+    if _water_buffer is None:
+        from .ingest import save_water_readings
+        with _water_buffer_lock:
+            if _water_buffer is None:
+                _water_buffer = WriteBehindBuffer(
+                    save_water_readings,
+                    max_size=getattr(settings, 'WATER_INGEST_QUEUE_SIZE', 10000),
+                    flush_size=getattr(settings, 'WATER_INGEST_FLUSH_SIZE', 500),
+                    flush_seconds=getattr(settings, 'WATER_INGEST_FLUSH_SECONDS', 1.0),
+                )
+    return _water_buffer
@@ -0,0 +1,102 @@
+# core/live.py
+# Change tracking for the official dashboard.
+# Every ingestion path bumps a shared "dashboard version" once its data is committed.
+# Live streams only rebuild and push the dashboard when that version moves, so server
+# work follows the write rate rather than the number of open tabs. The built payload is
+# cached under the same version, and doubles as the ETag for conditional polls.
+# The version and payloads live in the configured cache, so they are only shared by processes
+# that share that cache. With a process-local cache each worker process keeps its own version,
+# which writes handled by other processes never bump, and can serve its cached dashboard until
+# DASHBOARD_CACHE_SECONDS or the hour rolls over; see core.checks.
+
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from .alerts import update_alerts
+from .metrics import serialization_timer
+
+logger = logging.getLogger(__name__)
+
+DASHBOARD_VERSION_KEY = 'aquaalert:dashboard-version'
+
+
+def get_dashboard_version():
+    """Returns the current dashboard data version, starting a new sequence if the cache has none."""
+    version = cache.get(DASHBOARD_VERSION_KEY)
+    if version is None:
+        # Start from the clock rather than 0, so a cache restart never hands out a version seen before
+        cache.add(DASHBOARD_VERSION_KEY, int(time.time() * 1000), timeout=None)
+        version = cache.get(DASHBOARD_VERSION_KEY)
+    return version
+
+
+def advance_dashboard_version():
+    """Moves the dashboard version on right away, so the next poll rebuilds the payload."""
+    try:
+        cache.incr(DASHBOARD_VERSION_KEY)
+    except ValueError:
+        get_dashboard_version()
+
+
+def bump_dashboard_version():
+    """Marks the dashboard data as changed once the current transaction commits."""
+    transaction.on_commit(advance_dashboard_version)
+
+
+# The hour this process last saw the alerts re-evaluated, so only the first poll of an hour
+# touches the shared lock
+_alerts_refreshed_hour = None
+
+
+def refresh_alerts_hourly(hour):
+    """
+    Re-evaluates every village's alerts once per hour, so alerts also resolve once their cases
+    leave the detection window without any new data arriving. The first poll of the hour in any
+    process that shares the cache takes a lock and does the work; the others skip it.
+    """
+    global _alerts_refreshed_hour
+    if _alerts_refreshed_hour == hour:
+        return
+    _alerts_refreshed_hour = hour
+    if not cache.add(f'aquaalert:alerts-refreshed:{hour}', True, timeout=2 * 3600):
+        return
+    try:
+        with transaction.atomic():
+            if update_alerts():
+                bump_dashboard_version()
+    except Exception:
+        logger.exception("Re-evaluating the alerts for hour %s failed", hour)
+
+
+def dashboard_state():
+    """
+    Identifies the dashboard content: the data version plus the current hour, because
+    reports also leave the 48-hour window as time passes without any new writes. The first
+    call of each hour re-evaluates the alerts for the same reason.
+    """
+    hour = timezone.now().strftime('%Y%m%d%H')
+    refresh_alerts_hourly(hour)
+    return f"{get_dashboard_version()}-{hour}"
+
+
+def cached_dashboard_payload(state, build, variant=''):
+    """
+    Returns the dashboard JSON for `state`, calling `build()` only if no process has cached it yet.
+    Entries are keyed by state, so a bumped version never serves stale data. `variant` separates
+    differently shaped payloads (e.g. map modes) of the same state.
+    """
+    key = f'aquaalert:dashboard-payload:{state}:{variant}'
+    payload = cache.get(key)
+    if payload is None:
+        data = build()
+        with serialization_timer():
+            payload = json.dumps(data, cls=DjangoJSONEncoder)
+        cache.set(key, payload, timeout=getattr(settings, 'DASHBOARD_CACHE_SECONDS', 3600))
+    return payload
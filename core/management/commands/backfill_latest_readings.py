@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import LatestWaterReading, WaterQualityReport
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the latest-reading-per-village table from existing water quality reports."
+
+    def handle(self, *args, **options):
+        villages = (
+            WaterQualityReport.objects.order_by()
+            .values_list('village', flat=True)
+            .distinct()
+        )
+        updated = 0
+        with transaction.atomic():
+            for village in villages:
+                latest = (
+                    WaterQualityReport.objects.filter(village=village)
+                    .order_by('-timestamp', '-id')
+                    .first()
+                )
+                if latest is None:
+                    continue
+                LatestWaterReading.objects.update_or_create(
+                    village=village,
+                    defaults={
+                        'report_id': latest.pk,
+                        'ph': latest.ph,
+                        'turbidity': latest.turbidity,
+                        'contaminants': latest.contaminants,
+                        'timestamp': latest.timestamp,
+                    },
+                )
+                updated += 1
+        self.stdout.write(self.style.SUCCESS(f"Backfilled latest readings for {updated} village(s)."))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import HealthReport
+from core.symptoms import link_symptoms
+
+
+class Command(BaseCommand):
+    help = (
+        "Indexes the symptoms of existing health reports into the symptom vocabulary and "
+        "report-symptom link table, in chunks by id. Reports that are already indexed are skipped, "
+        "so it is safe to interrupt and rerun."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000, help="Reports indexed per transaction.")
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        last_id = 0
+        reports_done = links = 0
+        while True:
+            reports = list(
+                HealthReport.objects.filter(id__gt=last_id, symptom_links__isnull=True)
+                .order_by('id')
+                .only('id', 'village', 'timestamp', 'symptoms')[:chunk_size]
+            )
+            if not reports:
+                break
+            with transaction.atomic():
+                links += link_symptoms(reports)
+            last_id = reports[-1].id
+            reports_done += len(reports)
+            self.stdout.write(f"  {reports_done} reports indexed")
+        self.stdout.write(self.style.SUCCESS(f"Indexed {reports_done} health reports ({links} symptom links)."))
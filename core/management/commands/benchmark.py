@@ -0,0 +1,253 @@
+import json
+import statistics
+import time
+import uuid
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import F, Max
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core import binary_format
+from core.live import advance_dashboard_version, bump_dashboard_version
+from core.models import Alert, CustomUser, HealthReport, LatestWaterReading, VillageCaseBucket, WaterQualityReport
+from core.villages import get_villages
+
+# Regression thresholds per scenario. Override them with --thresholds <file.json> using the same shape.
+DEFAULT_THRESHOLDS = {
+    'dashboard_data_api': {'p95_ms': 500, 'max_queries': 6},
+    'dashboard_data_api_cached': {'p95_ms': 50, 'max_queries': 0},
+    'dashboard_data_api_not_modified': {'p95_ms': 50, 'max_queries': 0},
+    'dashboard_data_api_delta': {'p95_ms': 100, 'max_queries': 8},
+    'water_quality_api': {'p95_ms': 100, 'max_queries': 8},
+    'water_quality_api_batch': {'p95_ms': 500, 'max_queries': 20},
+    'water_quality_api_binary': {'p95_ms': 500, 'max_queries': 20},
+    'submit_health_report_api': {'p95_ms': 100, 'max_queries': 14},
+    'session_status_api': {'p95_ms': 20, 'max_queries': 0},
+}
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures latency percentiles and query counts for the dashboard and ingestion endpoints "
+        "through the Django test client, and writes a JSON report with pass/fail per threshold. "
+        "Ingestion requests commit like real ones, so run it against a test or throwaway database; "
+        "the rows they write are deleted afterwards unless --commit is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50, help="Measured requests per scenario.")
+        parser.add_argument('--warmup', type=int, default=3, help="Unmeasured requests per scenario.")
+        parser.add_argument('--batch-size', type=int, default=100, help="Readings per request in the batch scenario.")
+        parser.add_argument('--thresholds', help="JSON file of per-scenario thresholds (p95_ms, p99_ms, max_queries).")
+        parser.add_argument('--output', help="Write the JSON report here instead of stdout.")
+        parser.add_argument('--fail-on-regression', action='store_true', help="Exit with an error if any threshold is exceeded.")
+        parser.add_argument('--commit', action='store_true', help="Keep the rows written by the ingestion scenarios.")
+
+    def handle(self, *args, **options):
+        thresholds = dict(DEFAULT_THRESHOLDS)
+        if options['thresholds']:
+            with open(options['thresholds']) as f:
+                thresholds.update(json.load(f))
+
+        self.iterations = options['iterations']
+        self.warmup = options['warmup']
+        self.villages = list(get_villages())
+        if not self.villages:
+            raise CommandError("No villages are registered. Run the migrations first.")
+
+        marks = self.mark()
+        self.worker = None
+        try:
+            # The test client talks to the 'testserver' host
+            with override_settings(ALLOWED_HOSTS=['testserver']):
+                scenarios = self.run_scenarios(options['batch_size'])
+        finally:
+            if not options['commit']:
+                self.clean_up(marks)
+
+        passed = True
+        for name, result in scenarios.items():
+            limits = thresholds.get(name, {})
+            failures = []
+            for key, limit in limits.items():
+                measured = result['queries_max'] if key == 'max_queries' else result.get(key)
+                if measured is not None and measured > limit:
+                    failures.append(f"{key}: {measured} > {limit}")
+            result['thresholds'] = limits
+            result['failures'] = failures
+            result['passed'] = not failures
+            passed = passed and not failures
+
+        report = {
+            'generated_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'row_counts': {
+                'health_reports': HealthReport.objects.count(),
+                'water_quality_reports': WaterQualityReport.objects.count(),
+                'villages': len(self.villages),
+            },
+            'iterations': self.iterations,
+            'scenarios': scenarios,
+            'passed': passed,
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+            self.stdout.write(f"Report written to {options['output']}")
+        else:
+            self.stdout.write(output)
+
+        if options['fail_on_regression'] and not passed:
+            raise CommandError("Benchmark thresholds exceeded: " + "; ".join(
+                f"{name} ({', '.join(result['failures'])})" for name, result in scenarios.items() if result['failures']
+            ))
+
+    def mark(self):
+        """Notes what exists before the run, so clean_up() can remove what the run adds."""
+        return {
+            'health': HealthReport.objects.aggregate(last=Max('id'))['last'] or 0,
+            'water': WaterQualityReport.objects.aggregate(last=Max('id'))['last'] or 0,
+            'alert': Alert.objects.aggregate(last=Max('id'))['last'] or 0,
+            'active_alerts': list(Alert.objects.filter(state__in=Alert.ACTIVE_STATES)),
+            'latest_readings': list(LatestWaterReading.objects.all()),
+        }
+
+    def clean_up(self, marks):
+        """Deletes the reports, alerts and user the run created and restores the derived tables."""
+        with transaction.atomic():
+            reports = HealthReport.objects.filter(id__gt=marks['health'])
+            buckets = Counter(
+                (village, VillageCaseBucket.bucket_start(timestamp))
+                for village, timestamp in reports.values_list('village', 'timestamp')
+            )
+            for (village, hour), count in buckets.items():
+                VillageCaseBucket.objects.filter(village=village, hour=hour).update(count=F('count') - count)
+            VillageCaseBucket.objects.filter(count=0).delete()
+            reports.delete()
+            WaterQualityReport.objects.filter(id__gt=marks['water']).delete()
+            LatestWaterReading.objects.all().delete()
+            LatestWaterReading.objects.bulk_create(marks['latest_readings'])
+            Alert.objects.filter(id__gt=marks['alert']).delete()
+            Alert.objects.bulk_update(
+                marks['active_alerts'],
+                ['state', 'message', 'cases', 'score', 'villages', 'escalated_at', 'resolved_at', 'updated_at'],
+            )
+            if self.worker is not None:
+                self.worker.delete()
+            bump_dashboard_version()
+
+    def measure(self, make_request, expected_status=200, before_each=None):
+        """Runs a request repeatedly, recording wall-clock latency and the number of queries."""
+        latencies, query_counts = [], []
+        for i in range(self.warmup + self.iterations):
+            if before_each:
+                before_each()
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = make_request(i)
+                elapsed = (time.perf_counter() - started) * 1000
+            if response.status_code != expected_status:
+                raise CommandError(f"Unexpected status {response.status_code}: {response.content[:200]!r}")
+            if i >= self.warmup:
+                latencies.append(elapsed)
+                query_counts.append(len(queries))
+        return {
+            'p50_ms': round(percentile(latencies, 50), 3),
+            'p95_ms': round(percentile(latencies, 95), 3),
+            'p99_ms': round(percentile(latencies, 99), 3),
+            'mean_ms': round(statistics.mean(latencies), 3),
+            'max_ms': round(max(latencies), 3),
+            'queries_mean': round(statistics.mean(query_counts), 2),
+            'queries_max': max(query_counts),
+        }
+
+    def water_reading(self, i):
+        return {
+            'village': self.villages[i % len(self.villages)],
+            'ph': 7.2,
+            'turbidity': 2.5,
+            'contaminants': {'e-coli': 'low', 'arsenic': 'safe'},
+        }
+
+    def run_scenarios(self, batch_size):
+        client = Client()
+        worker = self.worker = CustomUser.objects.create_user(
+            username=f'benchmark-{uuid.uuid4().hex[:8]}',
+            email=f'benchmark-{uuid.uuid4().hex[:8]}@worker.aquaalert.com',
+            role='worker',
+        )
+        worker_client = Client()
+        worker_client.force_login(worker)
+        results = {}
+
+        # Every request rebuilds the dashboard from the database: moving the version on makes the
+        # cached payload stale without touching anything else in the cache (such as sessions)
+        results['dashboard_data_api'] = self.measure(
+            lambda i: client.get('/api/dashboard-data/'), before_each=advance_dashboard_version
+        )
+        # Repeated polls served from the shared payload cache
+        client.get('/api/dashboard-data/')
+        results['dashboard_data_api_cached'] = self.measure(lambda i: client.get('/api/dashboard-data/'))
+        # Polls that send back the ETag they already have
+        etag = client.get('/api/dashboard-data/')['ETag']
+        results['dashboard_data_api_not_modified'] = self.measure(
+            lambda i: client.get('/api/dashboard-data/', HTTP_IF_NONE_MATCH=etag), expected_status=304
+        )
+
+        results['water_quality_api'] = self.measure(lambda i: client.post(
+            '/api/water-quality/', json.dumps(self.water_reading(i)), content_type='application/json'
+        ))
+        def batch(i):
+            return [self.water_reading(i * batch_size + n) for n in range(batch_size)]
+
+        results['water_quality_api_batch'] = self.measure(lambda i: client.post(
+            '/api/water-quality/', json.dumps(batch(i)), content_type='application/json',
+        ))
+        results['water_quality_api_batch']['readings_per_request'] = batch_size
+        results['water_quality_api_batch']['request_bytes'] = len(json.dumps(batch(0)).encode())
+
+        # The same batches in the packed binary format
+        codes = {village: entry['code'] for village, entry in get_villages().items()}
+        results['water_quality_api_binary'] = self.measure(lambda i: client.post(
+            '/api/water-quality/', binary_format.encode_readings(batch(i), codes), content_type=binary_format.CONTENT_TYPE,
+        ))
+        results['water_quality_api_binary']['readings_per_request'] = batch_size
+        results['water_quality_api_binary']['request_bytes'] = len(binary_format.encode_readings(batch(0), codes))
+
+        # A dashboard loaded now, to poll for the reports submitted below
+        full = client.get('/api/dashboard-data/?map=village')
+        cursor = full.json()['cursor']
+
+        results['submit_health_report_api'] = self.measure(lambda i: worker_client.post(
+            '/api/submit-report/',
+            json.dumps({
+                'village': self.villages[i % len(self.villages)],
+                'ageGroup': '18-50',
+                'symptoms': ['Fever', 'Diarrhea'],
+            }),
+            content_type='application/json',
+        ))
+        # Polls that send their cursor get just the reports submitted since
+        results['dashboard_data_api_delta'] = self.measure(
+            lambda i: client.get('/api/dashboard-data/', {'map': 'village', 'since': cursor})
+        )
+        results['dashboard_data_api_delta']['response_bytes'] = len(
+            client.get('/api/dashboard-data/', {'map': 'village', 'since': cursor}).content
+        )
+        results['dashboard_data_api_delta']['full_response_bytes'] = len(full.content)
+        # The session heartbeat is answered from the cached session, without the user or sessions table
+        results['session_status_api'] = self.measure(lambda i: worker_client.get('/api/session-status/'))
+        worker_client.logout()
+        return results
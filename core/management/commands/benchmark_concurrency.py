@@ -0,0 +1,177 @@
+import json
+import statistics
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections
+from django.test import override_settings
+from django.utils import timezone
+
+from core.history import case_history
+from core.ingest import clean_health_report, clean_water_reading, save_health_reports, save_water_readings
+from core.models import CustomUser
+from core.routers import read_alias, read_database
+from core.views import build_dashboard_data
+from core.villages import get_villages
+
+from .benchmark import percentile
+
+# SQLite's defaults, as the app ran before connections were tuned: rollback journal, full fsync,
+# deferred transactions that fail after the driver's 5 s busy timeout
+BASELINE = {
+    'pragmas': {'journal_mode': 'DELETE', 'synchronous': 'FULL'},
+    'options': {},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures dashboard reads and report writes running at the same time on SQLite, once with "
+        "SQLite's default journal and once with the tuned connection settings (WAL, synchronous=NORMAL, "
+        "immediate transactions), and writes a JSON report comparing them. Each run uses a "
+        "fresh, seeded database in a temporary directory, so the configured database is not touched."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--duration', type=float, default=10, help="Seconds to run each configuration for.")
+        parser.add_argument('--readers', type=int, default=4, help="Threads building the dashboard and case histories.")
+        parser.add_argument('--writers', type=int, default=2, help="Threads saving health reports and water readings.")
+        parser.add_argument('--health', type=int, default=20000, help="Health reports to seed each database with.")
+        parser.add_argument('--water', type=int, default=20000, help="Water readings to seed each database with.")
+        parser.add_argument('--output', help="Write the JSON report here instead of stdout.")
+
+    def handle(self, *args, **options):
+        if connections['default'].vendor != 'sqlite':
+            raise CommandError("This benchmark compares SQLite journal settings; run it with a SQLite DATABASE_URL.")
+        self.villages = list(get_villages())
+        if not self.villages:
+            raise CommandError("No villages are registered. Run the migrations first.")
+
+        tuned = {
+            'pragmas': settings.SQLITE_PRAGMAS,
+            'options': connections['default'].settings_dict.get('OPTIONS', {}),
+        }
+        # Every alias (the primary and any read alias) is pointed at the run's database file
+        aliases = ['default'] + ([read_alias()] if read_alias() != 'default' else [])
+        saved = {alias: dict(connections[alias].settings_dict) for alias in aliases}
+        runs = {}
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                for name, config in (('baseline', BASELINE), ('tuned', tuned)):
+                    connections.close_all()
+                    for alias in aliases:
+                        connections[alias].settings_dict.update(
+                            NAME=str(Path(directory) / f'{name}.sqlite3'),
+                            OPTIONS=config['options'] if alias == 'default' else saved[alias].get('OPTIONS', {}),
+                        )
+                    with override_settings(SQLITE_PRAGMAS=config['pragmas']):
+                        self.prepare(options['health'], options['water'])
+                        runs[name] = self.run(options['duration'], options['readers'], options['writers'])
+                        runs[name]['pragmas'] = config['pragmas']
+                    connections.close_all()
+        finally:
+            for alias in aliases:
+                connections[alias].settings_dict.clear()
+                connections[alias].settings_dict.update(saved[alias])
+
+        report = {
+            'generated_at': timezone.now().isoformat(),
+            'duration_s': options['duration'],
+            'readers': options['readers'],
+            'writers': options['writers'],
+            'read_alias': read_alias(),
+            'runs': runs,
+            'speedup': {
+                key: round(runs['tuned'][key] / runs['baseline'][key], 2) if runs['baseline'][key] else None
+                for key in ('reads_per_s', 'writes_per_s')
+            },
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+            self.stdout.write(f"Report written to {options['output']}")
+        else:
+            self.stdout.write(output)
+
+    def prepare(self, health, water):
+        """Creates, migrates and seeds the run's database."""
+        call_command('migrate', verbosity=0)
+        call_command('seed_reports', health=health, water=water, days=2, seed=1, verbosity=0)
+        self.worker = CustomUser.objects.create_user(
+            username='benchmark-worker', email='benchmark@worker.aquaalert.com', role='worker',
+        )
+
+    def run(self, duration, readers, writers):
+        deadline = time.monotonic() + duration
+        results = {'read': [], 'write': []}
+        errors = []
+        lock = threading.Lock()
+
+        def loop(kind, operation):
+            latencies, failed = [], []
+            i = 0
+            try:
+                while time.monotonic() < deadline:
+                    started = time.perf_counter()
+                    try:
+                        operation(i)
+                    except OperationalError as e:
+                        failed.append(str(e))
+                    else:
+                        latencies.append((time.perf_counter() - started) * 1000)
+                    i += 1
+            finally:
+                connections.close_all()
+            with lock:
+                results[kind].extend(latencies)
+                errors.extend(f"{kind}: {message}" for message in failed)
+
+        threads = [threading.Thread(target=loop, args=('read', self.read)) for _ in range(readers)]
+        threads += [threading.Thread(target=loop, args=('write', self.write)) for _ in range(writers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        run = {}
+        for kind in ('read', 'write'):
+            latencies = results[kind]
+            run[f'{kind}s'] = len(latencies)
+            run[f'{kind}s_per_s'] = round(len(latencies) / duration, 2)
+            if latencies:
+                run[f'{kind}_ms'] = {
+                    'p50': round(percentile(latencies, 50), 3),
+                    'p95': round(percentile(latencies, 95), 3),
+                    'p99': round(percentile(latencies, 99), 3),
+                    'mean': round(statistics.mean(latencies), 3),
+                    'max': round(max(latencies), 3),
+                }
+        run['errors'] = len(errors)
+        run['error_messages'] = sorted(set(errors))[:10]
+        return run
+
+    def read(self, i):
+        """A dashboard poll (rebuilt from the database, not the cache) or, every other time, a case history."""
+        with read_database():
+            if i % 2:
+                now = timezone.now()
+                case_history(self.villages[i % len(self.villages)], now - timedelta(days=2), now)
+            else:
+                build_dashboard_data('village')
+
+    def write(self, i):
+        """A field worker's health report or, every other time, a sensor's water reading."""
+        village = self.villages[i % len(self.villages)]
+        if i % 2:
+            save_water_readings([clean_water_reading({'village': village, 'ph': 7.1, 'turbidity': 2.0})])
+        else:
+            save_health_reports(self.worker, [clean_health_report({
+                'village': village, 'ageGroup': '18-50', 'symptoms': ['Fever', 'Diarrhea'],
+            })])
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.export import EXPORTS, FORMATS, export_queryset, iter_export, parse_time
+from core.routers import read_alias
+
+
+class Command(BaseCommand):
+    help = (
+        "Exports raw health or water quality reports as CSV or NDJSON, streaming rows from the "
+        "database in chunks so memory use stays flat for large exports."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(EXPORTS), help="Which reports to export.")
+        parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+        parser.add_argument('--village', action='append', dest='villages', help="Only this village (repeatable).")
+        parser.add_argument('--start', help="Only reports at or after this ISO 8601 time.")
+        parser.add_argument('--end', help="Only reports before this ISO 8601 time.")
+        parser.add_argument('--output', help="Write to this file instead of stdout.")
+
+    def handle(self, *args, **options):
+        try:
+            start = parse_time(options['start'], 'start') if options['start'] else None
+            end = parse_time(options['end'], 'end') if options['end'] else None
+        except ValueError as e:
+            raise CommandError(e)
+        queryset = export_queryset(options['kind'], options['villages'], start, end).using(read_alias())
+        chunks = iter_export(options['kind'], options['format'], queryset)
+
+        if not options['output']:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+        with open(options['output'], 'w', newline='', encoding='utf-8') as f:
+            for chunk in chunks:
+                f.write(chunk)
+        self.stdout.write(f"Export written to {options['output']}")
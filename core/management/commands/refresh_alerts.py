@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.alerts import update_alerts
+from core.live import bump_dashboard_version
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-evaluates the alerts of every village. Ingestion keeps alerts current as data arrives "
+        "and the dashboard re-evaluates them once an hour, so alerts also resolve once their cases "
+        "leave the detection window; run this to apply changed detection settings right away."
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            changed = update_alerts()
+            if changed:
+                bump_dashboard_version()
+        self.stdout.write(self.style.SUCCESS(f"Alerts re-evaluated ({changed} changed)."))
@@ -0,0 +1,169 @@
+from collections import Counter
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from core.detection import detection_settings
+from core.models import HealthReport, HealthSummary, VillageCaseBucket, WaterQualityReport, WaterQualitySummary
+
+
+def period_starts(timestamp):
+    """The hourly and daily summary buckets a timestamp belongs to."""
+    local = timezone.localtime(timestamp)
+    hour = local.replace(minute=0, second=0, microsecond=0)
+    return {'hour': hour, 'day': hour.replace(hour=0)}
+
+
+class WaterAggregate:
+    """Running min/max/mean of a set of readings. Merging two aggregates gives the aggregate of both sets."""
+
+    def __init__(self):
+        self.count = 0
+        self.ph_min = self.ph_max = self.turbidity_min = self.turbidity_max = None
+        self.ph_sum = self.turbidity_sum = 0.0
+
+    def add(self, count, ph_min, ph_max, ph_mean, turbidity_min, turbidity_max, turbidity_mean):
+        self.count += count
+        self.ph_min = ph_min if self.ph_min is None else min(self.ph_min, ph_min)
+        self.ph_max = ph_max if self.ph_max is None else max(self.ph_max, ph_max)
+        self.turbidity_min = turbidity_min if self.turbidity_min is None else min(self.turbidity_min, turbidity_min)
+        self.turbidity_max = turbidity_max if self.turbidity_max is None else max(self.turbidity_max, turbidity_max)
+        self.ph_sum += ph_mean * count
+        self.turbidity_sum += turbidity_mean * count
+
+    def apply_to(self, summary):
+        summary.reading_count = self.count
+        summary.ph_min, summary.ph_max = self.ph_min, self.ph_max
+        summary.turbidity_min, summary.turbidity_max = self.turbidity_min, self.turbidity_max
+        summary.ph_mean = self.ph_sum / self.count
+        summary.turbidity_mean = self.turbidity_sum / self.count
+
+
+class Command(BaseCommand):
+    help = (
+        "Rolls raw water quality readings and health reports older than --older-than-days into hourly "
+        "and daily summaries, then deletes the raw rows in chunks. Each chunk is summarised and deleted "
+        "in one transaction, so the command is safe to interrupt and rerun. Case buckets are kept for "
+        "as long as outbreak detection reads them (its baseline plus its window), whatever the cutoff."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=float, default=30, help="Roll up raw rows older than this.")
+        parser.add_argument('--chunk-size', type=int, default=5000, help="Raw rows summarised and deleted per transaction.")
+        parser.add_argument(
+            '--prune-hourly-after-days', type=float, default=None,
+            help="Also delete hourly summaries older than this (daily summaries are kept).",
+        )
+
+    def handle(self, *args, **options):
+        # The dashboard reads raw reports and case buckets for the last 48 hours
+        if options['older_than_days'] < 2:
+            raise CommandError("--older-than-days must be at least 2 so the dashboard's 48-hour window stays intact.")
+        cutoff = VillageCaseBucket.bucket_start(timezone.now() - timedelta(days=options['older_than_days']))
+        chunk_size = options['chunk_size']
+
+        water_rows = self.rollup(WaterQualityReport, cutoff, chunk_size, self.rollup_water_chunk)
+        self.stdout.write(self.style.SUCCESS(f"Rolled up and deleted {water_rows} water quality readings."))
+        health_rows = self.rollup(HealthReport, cutoff, chunk_size, self.rollup_health_chunk)
+        self.stdout.write(self.style.SUCCESS(f"Rolled up and deleted {health_rows} health reports."))
+
+        # Outbreak detection builds its baseline from the case buckets before its window
+        config = detection_settings()
+        detection_start = VillageCaseBucket.bucket_start(
+            timezone.now() - timedelta(hours=config['BASELINE_HOURS'] + config['WINDOW_HOURS'])
+        )
+        buckets, _ = VillageCaseBucket.objects.filter(hour__lt=min(cutoff, detection_start)).delete()
+        self.stdout.write(f"Deleted {buckets} expired case buckets.")
+
+        if options['prune_hourly_after_days'] is not None:
+            hourly_cutoff = timezone.now() - timedelta(days=options['prune_hourly_after_days'])
+            pruned = 0
+            for model in (WaterQualitySummary, HealthSummary):
+                count, _ = model.objects.filter(period='hour', period_start__lt=hourly_cutoff).delete()
+                pruned += count
+            self.stdout.write(f"Deleted {pruned} hourly summaries.")
+
+    def rollup(self, model, cutoff, chunk_size, rollup_chunk):
+        total = 0
+        while True:
+            with transaction.atomic():
+                ids = list(
+                    model.objects.filter(timestamp__lt=cutoff)
+                    .order_by('timestamp', 'id')
+                    .values_list('id', flat=True)[:chunk_size]
+                )
+                if not ids:
+                    return total
+                rollup_chunk(ids)
+                model.objects.filter(id__in=ids).delete()
+            total += len(ids)
+            self.stdout.write(f"  {model.__name__}: {total} rows rolled up")
+
+    def rollup_water_chunk(self, ids):
+        aggregates = {}
+        rows = WaterQualityReport.objects.filter(id__in=ids).values_list('village', 'ph', 'turbidity', 'timestamp')
+        for village, ph, turbidity, timestamp in rows:
+            for period, start in period_starts(timestamp).items():
+                aggregate = aggregates.setdefault((village, period, start), WaterAggregate())
+                aggregate.add(1, ph, ph, float(ph), turbidity, turbidity, float(turbidity))
+
+        def merge(summary, aggregate):
+            aggregate.add(
+                summary.reading_count,
+                Decimal(summary.ph_min), Decimal(summary.ph_max), summary.ph_mean,
+                Decimal(summary.turbidity_min), Decimal(summary.turbidity_max), summary.turbidity_mean,
+            )
+            aggregate.apply_to(summary)
+
+        def create(village, period, start, aggregate):
+            summary = WaterQualitySummary(village=village, period=period, period_start=start)
+            aggregate.apply_to(summary)
+            return summary
+
+        self.save_summaries(
+            WaterQualitySummary, aggregates, merge, create,
+            ['reading_count', 'ph_min', 'ph_max', 'ph_mean', 'turbidity_min', 'turbidity_max', 'turbidity_mean'],
+        )
+
+    def rollup_health_chunk(self, ids):
+        aggregates = {}
+        rows = HealthReport.objects.filter(id__in=ids).values_list('village', 'symptoms', 'timestamp')
+        for village, symptoms, timestamp in rows:
+            for period, start in period_starts(timestamp).items():
+                aggregate = aggregates.setdefault((village, period, start), {'cases': 0, 'symptoms': Counter()})
+                aggregate['cases'] += 1
+                aggregate['symptoms'].update(symptoms or [])
+
+        def merge(summary, aggregate):
+            summary.case_count += aggregate['cases']
+            summary.symptom_counts = dict(Counter(summary.symptom_counts) + aggregate['symptoms'])
+
+        def create(village, period, start, aggregate):
+            return HealthSummary(
+                village=village, period=period, period_start=start,
+                case_count=aggregate['cases'], symptom_counts=dict(aggregate['symptoms']),
+            )
+
+        self.save_summaries(HealthSummary, aggregates, merge, create, ['case_count', 'symptom_counts'])
+
+    def save_summaries(self, model, aggregates, merge, create, update_fields):
+        """Merges chunk aggregates into existing summary rows, creating the ones that don't exist yet."""
+        villages = {village for village, _, _ in aggregates}
+        starts = {start for _, _, start in aggregates}
+        existing = {
+            (summary.village, summary.period, summary.period_start): summary
+            for summary in model.objects.select_for_update().filter(village__in=villages, period_start__in=starts)
+        }
+        to_update, to_create = [], []
+        for key, aggregate in aggregates.items():
+            summary = existing.get(key)
+            if summary is not None:
+                merge(summary, aggregate)
+                to_update.append(summary)
+            else:
+                to_create.append(create(*key, aggregate))
+        model.objects.bulk_update(to_update, update_fields, batch_size=500)
+        model.objects.bulk_create(to_create, batch_size=500)
@@ -0,0 +1,111 @@
+import random
+from collections import Counter
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from core.alerts import update_alerts
+from core.live import bump_dashboard_version
+from core.models import CustomUser, HealthReport, LatestWaterReading, VillageCaseBucket, WaterQualityReport
+from core.symptoms import link_symptoms
+from core.villages import get_villages
+
+SYMPTOMS = ['Diarrhea', 'Vomiting', 'Fever', 'Nausea', 'Stomach Cramps', 'Dehydration', 'Headache', 'Jaundice']
+AGE_GROUPS = ['0-5', '6-17', '18-50', '50+']
+CONTAMINANT_LEVELS = ['safe', 'low', 'moderate', 'high', 'critical']
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds synthetic health and water quality reports for load testing, spread across the "
+        "registered villages and the last --days days. Derived tables (case buckets, latest readings) "
+        "are kept in step."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--health', type=int, default=10000, help="Number of health reports to create.")
+        parser.add_argument('--water', type=int, default=10000, help="Number of water quality readings to create.")
+        parser.add_argument('--days', type=float, default=7, help="Spread the reports over this many days up to now.")
+        parser.add_argument('--batch-size', type=int, default=5000, help="Rows per bulk insert.")
+        parser.add_argument('--seed', type=int, default=None, help="Random seed, for repeatable data sets.")
+
+    def handle(self, *args, **options):
+        villages = list(get_villages())
+        if not villages:
+            raise CommandError("No villages are registered. Run the migrations first.")
+        self.rng = random.Random(options['seed'])
+        self.villages = villages
+        self.now = timezone.now()
+        self.span_seconds = options['days'] * 86400
+        self.batch_size = options['batch_size']
+
+        worker, _ = CustomUser.objects.get_or_create(
+            username='loadtest_worker',
+            defaults={'email': 'loadtest_worker@worker.aquaalert.com', 'role': 'worker'},
+        )
+        self.seed_health_reports(worker, options['health'])
+        self.seed_water_reports(options['water'])
+        update_alerts()
+        bump_dashboard_version()
+
+    def random_timestamp(self):
+        return self.now - timedelta(seconds=self.rng.uniform(0, self.span_seconds))
+
+    def batches(self, total):
+        for start in range(0, total, self.batch_size):
+            yield min(self.batch_size, total - start)
+
+    def seed_health_reports(self, worker, total):
+        rng = self.rng
+        created = 0
+        for size in self.batches(total):
+            reports = [
+                HealthReport(
+                    reported_by=worker,
+                    village=rng.choice(self.villages),
+                    age_group=rng.choice(AGE_GROUPS),
+                    symptoms=rng.sample(SYMPTOMS, rng.randint(1, 3)),
+                    timestamp=self.random_timestamp(),
+                )
+                for _ in range(size)
+            ]
+            buckets = Counter((r.village, VillageCaseBucket.bucket_start(r.timestamp)) for r in reports)
+            with transaction.atomic():
+                HealthReport.objects.bulk_create(reports)
+                link_symptoms(reports)
+                for (village, hour), count in buckets.items():
+                    VillageCaseBucket.record(village, hour, count=count)
+            created += size
+            self.stdout.write(f"  {created}/{total} health reports")
+        self.stdout.write(self.style.SUCCESS(f"Seeded {created} health reports."))
+
+    def seed_water_reports(self, total):
+        rng = self.rng
+        created = 0
+        newest = {}
+        for size in self.batches(total):
+            readings = []
+            for _ in range(size):
+                contaminated = rng.random() < 0.1
+                readings.append(WaterQualityReport(
+                    village=rng.choice(self.villages),
+                    ph=round(rng.uniform(4.5, 6.0) if contaminated else rng.uniform(6.8, 7.8), 2),
+                    turbidity=round(rng.uniform(8.0, 20.0) if contaminated else rng.uniform(0.5, 4.5), 2),
+                    contaminants={
+                        'e-coli': rng.choice(CONTAMINANT_LEVELS),
+                        'arsenic': rng.choice(CONTAMINANT_LEVELS),
+                    },
+                    timestamp=self.random_timestamp(),
+                ))
+            readings = WaterQualityReport.objects.bulk_create(readings)
+            for reading in readings:
+                current = newest.get(reading.village)
+                if current is None or reading.timestamp > current.timestamp:
+                    newest[reading.village] = reading
+            created += size
+            self.stdout.write(f"  {created}/{total} water quality readings")
+        for reading in newest.values():
+            LatestWaterReading.record(reading)
+        self.stdout.write(self.style.SUCCESS(f"Seeded {created} water quality readings."))
@@ -0,0 +1,224 @@
+# core/metrics.py
+# Per-view performance metrics, served in the Prometheus text format at /metrics/.
+# MetricsMiddleware records, per URL name: request latency (histogram), status codes, the number
+# and total time of DB queries (through connection.execute_wrapper), time spent serializing
+# JSON and response size. With settings.SLOW_QUERY_MS set, queries slower than that are logged
+# to the 'core.slow_queries' logger with their SQL and the view that ran them.
+# DB time covers executing each statement; rows fetched afterwards in chunks count as view time.
+#
+# Metrics are kept in memory per process, so with several worker processes each one is
+# scraped (or aggregated) separately.
+
+import logging
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django import http
+from django.conf import settings
+from django.db import connections
+
+slow_query_logger = logging.getLogger('core.slow_queries')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Stats of the request being handled in the current thread or task
+_current = ContextVar('aquaalert_request_stats', default=None)
+
+
+class RequestStats:
+    __slots__ = ('queries', 'db_seconds', 'serialize_seconds', 'slow_queries')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self.slow_queries = 0
+
+
+class Registry:
+    """Thread-safe in-memory store of counters and histograms, keyed by metric name and labels."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {} # (name, labels) -> value
+        self._histograms = {} # (name, labels) -> [bucket counts..., +Inf count, sum]
+        self._help = {}
+
+    def describe(self, name, kind, text):
+        self._help[name] = (kind, text)
+
+    def inc(self, name, labels, value=1):
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, labels, value, buckets=LATENCY_BUCKETS):
+        key = (name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0] * (len(buckets) + 2)
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram[i] += 1
+            histogram[-2] += 1
+            histogram[-1] += value
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self, extra=()):
+        """Returns every metric in the Prometheus text exposition format. `extra` adds (name, kind, help, value) gauges."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items())
+        lines = []
+        described = set()
+
+        def header(name):
+            if name not in described and name in self._help:
+                kind, text = self._help[name]
+                lines.append(f"# HELP {name} {text}")
+                lines.append(f"# TYPE {name} {kind}")
+                described.add(name)
+
+        for (name, labels), value in counters:
+            header(name)
+            lines.append(f"{name}{_labels(labels)} {_number(value)}")
+        for (name, labels), histogram in histograms:
+            header(name)
+            for bound, count in zip(LATENCY_BUCKETS, histogram):
+                lines.append(f"{name}_bucket{_labels(labels + (('le', _number(bound)),))} {count}")
+            lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {histogram[-2]}")
+            lines.append(f"{name}_count{_labels(labels)} {histogram[-2]}")
+            lines.append(f"{name}_sum{_labels(labels)} {_number(histogram[-1])}")
+        for name, kind, text, value in extra:
+            lines.append(f"# HELP {name} {text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name} {_number(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for key, value in labels
+    )
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+registry = Registry()
+registry.describe('aquaalert_http_requests_total', 'counter', "Requests handled, by view, method and status code.")
+registry.describe('aquaalert_http_request_duration_seconds', 'histogram', "Time from the request arriving to the response being returned.")
+registry.describe('aquaalert_http_response_bytes_total', 'counter', "Bytes in non-streaming response bodies.")
+registry.describe('aquaalert_db_queries_total', 'counter', "Database queries run while handling requests.")
+registry.describe('aquaalert_db_query_seconds_total', 'counter', "Time spent in database queries.")
+registry.describe('aquaalert_db_slow_queries_total', 'counter', "Queries slower than SLOW_QUERY_MS.")
+registry.describe('aquaalert_json_serialize_seconds_total', 'counter', "Time spent serializing JSON responses.")
+
+
+@contextmanager
+def serialization_timer():
+    """Adds the time spent inside the block to the current request's JSON serialization time."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats = _current.get()
+        if stats is not None:
+            stats.serialize_seconds += time.perf_counter() - started
+
+
+class TimedJsonResponse(http.JsonResponse):
+    """django.http.JsonResponse that records how long serializing its data took."""
+
+    def __init__(self, *args, **kwargs):
+        with serialization_timer():
+            super().__init__(*args, **kwargs)
+
+
+class MetricsMiddleware:
+    """Records latency, DB and serialization metrics for every request, labelled with its URL name."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        slow_ms = getattr(settings, 'SLOW_QUERY_MS', None)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(_QueryTimer(stats, request, slow_ms)))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        elapsed = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        view = (match.view_name if match else None) or 'unresolved'
+        labels = (('view', view),)
+        registry.inc('aquaalert_http_requests_total', labels + (('method', request.method), ('status', str(response.status_code))))
+        registry.observe('aquaalert_http_request_duration_seconds', labels, elapsed)
+        registry.inc('aquaalert_db_queries_total', labels, stats.queries)
+        registry.inc('aquaalert_db_query_seconds_total', labels, stats.db_seconds)
+        registry.inc('aquaalert_json_serialize_seconds_total', labels, stats.serialize_seconds)
+        if stats.slow_queries:
+            registry.inc('aquaalert_db_slow_queries_total', labels, stats.slow_queries)
+        if not response.streaming:
+            registry.inc('aquaalert_http_response_bytes_total', labels, len(response.content))
+        return response
+
+
+class _QueryTimer:
+    """execute_wrapper that times every query of a request and logs the slow ones."""
+
+    def __init__(self, stats, request, slow_ms):
+        self.stats = stats
+        self.request = request
+        self.slow_ms = slow_ms
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.stats.queries += 1
+            self.stats.db_seconds += elapsed
+            if self.slow_ms is not None and elapsed * 1000 >= self.slow_ms:
+                self.stats.slow_queries += 1
+                match = getattr(self.request, 'resolver_match', None)
+                slow_query_logger.warning(
+                    "Slow query (%.1f ms) in %s [%s %s]: %s",
+                    elapsed * 1000, match.view_name if match else 'unresolved',
+                    self.request.method, self.request.path, sql,
+                )
+
+
+def buffer_gauges():
+    """The water ingestion buffer's statistics, if this process has one, as extra gauges for render()."""
+    from . import ingest_buffer
+    buffer = ingest_buffer._water_buffer
+    if buffer is None:
+        return []
+    metrics = buffer.metrics()
+    return [
+        ('aquaalert_water_ingest_buffer_depth', 'gauge', "Readings waiting in the write-behind buffer.", metrics['depth']),
+        ('aquaalert_water_ingest_accepted_total', 'counter', "Readings accepted into the buffer.", metrics['accepted']),
+        ('aquaalert_water_ingest_rejected_total', 'counter', "Readings rejected because the buffer was full.", metrics['rejected']),
+        ('aquaalert_water_ingest_written_total', 'counter', "Buffered readings written to the database.", metrics['written']),
+        ('aquaalert_water_ingest_dropped_total', 'counter', "Buffered readings dropped after failed writes.", metrics['dropped']),
+        ('aquaalert_water_ingest_flush_seconds_total', 'counter', "Time spent flushing the buffer.", metrics['total_flush_ms'] / 1000),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.6 on 2026-10-18 06:02
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncHour
+
+
+def backfill_case_buckets(apps, schema_editor):
+    HealthReport = apps.get_model('core', 'HealthReport')
+    VillageCaseBucket = apps.get_model('core', 'VillageCaseBucket')
+    rows = (
+        HealthReport.objects.annotate(hour=TruncHour('timestamp'))
+        .values('village', 'hour')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    VillageCaseBucket.objects.bulk_create(
+        [VillageCaseBucket(village=row['village'], hour=row['hour'], count=row['count']) for row in rows],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VillageCaseBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('village', models.CharField(max_length=100)),
+                ('hour', models.DateTimeField()),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('village', 'hour'), name='unique_village_case_bucket')],
+            },
+        ),
+        migrations.RunPython(backfill_case_buckets, migrations.RunPython.noop),
+    ]
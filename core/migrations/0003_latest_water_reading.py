@@ -0,0 +1,25 @@
+# Generated by Django 5.2.6 on 2026-10-18 06:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_village_case_bucket'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LatestWaterReading',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('village', models.CharField(max_length=100, unique=True)),
+                ('report_id', models.BigIntegerField(blank=True, null=True)),
+                ('ph', models.DecimalField(decimal_places=2, max_digits=4)),
+                ('turbidity', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('contaminants', models.JSONField(default=dict)),
+                ('timestamp', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.6 on 2026-10-18 06:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_latest_water_reading'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='villagecasebucket',
+            name='unique_village_case_bucket',
+        ),
+        migrations.AddIndex(
+            model_name='healthreport',
+            index=models.Index(fields=['timestamp'], name='core_health_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='healthreport',
+            index=models.Index(fields=['village', 'timestamp'], name='core_health_village_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='waterqualityreport',
+            index=models.Index(fields=['timestamp'], name='core_water_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='waterqualityreport',
+            index=models.Index(fields=['village', 'timestamp'], name='core_water_village_ts_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='villagecasebucket',
+            constraint=models.UniqueConstraint(fields=('hour', 'village'), name='unique_hour_village_case_bucket'),
+        ),
+    ]
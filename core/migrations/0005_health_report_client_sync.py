@@ -0,0 +1,24 @@
+# Generated by Django 5.2.6 on 2026-10-18 06:05
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_report_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='healthreport',
+            name='client_id',
+            field=models.UUIDField(blank=True, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='healthreport',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.6 on 2026-10-18 06:08
+
+from django.db import migrations, models
+
+# The villages the app launched with (previously hard-coded in the dashboard and simulator)
+INITIAL_VILLAGES = [
+    ('mawlynnong_meghalaya', 'Mawlynnong', 25.195, 92.019, 'Meghalaya'),
+    ('ziro_arunachal', 'Ziro', 27.63, 93.83, 'Arunachal Pradesh'),
+    ('majuli_assam', 'Majuli', 26.91, 94.13, 'Assam'),
+    ('khonoma_nagaland', 'Khonoma', 25.67, 94.01, 'Nagaland'),
+    ('moirang_manipur', 'Moirang', 24.50, 93.77, 'Manipur'),
+    ('pelling_sikkim', 'Pelling', 27.32, 88.24, 'Sikkim'),
+    ('champhai_mizoram', 'Champhai', 23.46, 93.33, 'Mizoram'),
+    ('unakoti_tripura', 'Unakoti', 24.08, 92.07, 'Tripura'),
+]
+
+
+def seed_villages(apps, schema_editor):
+    Village = apps.get_model('core', 'Village')
+    Village.objects.bulk_create(
+        [Village(id=id, name=name, latitude=lat, longitude=lng, region=region) for id, name, lat, lng, region in INITIAL_VILLAGES],
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_health_report_client_sync'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Village',
+            fields=[
+                ('id', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=100)),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('region', models.CharField(blank=True, max_length=100)),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+        migrations.RunPython(seed_villages, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-18 06:09
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_village'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='waterqualityreport',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.6 on 2026-10-18 06:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_water_report_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HealthSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('village', models.CharField(max_length=100)),
+                ('period', models.CharField(choices=[('hour', 'Hourly'), ('day', 'Daily')], max_length=4)),
+                ('period_start', models.DateTimeField()),
+                ('case_count', models.PositiveIntegerField(default=0)),
+                ('symptom_counts', models.JSONField(default=dict)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('village', 'period', 'period_start'), name='unique_health_summary')],
+            },
+        ),
+        migrations.CreateModel(
+            name='WaterQualitySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('village', models.CharField(max_length=100)),
+                ('period', models.CharField(choices=[('hour', 'Hourly'), ('day', 'Daily')], max_length=4)),
+                ('period_start', models.DateTimeField()),
+                ('reading_count', models.PositiveIntegerField(default=0)),
+                ('ph_min', models.DecimalField(decimal_places=2, max_digits=4)),
+                ('ph_max', models.DecimalField(decimal_places=2, max_digits=4)),
+                ('ph_mean', models.FloatField()),
+                ('turbidity_min', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('turbidity_max', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('turbidity_mean', models.FloatField()),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('village', 'period', 'period_start'), name='unique_water_summary')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-18 06:15
+
+from django.db import migrations, models
+
+
+def assign_codes(apps, schema_editor):
+    Village = apps.get_model('core', 'Village')
+    villages = list(Village.objects.order_by('id'))
+    for code, village in enumerate(villages, start=1):
+        village.code = code
+    Village.objects.bulk_update(villages, ['code'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_report_summaries'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='village',
+            name='code',
+            field=models.PositiveSmallIntegerField(blank=True, null=True, unique=True),
+        ),
+        migrations.RunPython(assign_codes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.6 on 2026-10-18 06:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# The symptoms offered by the worker form
+FORM_SYMPTOMS = ['Diarrhea', 'Vomiting', 'Fever', 'Nausea', 'Stomach Cramps', 'Dehydration', 'Headache', 'Jaundice']
+
+
+def seed_symptoms(apps, schema_editor):
+    Symptom = apps.get_model('core', 'Symptom')
+    Symptom.objects.bulk_create([Symptom(name=name) for name in FORM_SYMPTOMS], ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_village_code'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Symptom',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='HealthReportSymptom',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('village', models.CharField(max_length=100)),
+                ('timestamp', models.DateTimeField()),
+                ('report', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='symptom_links', to='core.healthreport')),
+                ('symptom', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='core.symptom')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['timestamp', 'village', 'symptom'], name='core_symptom_ts_village_idx')],
+                'constraints': [models.UniqueConstraint(fields=('report', 'symptom'), name='unique_report_symptom')],
+            },
+        ),
+        migrations.RunPython(seed_symptoms, migrations.RunPython.noop),
+    ]
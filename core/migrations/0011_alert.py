@@ -0,0 +1,35 @@
+# Generated by Django 5.2.6 on 2026-10-18 06:34
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_symptom_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Alert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('village', models.CharField(max_length=100)),
+                ('kind', models.CharField(choices=[('outbreak', 'Outbreak'), ('water', 'Contaminated water'), ('cluster', 'Case cluster')], max_length=20)),
+                ('state', models.CharField(choices=[('open', 'Open'), ('escalated', 'Escalated'), ('resolved', 'Resolved')], default='open', max_length=20)),
+                ('message', models.TextField()),
+                ('cases', models.PositiveIntegerField(default=0)),
+                ('score', models.FloatField(blank=True, null=True)),
+                ('villages', models.JSONField(blank=True, default=list)),
+                ('opened_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('escalated_at', models.DateTimeField(blank=True, null=True)),
+                ('resolved_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['state', 'opened_at'], name='core_alert_state_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('state__in', ('open', 'escalated'))), fields=('village', 'kind'), name='unique_active_alert')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-18 06:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_alert'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['updated_at'], name='core_alert_updated_idx'),
+        ),
+    ]
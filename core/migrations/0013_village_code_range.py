@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-18 06:55
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_alert_updated_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='village',
+            name='code',
+            field=models.PositiveIntegerField(blank=True, null=True, unique=True, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(65535)]),
+        ),
+    ]
@@ -1,7 +1,12 @@
 # core/models.py
 
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db import IntegrityError, models, transaction
+from django.db.models import F, Max
+from django.utils import timezone
+
+from .binary_format import MAX_VILLAGE_CODE
 
 # 1. Custom User Model
 # We extend Django's built-in User model to add the 'role' and 'phone_number' fields.
@@ -21,6 +26,44 @@ class CustomUser(AbstractUser):
     def __str__(self):
         return self.username
 
+# 1b. Village Model
+# The registry of villages we monitor. The id is the slug stored on reports (e.g. 'majuli_assam').
+# Code reads villages through core.villages, which keeps them in a process-wide cache.
+class Village(models.Model):
+    id = models.CharField(max_length=100, primary_key=True)
+    name = models.CharField(max_length=100)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    region = models.CharField(max_length=100, blank=True) # e.g. the state
+    # Numeric id used by the binary sensor payload format (core/binary_format.py)
+    code = models.PositiveIntegerField(
+        unique=True, null=True, blank=True, validators=[MinValueValidator(1), MaxValueValidator(MAX_VILLAGE_CODE)],
+    )
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return self.name
+
+    def save(self, *args, **kwargs):
+        if self.code is not None:
+            return super().save(*args, **kwargs)
+        # Takes the next free code. Two concurrent inserts can pick the same one; the unique
+        # constraint rejects the later insert, which then tries the next code.
+        for attempt in range(5):
+            try:
+                with transaction.atomic():
+                    self.code = (Village.objects.aggregate(Max('code'))['code__max'] or 0) + 1
+                    if self.code > MAX_VILLAGE_CODE:
+                        raise ValueError("Every binary format village code is taken.")
+                    super().save(*args, **kwargs)
+                return
+            except IntegrityError:
+                self.code = None
+                if attempt == 4:
+                    raise
+
 # 2. Health Report Model
 # This stores the data submitted by Health Workers.
 class HealthReport(models.Model):
@@ -29,7 +72,17 @@ class HealthReport(models.Model):
     village = models.CharField(max_length=100)
     age_group = models.CharField(max_length=10)
     symptoms = models.JSONField()  # Stores the list of symptoms
-    timestamp = models.DateTimeField(auto_now_add=True) # Automatically sets the time of creation
+    # When the report was made. Defaults to now, but reports synced from offline devices keep the client's time.
+    timestamp = models.DateTimeField(default=timezone.now)
+    # Idempotency key generated on the device, so a report replayed during offline sync is only saved once
+    client_id = models.UUIDField(unique=True, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The dashboard's 48-hour window and per-village lookups
+            models.Index(fields=['timestamp'], name='core_health_ts_idx'),
+            models.Index(fields=['village', 'timestamp'], name='core_health_village_ts_idx'),
+        ]
 
     def __str__(self):
         return f"Report for {self.village} at {self.timestamp.strftime('%Y-%m-%d %H:%M')}"
@@ -42,7 +95,241 @@ class WaterQualityReport(models.Model):
     turbidity = models.DecimalField(max_digits=5, decimal_places=2) # e.g., 1.23 NTU
     # You can add more fields like chlorine, nitrates etc. as needed
     contaminants = models.JSONField(default=dict) # e.g., {"e-coli": "present", "arsenic": "low"}
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now) # Settable, so seeded or replayed readings keep their time
+
+    class Meta:
+        indexes = [
+            # Time-window queries and the per-village "latest reading" lookup
+            models.Index(fields=['timestamp'], name='core_water_ts_idx'),
+            models.Index(fields=['village', 'timestamp'], name='core_water_village_ts_idx'),
+        ]
+
+    def __str__(self):
+        return f"Water report for {self.village} at {self.timestamp.strftime('%Y-%m-%d %H:%M')}"
+
+# 4. Village Case Bucket Model
+# Rolling, hour-bucketed case counts per village. These are updated whenever a health report
+# is saved, so the dashboard reads a fixed number of buckets instead of every recent report.
+class VillageCaseBucket(models.Model):
+    village = models.CharField(max_length=100)
+    hour = models.DateTimeField() # Start of the hour this bucket covers
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # Hour first, so the same index serves both record() and the dashboard's window range
+            models.UniqueConstraint(fields=['hour', 'village'], name='unique_hour_village_case_bucket'),
+        ]
+
+    def __str__(self):
+        return f"{self.count} cases in {self.village} at {self.hour.strftime('%Y-%m-%d %H:00')}"
+
+    @staticmethod
+    def bucket_start(timestamp):
+        """Returns the start of the hour bucket that a timestamp falls into."""
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+
+    @classmethod
+    def record(cls, village, timestamp, count=1):
+        """Adds `count` cases to the bucket for this village and hour, creating it if needed."""
+        hour = cls.bucket_start(timestamp)
+        buckets = cls.objects.filter(village=village, hour=hour)
+        if buckets.update(count=F('count') + count):
+            return
+        try:
+            # The savepoint keeps a concurrent insert of the same bucket from breaking the caller's transaction
+            with transaction.atomic():
+                cls.objects.create(village=village, hour=hour, count=count)
+        except IntegrityError:
+            buckets.update(count=F('count') + count)
+
+# 5. Latest Water Reading Model
+# A denormalized copy of the most recent water quality reading for each village.
+# water_quality_api keeps it up to date, so alert evaluation can fetch every village's
+# current pH, turbidity and contaminants in a single query.
+class LatestWaterReading(models.Model):
+    village = models.CharField(max_length=100, unique=True)
+    report_id = models.BigIntegerField(null=True, blank=True) # WaterQualityReport this was copied from
+    ph = models.DecimalField(max_digits=4, decimal_places=2)
+    turbidity = models.DecimalField(max_digits=5, decimal_places=2)
+    contaminants = models.JSONField(default=dict)
+    timestamp = models.DateTimeField()
+
+    def __str__(self):
+        return f"Latest water reading for {self.village} at {self.timestamp.strftime('%Y-%m-%d %H:%M')}"
+
+    @classmethod
+    def record(cls, report):
+        """Copies a WaterQualityReport into the latest-reading row for its village, unless a newer one is already stored."""
+        values = {
+            'report_id': report.pk,
+            'ph': report.ph,
+            'turbidity': report.turbidity,
+            'contaminants': report.contaminants,
+            'timestamp': report.timestamp,
+        }
+        rows = cls.objects.filter(village=report.village)
+        if rows.filter(timestamp__lte=report.timestamp).update(**values) or rows.exists():
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(village=report.village, **values)
+        except IntegrityError:
+            rows.filter(timestamp__lte=report.timestamp).update(**values)
+
+    @classmethod
+    def for_villages(cls, villages):
+        """Returns {village: LatestWaterReading} for the given villages in one query."""
+        return cls.objects.in_bulk(list(villages), field_name='village')
+
+# 6. Summary Models
+# Raw readings and reports older than the retention age are rolled up into hourly and daily
+# summaries by the `rollup_reports` command, and the raw rows are deleted. History queries
+# (see core.history) combine these summaries with whatever raw data is still present.
+SUMMARY_PERIOD_CHOICES = (
+    ('hour', 'Hourly'),
+    ('day', 'Daily'),
+)
+
+
+class WaterQualitySummary(models.Model):
+    village = models.CharField(max_length=100)
+    period = models.CharField(max_length=4, choices=SUMMARY_PERIOD_CHOICES)
+    period_start = models.DateTimeField()
+    reading_count = models.PositiveIntegerField(default=0)
+    ph_min = models.DecimalField(max_digits=4, decimal_places=2)
+    ph_max = models.DecimalField(max_digits=4, decimal_places=2)
+    ph_mean = models.FloatField()
+    turbidity_min = models.DecimalField(max_digits=5, decimal_places=2)
+    turbidity_max = models.DecimalField(max_digits=5, decimal_places=2)
+    turbidity_mean = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['village', 'period', 'period_start'], name='unique_water_summary'),
+        ]
 
     def __str__(self):
-        return f"Water report for {self.village} at {self.timestamp.strftime('%Y-%m-%d %H:%M')}"
\ No newline at end of file
+        return f"{self.get_period_display()} water summary for {self.village} at {self.period_start.strftime('%Y-%m-%d %H:%M')}"
+
+
+class HealthSummary(models.Model):
+    village = models.CharField(max_length=100)
+    period = models.CharField(max_length=4, choices=SUMMARY_PERIOD_CHOICES)
+    period_start = models.DateTimeField()
+    case_count = models.PositiveIntegerField(default=0)
+    symptom_counts = models.JSONField(default=dict) # e.g. {"Fever": 12, "Diarrhea": 7}
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['village', 'period', 'period_start'], name='unique_health_summary'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_period_display()} health summary for {self.village} at {self.period_start.strftime('%Y-%m-%d %H:%M')}"
+
+# 7. Symptom Index
+# HealthReport.symptoms stays the source of truth; these tables index it. Every distinct symptom
+# name gets a row in the vocabulary, and every (report, symptom) pair gets a link row with the
+# report's village and time copied in, so symptom x village counts for a time window are one
+# grouped query over an index. Links are written with the reports (see core.symptoms) and
+# existing reports are indexed by the `backfill_symptoms` command.
+class Symptom(models.Model):
+    name = models.CharField(max_length=100, unique=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return self.name
+
+class HealthReportSymptom(models.Model):
+    report = models.ForeignKey(HealthReport, on_delete=models.CASCADE, related_name='symptom_links')
+    symptom = models.ForeignKey(Symptom, on_delete=models.PROTECT)
+    village = models.CharField(max_length=100)
+    timestamp = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['report', 'symptom'], name='unique_report_symptom'),
+        ]
+        indexes = [
+            # Covers the dashboard's grouped count: a range on timestamp, grouped by village and symptom
+            models.Index(fields=['timestamp', 'village', 'symptom'], name='core_symptom_ts_village_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.symptom_id} in report {self.report_id}"
+
+
+# 8. Alerts
+# Dashboard alerts are kept as rows, one per (village, kind) while active. They open, move
+# between open and escalated, and resolve as core.alerts re-evaluates the villages.
+# Resolved rows are kept, so the table is also the alert history.
+class Alert(models.Model):
+    OPEN = 'open'
+    ESCALATED = 'escalated'
+    RESOLVED = 'resolved'
+    STATE_CHOICES = (
+        (OPEN, 'Open'),
+        (ESCALATED, 'Escalated'),
+        (RESOLVED, 'Resolved'),
+    )
+    ACTIVE_STATES = (OPEN, ESCALATED)
+
+    KIND_CHOICES = (
+        ('outbreak', 'Outbreak'), # The village's own cases; escalated when its water is contaminated too
+        ('water', 'Contaminated water'), # Predictive: contaminated water but no outbreak (yet)
+        ('cluster', 'Case cluster'), # Cases across this village and its neighbours
+    )
+
+    village = models.CharField(max_length=100)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    state = models.CharField(max_length=20, choices=STATE_CHOICES, default=OPEN)
+    message = models.TextField()
+    cases = models.PositiveIntegerField(default=0)
+    score = models.FloatField(null=True, blank=True)
+    villages = models.JSONField(default=list, blank=True) # Cluster members
+    opened_at = models.DateTimeField(default=timezone.now)
+    escalated_at = models.DateTimeField(null=True, blank=True)
+    resolved_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['village', 'kind'], condition=models.Q(state__in=('open', 'escalated')),
+                name='unique_active_alert',
+            ),
+        ]
+        indexes = [
+            # The dashboard reads the active alerts; history is browsed by time
+            models.Index(fields=['state', 'opened_at'], name='core_alert_state_idx'),
+            # Dashboard deltas read the alerts changed since their cursor
+            models.Index(fields=['updated_at'], name='core_alert_updated_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} alert for {self.village} ({self.state})"
+
+    @property
+    def display_type(self):
+        """The dashboard's alert style: 'critical', 'critical-water', 'predictive' or 'cluster'."""
+        if self.kind == 'outbreak':
+            return 'critical-water' if self.state == self.ESCALATED else 'critical'
+        return 'predictive' if self.kind == 'water' else self.kind
+
+    def as_dict(self):
+        data = {
+            'id': self.id,
+            'type': self.display_type,
+            'state': self.state,
+            'message': self.message,
+            'village_id': self.village,
+            'opened_at': self.opened_at,
+        }
+        if self.score is not None:
+            data['score'] = self.score
+        if self.kind == 'cluster':
+            data['villages'] = self.villages
+        return data
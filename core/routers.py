@@ -0,0 +1,59 @@
+# core/routers.py
+# Read/write database routing.
+# Every write goes to the primary ('default'), and so do reads by default, so ingestion always
+# reads its own writes. Code that only reads and can tolerate a replica being slightly behind -
+# dashboard deltas, history and exports - runs inside read_database(), which sends its reads
+# to the alias named by settings.DATABASE_READ_ALIAS when that database is configured.
+# With SQLite the read alias can point at the same file: in WAL mode its readers never block,
+# or are blocked by, the writers on the primary connection (see tune_sqlite_connection).
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+# Whether the current thread or task is inside read_database()
+_reading = ContextVar('aquaalert_read_database', default=False)
+
+
+def read_alias():
+    """The alias that read_database() reads from: the configured read alias, or the primary without one."""
+    alias = getattr(settings, 'DATABASE_READ_ALIAS', 'read')
+    return alias if alias in settings.DATABASES else DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def read_database():
+    """Routes the reads inside the block to the read alias. Writes still go to the primary."""
+    token = _reading.set(True)
+    try:
+        yield
+    finally:
+        _reading.reset(token)
+
+
+def reads_from_replica(func):
+    """Decorator that runs `func` inside read_database()."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with read_database():
+            return func(*args, **kwargs)
+    return wrapper
+
+
+class ReadWriteRouter:
+    def db_for_read(self, model, **hints):
+        return read_alias() if _reading.get() else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Every alias holds the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary
+        return db == DEFAULT_DB_ALIAS
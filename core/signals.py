@@ -0,0 +1,42 @@
+# core/signals.py
+# Signal receivers, connected in CoreConfig.ready().
+
+from django.conf import settings
+from django.contrib.auth.signals import user_logged_in
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .live import bump_dashboard_version
+from .models import Village
+from .routers import read_alias
+from .villages import invalidate_villages
+
+# Session key holding the logged-in user's role, so the heartbeat can answer without loading the user
+SESSION_ROLE_KEY = 'aquaalert_role'
+
+
+@receiver([post_save, post_delete], sender=Village)
+def village_registry_changed(sender, **kwargs):
+    # Reload the registry everywhere, and rebuild the dashboard since names or coordinates may have changed
+    invalidate_villages()
+    bump_dashboard_version()
+
+
+@receiver(user_logged_in)
+def remember_role_in_session(sender, request, user, **kwargs):
+    if request is not None and hasattr(request, 'session'):
+        request.session[SESSION_ROLE_KEY] = user.role
+
+
+@receiver(connection_created)
+def tune_sqlite_connection(sender, connection, **kwargs):
+    """Applies settings.SQLITE_PRAGMAS to new SQLite connections, and makes read-alias ones query-only."""
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = dict(getattr(settings, 'SQLITE_PRAGMAS', {}))
+    if connection.alias != 'default' and connection.alias == read_alias():
+        pragmas['query_only'] = 'ON'
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
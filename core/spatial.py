@@ -0,0 +1,143 @@
+# core/spatial.py
+# In-process spatial index over the village registry, for "villages within R km" and
+# "k nearest villages" lookups and for summing cases across neighbouring villages.
+# Villages are bucketed into a fixed grid of GRID_DEGREES cells; a query only computes
+# (great-circle) distances for the villages in the cells its radius overlaps. The index is built
+# on first use and rebuilt whenever the village registry is reloaded.
+
+import math
+import threading
+from collections import defaultdict
+
+import numpy as np
+
+from .villages import get_villages
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+GRID_DEGREES = 0.25 # About 28 km north-south
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance in km. Works on scalars or NumPy arrays."""
+    lat1, lng1, lat2, lng2 = (np.radians(value) for value in (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class SpatialIndex:
+    def __init__(self, villages, cell_degrees=GRID_DEGREES):
+        """`villages` is the registry: {village_id: {'lat', 'lng', ...}}."""
+        self.ids = list(villages)
+        self.positions = {village_id: i for i, village_id in enumerate(self.ids)}
+        self.lat = np.array([villages[v]['lat'] for v in self.ids], dtype=np.float64)
+        self.lng = np.array([villages[v]['lng'] for v in self.ids], dtype=np.float64)
+        self.cell_degrees = cell_degrees
+        cells = defaultdict(list)
+        for i, (lat, lng) in enumerate(zip(self.lat, self.lng)):
+            cells[self._cell(lat, lng)].append(i)
+        self.cells = {key: np.array(members) for key, members in cells.items()}
+        self._neighbors = {}
+        self._lock = threading.Lock()
+
+    def _cell(self, lat, lng):
+        return math.floor(lat / self.cell_degrees), math.floor(lng / self.cell_degrees)
+
+    def _candidates(self, lat, lng, radius_km):
+        """Indices of the villages in every grid cell that a circle of `radius_km` around (lat, lng) touches."""
+        dlat = radius_km / KM_PER_DEGREE
+        # Degrees of longitude shrink towards the poles; beyond ~89° just take every longitude
+        cos_lat = math.cos(math.radians(min(abs(lat) + dlat, 89.0)))
+        dlng = min(radius_km / (KM_PER_DEGREE * cos_lat), 180.0)
+        row_min, col_min = self._cell(lat - dlat, lng - dlng)
+        row_max, col_max = self._cell(lat + dlat, lng + dlng)
+        if (row_max - row_min + 1) * (col_max - col_min + 1) > len(self.cells):
+            # The box covers more cells than exist: cheaper to walk the occupied cells
+            found = [
+                members for (row, col), members in self.cells.items()
+                if row_min <= row <= row_max and (dlng >= 180.0 or col_min <= col <= col_max)
+            ]
+        else:
+            found = [
+                self.cells[(row, col)]
+                for row in range(row_min, row_max + 1) for col in range(col_min, col_max + 1)
+                if (row, col) in self.cells
+            ]
+        return np.concatenate(found) if found else np.empty(0, dtype=np.int64)
+
+    def within(self, lat, lng, radius_km):
+        """Returns [(village_id, distance_km)] for the villages within `radius_km`, nearest first."""
+        candidates = self._candidates(lat, lng, radius_km)
+        distances = haversine_km(lat, lng, self.lat[candidates], self.lng[candidates])
+        inside = distances <= radius_km
+        candidates, distances = candidates[inside], distances[inside]
+        order = np.argsort(distances, kind='stable')
+        return [(self.ids[candidates[i]], float(distances[i])) for i in order]
+
+    def nearest(self, lat, lng, k, allowed=None):
+        """
+        Returns the `k` villages nearest to (lat, lng) as [(village_id, distance_km)], nearest first.
+        `allowed` optionally restricts the search to a set of village ids (e.g. those with a sensor).
+        """
+        if k <= 0 or not self.ids:
+            return []
+        radius = self.cell_degrees * KM_PER_DEGREE
+        while True:
+            found = self.within(lat, lng, radius)
+            if allowed is not None:
+                found = [item for item in found if item[0] in allowed]
+            # Everything within the radius is found, so once there are k the answer is exact
+            if len(found) >= k or radius >= math.pi * EARTH_RADIUS_KM:
+                return found[:k]
+            radius *= 2
+
+    def neighbors(self, radius_km):
+        """
+        Every village's neighbours within `radius_km` (itself included), as CSR arrays
+        (indptr, indices) over self.ids. Computed once per radius.
+        """
+        with self._lock:
+            cached = self._neighbors.get(radius_km)
+            if cached is not None:
+                return cached
+            indptr, indices = [0], []
+            for i in range(len(self.ids)):
+                candidates = self._candidates(self.lat[i], self.lng[i], radius_km)
+                distances = haversine_km(self.lat[i], self.lng[i], self.lat[candidates], self.lng[candidates])
+                members = candidates[distances <= radius_km]
+                indices.extend(members.tolist())
+                indptr.append(len(indices))
+            cached = self._neighbors[radius_km] = (np.array(indptr), np.array(indices, dtype=np.int64))
+            return cached
+
+    def around(self, village_ids, radius_km):
+        """The villages within `radius_km` of any of `village_ids` (themselves included), in index order."""
+        indptr, indices = self.neighbors(radius_km)
+        found = np.zeros(len(self.ids), dtype=bool)
+        for village_id in village_ids:
+            i = self.positions.get(village_id)
+            if i is not None:
+                found[indices[indptr[i]:indptr[i + 1]]] = True
+        return [self.ids[i] for i in np.flatnonzero(found)]
+
+    def neighborhood_sums(self, values, radius_km):
+        """For an array aligned with self.ids, returns each village's sum of `values` over its neighbours."""
+        indptr, indices = self.neighbors(radius_km)
+        if not len(self.ids):
+            return np.zeros(0)
+        # Every village is its own neighbour, so no segment is empty
+        return np.add.reduceat(values[indices], indptr[:-1])
+
+
+_index = {'villages': None, 'index': None}
+_index_lock = threading.Lock()
+
+
+def get_spatial_index():
+    """The index for the current village registry, rebuilt when the registry is reloaded."""
+    villages = get_villages()
+    with _index_lock:
+        if _index['villages'] is not villages:
+            _index['index'] = SpatialIndex(villages)
+            _index['villages'] = villages
+        return _index['index']
@@ -0,0 +1,86 @@
+# core/symptoms.py
+# The symptom vocabulary and the report-symptom index (see the Symptom models).
+# The vocabulary is small and only ever grows, so each process keeps it in memory and
+# reloads it when it meets a name or id it doesn't know yet.
+
+from django.db.models import Count, Q
+
+from .models import HealthReportSymptom, Symptom
+
+_vocabulary = {'ids': {}, 'names': {}} # name -> id, id -> name
+
+
+def _reload():
+    ids = dict(Symptom.objects.values_list('name', 'id'))
+    _vocabulary['ids'] = ids
+    _vocabulary['names'] = {id: name for name, id in ids.items()}
+
+
+def symptom_ids(names):
+    """Returns {name: id} for `names`, adding any new names to the vocabulary."""
+    missing = [name for name in names if name not in _vocabulary['ids']]
+    if missing:
+        _reload()
+        missing = [name for name in set(missing) if name not in _vocabulary['ids']]
+        if missing:
+            Symptom.objects.bulk_create([Symptom(name=name) for name in missing], ignore_conflicts=True)
+            _reload()
+    return {name: _vocabulary['ids'][name] for name in names}
+
+
+def symptom_names(ids):
+    """Returns {id: name} for `ids`."""
+    if any(id not in _vocabulary['names'] for id in ids):
+        _reload()
+    return {id: _vocabulary['names'][id] for id in ids}
+
+
+def link_symptoms(reports):
+    """Indexes the symptoms of saved HealthReports. Safe to repeat: existing links are skipped."""
+    names = {name for report in reports for name in report.symptoms or []}
+    if not names:
+        return 0
+    ids = symptom_ids(names)
+    links = [
+        HealthReportSymptom(report_id=report.pk, symptom_id=ids[name], village=report.village, timestamp=report.timestamp)
+        for report in reports for name in set(report.symptoms or [])
+    ]
+    HealthReportSymptom.objects.bulk_create(links, batch_size=1000, ignore_conflicts=True)
+    return len(links)
+
+
+def symptom_breakdown(since, villages=None, until=None, report_ids=None):
+    """
+    Returns {village: {symptom name: reports}} for reports since `since` (and before `until`),
+    from one grouped query. `report_ids` optionally limits it to a (after, up to and including)
+    range of report ids, either end None for open.
+    """
+    links = HealthReportSymptom.objects.filter(timestamp__gte=since)
+    if until is not None:
+        links = links.filter(timestamp__lt=until)
+    if villages is not None:
+        links = links.filter(village__in=villages)
+    after, last = report_ids or (None, None)
+    if after is None and last is not None:
+        # An upper bound alone in the WHERE clause would steer the planner off the timestamp index
+        # onto report_id, so the bound goes into the count instead, still in a single query
+        breakdown = _grouped(links, Count('id', filter=Q(report_id__lte=last)))
+    else:
+        if after is not None:
+            links = links.filter(report_id__gt=after)
+        if last is not None:
+            links = links.filter(report_id__lte=last)
+        breakdown = _grouped(links)
+    for village, counts in breakdown.items():
+        breakdown[village] = dict(sorted(counts.items(), key=lambda item: item[1], reverse=True))
+    return breakdown
+
+
+def _grouped(links, count=None):
+    rows = list(links.values_list('village', 'symptom').annotate(reports=count or Count('id')).order_by())
+    names = symptom_names({symptom for _, symptom, reports in rows if reports})
+    breakdown = {}
+    for village, symptom, reports in rows:
+        if reports:
+            breakdown.setdefault(village, {})[names[symptom]] = reports
+    return breakdown
@@ -1,3 +1,857 @@
-from django.test import TestCase
+import base64
+import csv
+import json
+import os
+import random
+import tempfile
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Count
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from . import binary_format, detection, views
+from .alerts import update_alerts
+from .ingest import clean_health_report, clean_water_reading, save_health_reports, save_water_readings
+from .ingest_buffer import WriteBehindBuffer
+from .live import advance_dashboard_version
+from .metrics import registry as metrics_registry
+from .models import (
+    Alert, CustomUser, HealthReport, HealthReportSymptom, HealthSummary, LatestWaterReading, Village, VillageCaseBucket,
+    WaterQualityReport, WaterQualitySummary,
+)
+from .routers import ReadWriteRouter, read_database
+from .spatial import SpatialIndex, haversine_km
+from .symptoms import symptom_breakdown
+
+VILLAGES = [
+    'mawlynnong_meghalaya', 'ziro_arunachal', 'majuli_assam',
+    'khonoma_nagaland', 'moirang_manipur', 'pelling_sikkim',
+    'champhai_mizoram', 'unakoti_tripura'
+]
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN output is SQLite specific')
+class DashboardQueryPlanTests(TestCase):
+    """Fails if any of the dashboard's queries falls back to a full table scan."""
+
+    @classmethod
+    def setUpTestData(cls):
+        worker = CustomUser.objects.create_user(
+            username='9000000000', email='9000000000@worker.aquaalert.com', password='secret123', role='worker'
+        )
+        now = timezone.now()
+        health_reports, water_reports = [], []
+        for i in range(400):
+            village = VILLAGES[i % len(VILLAGES)]
+            health_reports.append(HealthReport(reported_by=worker, village=village, age_group='0-5', symptoms=['Fever']))
+            water_reports.append(WaterQualityReport(village=village, ph='7.10', turbidity='2.50', contaminants={}))
+        HealthReport.objects.bulk_create(health_reports)
+        WaterQualityReport.objects.bulk_create(water_reports)
+        # Spread the seeded rows across a week so the 48-hour window is selective
+        for i, report_id in enumerate(HealthReport.objects.values_list('id', flat=True)):
+            HealthReport.objects.filter(id=report_id).update(timestamp=now - timedelta(minutes=25 * i))
+        for i, report_id in enumerate(WaterQualityReport.objects.values_list('id', flat=True)):
+            WaterQualityReport.objects.filter(id=report_id).update(timestamp=now - timedelta(minutes=25 * i))
+        for village in VILLAGES:
+            for hour in range(72):
+                VillageCaseBucket.objects.create(village=village, hour=VillageCaseBucket.bucket_start(now) - timedelta(hours=hour), count=1)
+        call_command('backfill_symptoms', stdout=StringIO())
+        cls.now = now
+
+    def assertNoTableScan(self, queryset):
+        plan = queryset.explain()
+        self.assertNotIn('SCAN', plan, f"Query fell back to a table scan:\n{queryset.query}\n{plan}")
+
+    def test_recent_health_reports_window(self):
+        self.assertNoTableScan(HealthReport.objects.filter(timestamp__gte=self.now - timedelta(hours=48)))
+
+    def test_village_case_bucket_window(self):
+        first_hour = VillageCaseBucket.bucket_start(self.now) - timedelta(hours=47)
+        self.assertNoTableScan(
+            VillageCaseBucket.objects.filter(hour__gte=first_hour, hour__lt=self.now).values_list('village', 'hour', 'count')
+        )
+
+    def test_latest_water_reading_per_village(self):
+        self.assertNoTableScan(
+            WaterQualityReport.objects.filter(village='majuli_assam').order_by('-timestamp')[:1]
+        )
+
+    def test_latest_readings_lookup(self):
+        self.assertNoTableScan(LatestWaterReading.objects.filter(village__in=VILLAGES))
+
+    def test_recent_water_reports_window(self):
+        self.assertNoTableScan(WaterQualityReport.objects.filter(timestamp__gte=self.now - timedelta(hours=48)))
+
+    def test_symptom_breakdown_window(self):
+        self.assertEqual(HealthReportSymptom.objects.count(), 400)
+        self.assertNoTableScan(
+            HealthReportSymptom.objects.filter(timestamp__gte=self.now - timedelta(hours=48))
+            .values_list('village', 'symptom').annotate(reports=Count('id')).order_by()
+        )
+
+    def test_active_alerts_lookup(self):
+        self.assertNoTableScan(Alert.objects.filter(state__in=Alert.ACTIVE_STATES))
+
+
+class DashboardConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_unchanged_data_returns_304(self):
+        response = self.client.get('/api/dashboard-data/')
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        response = self.client.get('/api/dashboard-data/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_ingestion_changes_etag(self):
+        etag = self.client.get('/api/dashboard-data/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                '/api/water-quality/',
+                json.dumps({'village': 'majuli_assam', 'ph': 5.5, 'turbidity': 12.0}),
+                content_type='application/json',
+            )
+
+        response = self.client.get('/api/dashboard-data/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['alerts'][0]['village_id'], 'majuli_assam')
+
+    def test_cached_payload_skips_queries(self):
+        self.client.get('/api/dashboard-data/')
+        with self.assertNumQueries(0):
+            self.client.get('/api/dashboard-data/')
+
+    def test_delta_returns_only_new_reports(self):
+        worker = CustomUser.objects.create_user(
+            username='9000000000', email='9000000000@worker.aquaalert.com', password='secret123', role='worker'
+        )
+        save_health_reports(worker, [clean_health_report({'village': 'ziro_arunachal', 'symptoms': ['Fever']})])
+        full = self.client.get('/api/dashboard-data/?map=village').json()
+        self.assertEqual([m['count'] for m in full['map_report_data']], [1])
+
+        # While nothing has been written the delta is empty and needs no queries
+        with self.assertNumQueries(0):
+            delta = self.client.get('/api/dashboard-data/', {'map': 'village', 'since': full['cursor']}).json()
+        self.assertEqual((delta['villages'], delta['alerts'], delta['cursor']), ({}, [], full['cursor']))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            save_health_reports(worker, [clean_health_report({'village': 'majuli_assam', 'symptoms': ['Fever', 'Nausea']})])
+        delta = self.client.get('/api/dashboard-data/', {'map': 'village', 'since': full['cursor']}).json()
+        self.assertTrue(delta['delta'])
+        self.assertEqual(list(delta['villages']), ['majuli_assam'])
+        change = delta['villages']['majuli_assam']
+        self.assertEqual((change['cases'], change['chart'], change['symptoms']), (1, 1, {'Fever': 1, 'Nausea': 1}))
+
+        # Nothing new since the delta's own cursor
+        delta = self.client.get('/api/dashboard-data/', {'map': 'village', 'since': delta['cursor']}).json()
+        self.assertEqual(delta['villages'], {})
+        self.assertEqual(self.client.get('/api/dashboard-data/', {'since': 'bogus'}).status_code, 400)
+
+        # A cursor with naive times was not issued by the server
+        naive = base64.urlsafe_b64encode(b'1|2026-01-01T00:00:00|2026-01-01T00:00:00|').decode()
+        self.assertEqual(self.client.get('/api/dashboard-data/', {'since': naive}).status_code, 400)
+
+    def test_payload_stops_at_the_cursor(self):
+        worker = CustomUser.objects.create_user(
+            username='9000000000', email='9000000000@worker.aquaalert.com', password='secret123', role='worker'
+        )
+        save_health_reports(worker, [clean_health_report({'village': 'majuli_assam', 'symptoms': ['Fever']})])
+        last_report_id = HealthReport.objects.latest('id').id
+        # Committed while the payload is being built: the next delta counts it, so the payload must not
+        save_health_reports(worker, [clean_health_report({'village': 'majuli_assam', 'symptoms': ['Fever', 'Rash']})])
+        now = timezone.now()
+
+        window_start = VillageCaseBucket.bucket_start(now) - timedelta(hours=47)
+        self.assertEqual(views._window_case_counts(window_start, last_report_id), {'majuli_assam': 1})
+        self.assertEqual(
+            symptom_breakdown(now - timedelta(hours=48), report_ids=(None, last_report_id)), {'majuli_assam': {'Fever': 1}},
+        )
+
+
+@override_settings(DASHBOARD_STREAM_CHECK_SECONDS=0, DASHBOARD_STREAM_MAX_SECONDS=10)
+class DashboardStreamTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.official = CustomUser.objects.create_user(
+            username='official', email='official@example.org', password='secret123', role='official'
+        )
+
+    async def test_pushes_an_event_when_the_version_moves(self):
+        await self.async_client.aforce_login(self.official)
+        response = await self.async_client.get('/api/dashboard-stream/')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = aiter(response.streaming_content)
+        try:
+            self.assertEqual(await anext(events), b'retry: 0\n\n')
+            first = (await anext(events)).decode()
+            self.assertTrue(first.startswith('event: dashboard\n'))
+            self.assertIn('"map_report_data"', first)
+
+            advance_dashboard_version()
+            second = (await anext(events)).decode()
+            self.assertTrue(second.startswith('event: dashboard\n'))
+            self.assertNotEqual(second.split('\n')[1], first.split('\n')[1]) # A new id: the new state
+        finally:
+            await events.aclose()
+
+    async def test_requires_an_official(self):
+        response = await self.async_client.get('/api/dashboard-stream/')
+        self.assertEqual(response.status_code, 403)
+
+
+class WaterIngestValidationTests(TestCase):
+    def test_non_finite_values_are_reported_per_reading(self):
+        response = self.client.post('/api/water-quality/', json.dumps([
+            {'village': 'majuli_assam', 'ph': 7.0, 'turbidity': 2.0},
+            {'village': 'majuli_assam', 'ph': 'NaN', 'turbidity': 2.0},
+            {'village': 'majuli_assam', 'ph': 7.0, 'turbidity': 'Infinity'},
+        ]), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors'], [
+            {'index': 1, 'message': "'ph' must be a number."},
+            {'index': 2, 'message': "'turbidity' must be a number."},
+        ])
+        self.assertFalse(WaterQualityReport.objects.exists())
+
+
+class OfflineSyncTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.worker = CustomUser.objects.create_user(
+            username='9000000005', email='9000000005@worker.aquaalert.com', password='secret123', role='worker'
+        )
+        self.client.force_login(self.worker)
+
+    def sync(self, reports):
+        return self.client.post('/api/submit-reports/', json.dumps({'reports': reports}), content_type='application/json')
+
+    def test_resubmission_is_idempotent_and_keeps_the_client_time(self):
+        made_at = (timezone.now() - timedelta(hours=5)).replace(microsecond=0)
+        report = {
+            'clientId': str(uuid.uuid4()), 'village': 'majuli_assam', 'symptoms': ['Fever'],
+            'timestamp': made_at.isoformat(),
+        }
+        for _ in range(2):
+            response = self.sync([report])
+            self.assertEqual(response.json()['acknowledged'], [report['clientId']])
+        self.assertEqual(HealthReport.objects.get().timestamp, made_at)
+        self.assertEqual(sum(VillageCaseBucket.objects.values_list('count', flat=True)), 1)
+
+    def test_acknowledges_and_rejects_per_report(self):
+        good = {'clientId': str(uuid.uuid4()), 'village': 'majuli_assam', 'symptoms': ['Fever']}
+        unknown = {'clientId': str(uuid.uuid4()), 'village': 'atlantis', 'symptoms': ['Fever']}
+        ancient = {
+            'clientId': str(uuid.uuid4()), 'village': 'majuli_assam', 'symptoms': ['Fever'],
+            'timestamp': '1900-01-01T00:00:00+00:00',
+        }
+        response = self.sync([good, unknown, ancient, {'village': 'majuli_assam', 'symptoms': ['Fever']}])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['acknowledged'], [good['clientId']])
+        self.assertEqual(
+            [item['clientId'] for item in response.json()['rejected']], [unknown['clientId'], ancient['clientId'], None],
+        )
+        self.assertEqual(HealthReport.objects.count(), 1)
+        self.assertFalse(VillageCaseBucket.objects.filter(hour__year=1900).exists())
+
+
+class BinaryFormatTests(TestCase):
+    def setUp(self):
+        self.codes = dict(Village.objects.values_list('id', 'code'))
+        self.readings = [
+            {'village': 'majuli_assam', 'ph': 7.2, 'turbidity': 2.5, 'contaminants': {'e-coli': 'low', 'arsenic': 'safe'}},
+            {'village': 'ziro_arunachal', 'ph': 5.55, 'turbidity': 999.99, 'contaminants': {'arsenic': 'critical'}},
+        ]
+
+    def test_round_trip(self):
+        payload = binary_format.encode_readings(self.readings, self.codes)
+        self.assertEqual(len(payload), binary_format.HEADER.size + 2 * binary_format.RECORD.size)
+        response = self.client.post('/api/water-quality/', payload, content_type=binary_format.CONTENT_TYPE)
+        self.assertEqual(response.status_code, 200)
+        saved = WaterQualityReport.objects.order_by('id').values_list('village', 'ph', 'turbidity', 'contaminants')
+        self.assertEqual(list(saved), [
+            ('majuli_assam', Decimal('7.20'), Decimal('2.50'), {'e-coli': 'low', 'arsenic': 'safe'}),
+            ('ziro_arunachal', Decimal('5.55'), Decimal('999.99'), {'arsenic': 'critical'}),
+        ])
+
+    def test_malformed_payloads(self):
+        payload = binary_format.encode_readings(self.readings, self.codes)
+        bad = {
+            'shorter than its header': payload[:5],
+            'declares 2 readings': payload[:-1],
+            'magic bytes': b'XXXX' + payload[4:],
+            'version 9': payload[:4] + (9).to_bytes(2, 'little') + payload[6:],
+        }
+        for message, body in bad.items():
+            with self.subTest(message):
+                with self.assertRaisesRegex(ValueError, message):
+                    list(binary_format.iter_records(body))
+                response = self.client.post('/api/water-quality/', body, content_type=binary_format.CONTENT_TYPE)
+                self.assertEqual(response.status_code, 400)
+        with self.assertRaisesRegex(ValueError, 'no binary format code'):
+            binary_format.encode_readings(self.readings, {})
+
+    def test_unknown_village_code(self):
+        payload = binary_format.encode_readings(self.readings, {'majuli_assam': self.codes['majuli_assam'], 'ziro_arunachal': 60000})
+        response = self.client.post('/api/water-quality/', payload, content_type=binary_format.CONTENT_TYPE)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors'], [{'index': 1, 'message': 'Unknown village code 60000.'}])
+        self.assertFalse(WaterQualityReport.objects.exists())
+
+    def test_new_villages_get_the_next_code(self):
+        last = max(self.codes.values())
+        village = Village.objects.create(id='new_village', name='New Village', latitude=26.0, longitude=92.0)
+        self.assertEqual(village.code, last + 1)
+        # A concurrent insert took the code this one picked first: it moves on to the next
+        stale = [{'code__max': last}, {'code__max': last + 1}]
+        with mock.patch.object(Village.objects, 'aggregate', side_effect=stale):
+            village = Village.objects.create(id='racing_village', name='Racing Village', latitude=26.1, longitude=92.1)
+        self.assertEqual(village.code, last + 2)
+
+
+class WriteBehindBufferTests(TestCase):
+    def make_buffer(self, save=None, **kwargs):
+        saved = []
+        buffer = WriteBehindBuffer(save or saved.append, **{'flush_seconds': 60, **kwargs})
+        self.addCleanup(buffer.stop, timeout=1)
+        return buffer, saved
+
+    def test_flushes_in_batches_and_on_stop(self):
+        buffer, saved = self.make_buffer(max_size=10, flush_size=4)
+        self.assertTrue(buffer.offer(list(range(3))))
+        self.assertFalse(buffer.offer(list(range(8)))) # All or nothing when it would overflow
+        buffer.flush()
+        self.assertEqual(saved, [[0, 1, 2]])
+
+        buffer.offer(list(range(3, 9)))
+        buffer.stop(timeout=5)
+        self.assertEqual(sum(saved, []), list(range(9)))
+        self.assertTrue(all(len(batch) <= 4 for batch in saved))
+        self.assertFalse(buffer.offer([9])) # Stopped buffers take nothing more
+        metrics = buffer.metrics()
+        self.assertEqual((metrics['depth'], metrics['accepted'], metrics['written'], metrics['rejected']), (0, 9, 9, 9))
+
+    def test_failed_writes_are_retried_then_dropped(self):
+        def save(batch):
+            raise RuntimeError("database unavailable")
+        buffer, _ = self.make_buffer(save=save, max_attempts=2)
+        buffer.offer([1, 2])
+        with mock.patch('core.ingest_buffer.time.sleep'), self.assertLogs('core.ingest_buffer', 'ERROR'):
+            buffer.flush()
+        metrics = buffer.metrics()
+        self.assertEqual((metrics['flush_errors'], metrics['dropped'], metrics['written']), (2, 2, 0))
+
+    @override_settings(WATER_INGEST_BUFFERED=True)
+    def test_api_accepts_then_pushes_back(self):
+        buffer, saved = self.make_buffer(max_size=2, flush_size=100)
+        reading = {'village': 'majuli_assam', 'ph': 7.0, 'turbidity': 2.0}
+        with mock.patch('core.views.get_water_buffer', return_value=buffer):
+            response = self.client.post('/api/water-quality/', json.dumps(reading), content_type='application/json')
+            self.assertEqual(response.status_code, 202)
+            response = self.client.post('/api/water-quality/', json.dumps([reading] * 2), content_type='application/json')
+            self.assertEqual(response.status_code, 429)
+            self.assertEqual(response['Retry-After'], '1')
+        buffer.stop(timeout=5)
+        self.assertEqual([r['village'] for batch in saved for r in batch], ['majuli_assam'])
+        self.assertFalse(WaterQualityReport.objects.exists())
+
+
+@override_settings(OUTBREAK_DETECTION={'METHOD': 'threshold', 'CLUSTER_RADIUS_KM': 0})
+class AlertStateTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.worker = CustomUser.objects.create_user(
+            username='9000000000', email='9000000000@worker.aquaalert.com', password='secret123', role='worker'
+        )
+
+    def test_outbreak_opens_escalates_and_resolves(self):
+        reports = [clean_health_report({'village': 'majuli_assam', 'symptoms': ['Fever']}) for _ in range(5)]
+        save_health_reports(self.worker, reports)
+        alert = Alert.objects.get(village='majuli_assam', kind='outbreak')
+        self.assertEqual((alert.state, alert.cases), (Alert.OPEN, 5))
+
+        save_water_readings([clean_water_reading({'village': 'majuli_assam', 'ph': 6.0, 'turbidity': 9.5})])
+        alert.refresh_from_db()
+        self.assertEqual(alert.state, Alert.ESCALATED)
+        self.assertEqual(alert.as_dict()['type'], 'critical-water')
+        self.assertFalse(Alert.objects.filter(kind='water').exists())
+
+        # Once the cases leave the window the outbreak resolves, and the water alert takes over
+        update_alerts(now=timezone.now() + timedelta(days=3))
+        alert.refresh_from_db()
+        self.assertEqual(alert.state, Alert.RESOLVED)
+        self.assertIsNotNone(alert.resolved_at)
+        self.assertEqual(
+            list(Alert.objects.filter(state__in=Alert.ACTIVE_STATES).values_list('village', 'kind')),
+            [('majuli_assam', 'water')],
+        )
+
+    def test_outbreak_de_escalates_once_water_recovers(self):
+        reports = [clean_health_report({'village': 'majuli_assam', 'symptoms': ['Fever']}) for _ in range(5)]
+        save_health_reports(self.worker, reports)
+        save_water_readings([clean_water_reading({'village': 'majuli_assam', 'ph': 6.0, 'turbidity': 9.5})])
+        save_water_readings([clean_water_reading({'village': 'majuli_assam', 'ph': 7.0, 'turbidity': 1.0})])
+        alert = Alert.objects.get(village='majuli_assam', kind='outbreak')
+        self.assertEqual((alert.state, alert.escalated_at), (Alert.OPEN, None))
+        self.assertEqual(alert.as_dict()['type'], 'critical')
+
+    def test_dashboard_re_evaluates_alerts_once_an_hour(self):
+        reports = [clean_health_report({'village': 'majuli_assam', 'symptoms': ['Fever']}) for _ in range(5)]
+        save_health_reports(self.worker, reports)
+
+        # No new data arrives, but the cases leave the window as the hours pass
+        later = timezone.now() + timedelta(days=3)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            with mock.patch('core.live.update_alerts', wraps=update_alerts) as evaluate:
+                self.client.get('/api/dashboard-data/')
+                self.client.get('/api/dashboard-data/')
+        self.assertEqual(evaluate.call_count, 1)
+        self.assertEqual(Alert.objects.get(village='majuli_assam').state, Alert.RESOLVED)
+
+    def test_first_poll_evaluates_existing_data(self):
+        # Reports stored before alerts were persisted, as after an upgrade
+        for _ in range(5):
+            HealthReport.objects.create(reported_by=self.worker, village='majuli_assam', symptoms=['Fever'])
+        VillageCaseBucket.record('majuli_assam', timezone.now(), count=5)
+        self.assertFalse(Alert.objects.exists())
+
+        with mock.patch('core.live._alerts_refreshed_hour', None):
+            alerts = self.client.get('/api/dashboard-data/').json()['alerts']
+        self.assertEqual([alert['village_id'] for alert in alerts], ['majuli_assam'])
+
+    def test_dashboard_reads_active_alerts(self):
+        save_water_readings([clean_water_reading({'village': 'ziro_arunachal', 'ph': 6.0, 'turbidity': 9.5})])
+        save_water_readings([clean_water_reading({'village': 'ziro_arunachal', 'ph': 7.0, 'turbidity': 1.0})])
+        self.assertEqual(Alert.objects.get(village='ziro_arunachal').state, Alert.RESOLVED)
+        self.assertEqual(self.client.get('/api/dashboard-data/').json()['alerts'], [])
+
+
+class DetectionTests(TestCase):
+    villages = ['village_a', 'village_b', 'village_c', 'village_d']
+
+    def setUp(self):
+        # The baseline is kept per process; start each test from the database
+        detection._baseline.update(key=None, state=None)
+        self.window_start = VillageCaseBucket.bucket_start(timezone.now()) - timedelta(hours=23)
+
+    def config(self, **overrides):
+        return {**detection.DEFAULTS, 'BASELINE_HOURS': 72, 'WINDOW_HOURS': 24, **overrides}
+
+    def seed_history(self, counts):
+        """Stores `counts[village][h]` cases in the h-th hour of the baseline before the window."""
+        VillageCaseBucket.objects.bulk_create([
+            VillageCaseBucket(village=village, hour=self.window_start - timedelta(hours=len(hours) - h), count=count)
+            for village, hours in counts.items() for h, count in enumerate(hours) if count
+        ])
+
+    def score(self, window, method):
+        return detection.score_outbreaks(self.villages, window, self.window_start, self.config(METHOD=method))
+
+    def test_cusum_trips_on_a_sustained_rise_but_not_a_spike(self):
+        # One case every other hour before the window
+        self.seed_history({village: [h % 2 for h in range(72)] for village in self.villages})
+        window = np.zeros((len(self.villages), 24))
+        window[0, -4:] = 3 # Three cases an hour for four hours
+        window[1, -1] = 3 # One hour of three cases
+        cases, scores, flagged = self.score(window, 'cusum')
+        self.assertEqual(cases.tolist(), [12, 3, 0, 0])
+        self.assertEqual(flagged.tolist(), [True, False, False, False])
+        self.assertGreater(scores[1], 0)
+
+    def test_vectorised_scores_match_a_per_village_computation(self):
+        rng = random.Random(3)
+        history = {village: [rng.randint(0, 3) for _ in range(72)] for village in self.villages}
+        self.seed_history(history)
+        window = np.array([[rng.randint(0, 5) for _ in range(24)] for _ in self.villages], dtype=np.float64)
+        config = self.config()
+
+        for method in ('ewma', 'cusum'):
+            expected = []
+            for village, row in zip(self.villages, window):
+                mean = sum(history[village]) / 72
+                var = sum((x - mean) ** 2 for x in history[village]) / 72
+                hourly_var = max(var, mean)
+                if method == 'ewma':
+                    expected.append((sum(row) - mean * 24) / max((hourly_var * 24) ** 0.5, 1.0))
+                else:
+                    std, cusum = max(hourly_var ** 0.5, 0.5), 0.0
+                    for x in row:
+                        cusum = max(0.0, cusum + (x - mean) / std - config['CUSUM_K'])
+                    expected.append(cusum)
+            with self.subTest(method):
+                _, scores, _ = self.score(window, method)
+                np.testing.assert_allclose(scores, expected)
+
+
+class SpatialIndexTests(TestCase):
+    def test_matches_brute_force(self):
+        rng = random.Random(1)
+        villages = {
+            f'v{i}': {'lat': rng.uniform(20, 30), 'lng': rng.uniform(88, 98)} for i in range(400)
+        }
+        index = SpatialIndex(villages)
+        for lat, lng, radius in ((25.0, 92.0, 40), (20.1, 88.1, 120), (29.9, 97.9, 5)):
+            expected = sorted(
+                (float(haversine_km(lat, lng, v['lat'], v['lng'])), name) for name, v in villages.items()
+            )
+            found = index.within(lat, lng, radius)
+            self.assertEqual([name for name, _ in found], [name for km, name in expected if km <= radius])
+            self.assertEqual([name for name, _ in index.nearest(lat, lng, 5)], [name for _, name in expected[:5]])
+            allowed = {name for _, name in expected[10:]}
+            self.assertEqual([name for name, _ in index.nearest(lat, lng, 3, allowed)], [name for _, name in expected[10:13]])
+
+        values = np.ones(len(index.ids))
+        sums = index.neighborhood_sums(values, 30)
+        for i, village in enumerate(villages.values()):
+            self.assertEqual(sums[i], len(index.within(village['lat'], village['lng'], 30)))
+
+    @override_settings(OUTBREAK_DETECTION={
+        'METHOD': 'threshold', 'CASE_THRESHOLD': 10, 'CLUSTER_RADIUS_KM': 15, 'CLUSTER_MIN_CASES': 4, 'CLUSTER_MIN_VILLAGES': 2,
+    })
+    def test_cluster_alert_opens_and_resolves(self):
+        Village.objects.create(id='north_village', name='North Village', latitude=26.00, longitude=92.00)
+        Village.objects.create(id='south_village', name='South Village', latitude=25.95, longitude=92.00) # ~5.6 km away
+        worker = CustomUser.objects.create_user(
+            username='9000000004', email='9000000004@worker.aquaalert.com', password='secret123', role='worker'
+        )
+        # No single village reaches the outbreak threshold, but together they make a cluster
+        save_health_reports(worker, [
+            clean_health_report({'village': village, 'symptoms': ['Diarrhea']})
+            for village in ('north_village', 'south_village') for _ in range(2)
+        ])
+        self.assertFalse(Alert.objects.filter(kind='outbreak').exists())
+        alert = Alert.objects.get(kind='cluster')
+        self.assertEqual((alert.state, alert.cases, sorted(alert.villages)), (Alert.OPEN, 4, ['north_village', 'south_village']))
+
+        nearby = self.client.get('/api/villages/nearby/', {'village': 'north_village', 'radius_km': 10}).json()
+        self.assertEqual([v['id'] for v in nearby['villages']], ['north_village', 'south_village'])
+        self.assertEqual(self.client.get('/api/villages/nearby/', {'village': 'north_village'}).status_code, 400)
+
+        update_alerts(now=timezone.now() + timedelta(days=3))
+        alert.refresh_from_db()
+        self.assertEqual(alert.state, Alert.RESOLVED)
+
+
+class IdentifierBackendTests(TestCase):
+    def setUp(self):
+        self.worker = CustomUser.objects.create_user(
+            username='worker1', email='worker1@worker.aquaalert.com', phone_number='9000000003',
+            password='secret123', role='worker',
+        )
+
+    def test_username_email_or_phone_in_one_query(self):
+        for identifier in ('worker1', 'worker1@worker.aquaalert.com', '9000000003'):
+            with self.subTest(identifier), self.assertNumQueries(1):
+                self.assertEqual(authenticate(username=identifier, password='secret123'), self.worker)
+        self.assertIsNone(authenticate(username='9000000003', password='wrong'))
+
+    def test_unknown_identifier_still_hashes_once(self):
+        with mock.patch.object(CustomUser, 'set_password', autospec=True) as set_password:
+            self.assertIsNone(authenticate(username='nobody@example.org', password='secret123'))
+        set_password.assert_called_once()
+
+    def test_earlier_field_wins(self):
+        # Another user whose username is this worker's phone number
+        other = CustomUser.objects.create_user(username='9000000003', email='other@example.org', password='other123')
+        self.assertEqual(authenticate(username='9000000003', password='other123'), other)
+        self.assertIsNone(authenticate(username='9000000003', password='secret123'))
+
+    def test_login_form_accepts_a_phone_number(self):
+        response = self.client.post('/', {'form_type': 'login', 'identifier': '9000000003', 'password': 'secret123'})
+        self.assertRedirects(response, '/worker/dashboard/', fetch_redirect_response=False)
+
+
+class SessionHeartbeatTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_heartbeat_answers_from_session_without_queries(self):
+        CustomUser.objects.create_user(username='official', email='official@example.org', password='secret123', role='official')
+        self.client.post('/', {'form_type': 'login', 'identifier': 'official@example.org', 'password': 'secret123'})
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/session-status/')
+        self.assertEqual(response.json(), {'authenticated': True, 'role': 'official'})
+
+    def test_anonymous_heartbeat_is_forbidden(self):
+        response = self.client.get('/api/session-status/')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.json(), {'authenticated': False, 'role': None})
+
+
+class DatabaseRoutingTests(TestCase):
+    def test_only_marked_reads_use_the_read_alias(self):
+        router = ReadWriteRouter()
+        with mock.patch.dict(settings.DATABASES, {'read': settings.DATABASES['default']}):
+            self.assertEqual(router.db_for_read(HealthReport), 'default')
+            with read_database():
+                self.assertEqual(router.db_for_read(HealthReport), 'read')
+                self.assertEqual(router.db_for_write(HealthReport), 'default')
+            self.assertEqual(router.db_for_read(HealthReport), 'default')
+        # Without a read database configured, marked reads stay on the primary
+        with override_settings(DATABASE_READ_ALIAS='replica'), read_database():
+            self.assertEqual(router.db_for_read(HealthReport), 'default')
+
+    def test_cached_dashboard_is_built_on_the_primary(self):
+        cache.clear()
+        router = ReadWriteRouter()
+        aliases = []
+
+        def build(*args):
+            aliases.append(router.db_for_read(HealthReport))
+            return {}
+
+        with mock.patch.dict(settings.DATABASES, {'read': settings.DATABASES['default']}), \
+                mock.patch('core.views.build_dashboard_data', side_effect=build):
+            self.client.get('/api/dashboard-data/')
+        self.assertEqual(aliases, ['default'])
+
+    @skipUnless(connection.vendor == 'sqlite', 'SQLite pragmas')
+    def test_sqlite_connections_are_tuned(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA cache_size")
+            self.assertEqual(cursor.fetchone()[0], settings.SQLITE_PRAGMAS['cache_size'])
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1) # NORMAL
+
+
+class RollupReportsTests(TestCase):
+    def setUp(self):
+        self.worker = CustomUser.objects.create_user(
+            username='9000000001', email='9000000001@worker.aquaalert.com', password='secret123', role='worker'
+        )
+        self.now = timezone.now().replace(minute=30, second=0, microsecond=0)
+
+    def test_summaries_match_the_rolled_up_rows(self):
+        old = (self.now - timedelta(days=40)).replace(hour=10) # Both hours on the same day
+        readings = [(old, 'majuli_assam', '7.00', '2.00'), (old, 'majuli_assam', '6.00', '8.50'),
+                    (old + timedelta(hours=1), 'majuli_assam', '8.00', '1.00'), (old, 'ziro_arunachal', '7.50', '3.00')]
+        for timestamp, village, ph, turbidity in readings:
+            WaterQualityReport.objects.create(village=village, ph=ph, turbidity=turbidity, timestamp=timestamp)
+        reports = [(old, 'majuli_assam', ['Fever']), (old, 'majuli_assam', ['Fever', 'Nausea']),
+                   (old + timedelta(hours=1), 'majuli_assam', ['Vomiting'])]
+        for timestamp, village, symptoms in reports:
+            HealthReport.objects.create(reported_by=self.worker, village=village, symptoms=symptoms, timestamp=timestamp)
+        WaterQualityReport.objects.create(village='majuli_assam', ph='7.00', turbidity='2.00')
+        HealthReport.objects.create(reported_by=self.worker, village='majuli_assam', symptoms=['Fever'])
+
+        # Small chunks, so later chunks merge into the summaries that earlier ones created
+        call_command('rollup_reports', older_than_days=30, chunk_size=2, stdout=StringIO())
+
+        self.assertEqual(WaterQualityReport.objects.count(), 1)
+        self.assertEqual(HealthReport.objects.count(), 1)
+        hour = old.replace(minute=0)
+        water = WaterQualitySummary.objects.get(village='majuli_assam', period='hour', period_start=hour)
+        self.assertEqual((water.reading_count, water.ph_min, water.ph_max), (2, Decimal('6.00'), Decimal('7.00')))
+        self.assertAlmostEqual(water.turbidity_mean, 5.25)
+        day = WaterQualitySummary.objects.get(village='majuli_assam', period='day', period_start=hour.replace(hour=0))
+        self.assertEqual((day.reading_count, day.turbidity_max), (3, Decimal('8.50')))
+        self.assertAlmostEqual(day.ph_mean, 7.0)
+        health = HealthSummary.objects.get(village='majuli_assam', period='hour', period_start=hour)
+        self.assertEqual((health.case_count, health.symptom_counts), (2, {'Fever': 2, 'Nausea': 1}))
+        self.assertEqual(
+            sum(HealthSummary.objects.filter(period='day').values_list('case_count', flat=True)), len(reports)
+        )
+
+    def test_keeps_the_dashboard_window_and_detector_baseline(self):
+        with self.assertRaises(CommandError):
+            call_command('rollup_reports', older_than_days=1, stdout=StringIO())
+
+        for days in (5, 40):
+            VillageCaseBucket.record('majuli_assam', self.now - timedelta(days=days))
+        call_command('rollup_reports', older_than_days=3, stdout=StringIO())
+        # The 5-day-old bucket is inside the detector's 14-day baseline, so it survives the 3-day cutoff
+        self.assertEqual(
+            list(VillageCaseBucket.objects.values_list('hour', flat=True)),
+            [VillageCaseBucket.bucket_start(self.now - timedelta(days=5))],
+        )
+
+
+class WaterSeriesTests(TestCase):
+    def setUp(self):
+        official = CustomUser.objects.create_user(
+            username='official', email='official@example.org', password='secret123', role='official'
+        )
+        self.client.force_login(official)
+        self.start = timezone.now().replace(minute=0, second=0, microsecond=0) - timedelta(hours=10)
+        for village in ('majuli_assam', 'ziro_arunachal'):
+            for hour in range(4):
+                WaterQualityReport.objects.create(
+                    village=village, ph='7.00', turbidity=f'{hour + 1}.00', timestamp=self.start + timedelta(hours=hour, minutes=10),
+                )
+
+    def series(self, **params):
+        params = {'villages': 'majuli_assam,ziro_arunachal', 'start': self.start.isoformat(), **params}
+        return self.client.get('/api/history/water/series/', params)
+
+    def test_pages_through_every_bucket_once(self):
+        everything = self.series().json()
+        self.assertIsNone(everything['next'])
+
+        pages, params = [], {'limit': 3}
+        while True:
+            page = self.series(**params).json()
+            pages.append(page['series'])
+            if page['next'] is None:
+                break
+            params['cursor'] = page['next']
+        self.assertEqual(len(pages), 3)
+        merged = {}
+        for page in pages:
+            for village, points in page.items():
+                merged.setdefault(village, []).extend(points)
+        self.assertEqual(merged, everything['series'])
+        self.assertEqual([len(points) for points in merged.values()], [4, 4])
+
+    def test_rejects_tampered_and_naive_cursors(self):
+        naive = base64.urlsafe_b64encode(b'majuli_assam|2026-01-01T00:00:00').decode()
+        for cursor in ('bogus', naive):
+            with self.subTest(cursor):
+                response = self.series(cursor=cursor)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()['message'], 'Invalid cursor.')
+
+    def test_merges_summaries_with_raw_readings(self):
+        # An earlier part of the first hour, already rolled up
+        WaterQualitySummary.objects.create(
+            village='majuli_assam', period='hour', period_start=self.start, reading_count=3,
+            ph_min='6.00', ph_max='6.50', ph_mean=6.2, turbidity_min='5.00', turbidity_max='9.00', turbidity_mean=7.0,
+        )
+        first = self.series(villages='majuli_assam').json()['series']['majuli_assam'][0]
+        self.assertEqual((first['readings'], first['ph_min'], first['ph_max'], first['turbidity_max']), (4, 6.0, 7.0, 9.0))
+        self.assertAlmostEqual(first['ph_mean'], (6.2 * 3 + 7.0) / 4)
+        self.assertAlmostEqual(first['turbidity_mean'], (7.0 * 3 + 1.0) / 4)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.official = CustomUser.objects.create_user(
+            username='official', email='official@example.org', password='secret123', role='official'
+        )
+        self.worker = CustomUser.objects.create_user(
+            username='9000000002', email='9000000002@worker.aquaalert.com', password='secret123', role='worker'
+        )
+        self.client.force_login(self.official)
+
+    def test_health_csv_flattens_symptoms_across_chunks(self):
+        for symptoms in (['Fever'], ['Fever', 'Rash'], ['Nausea'], ['Jaundice']):
+            HealthReport.objects.create(reported_by=self.worker, village='majuli_assam', age_group='6-17', symptoms=symptoms)
+        HealthReport.objects.create(reported_by=self.worker, village='ziro_arunachal', symptoms=['Fever'])
+
+        with mock.patch('core.export.ROWS_PER_CHUNK', 2):
+            response = self.client.get('/api/export/health/', {'villages': 'majuli_assam'})
+            self.assertTrue(response.streaming)
+            chunks = list(response.streaming_content)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(len(chunks), 3) # The header, then two chunks of two rows
+        rows = list(csv.DictReader(b''.join(chunks).decode().splitlines()))
+        self.assertEqual([row['symptom_fever'] for row in rows], ['1', '1', '0', '0'])
+        self.assertEqual([row['symptoms_other'] for row in rows], ['', 'Rash', '', ''])
+        self.assertEqual({(row['village'], row['reported_by'], row['age_group']) for row in rows},
+                         {('majuli_assam', '9000000002', '6-17')})
+
+    def test_water_ndjson_filters_by_time(self):
+        now = timezone.now()
+        WaterQualityReport.objects.create(village='majuli_assam', ph='7.00', turbidity='2.00', timestamp=now - timedelta(days=2))
+        WaterQualityReport.objects.create(
+            village='majuli_assam', ph='6.50', turbidity='9.25', timestamp=now, contaminants={'e-coli': 'high', 'lead': 'low'},
+        )
+        response = self.client.get('/api/export/water/', {'format': 'ndjson', 'start': (now - timedelta(days=1)).isoformat()})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(
+            (rows[0]['ph'], rows[0]['turbidity'], rows[0]['contaminant_e_coli'], rows[0]['contaminant_arsenic']),
+            ('6.50', '9.25', 'high', ''),
+        )
+        self.assertEqual(json.loads(rows[0]['contaminants_other']), {'lead': 'low'})
+
+    def test_rejects_bad_requests(self):
+        self.assertEqual(self.client.get('/api/export/water/', {'format': 'xml'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/export/water/', {'start': 'yesterday'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/export/alerts/').status_code, 404)
+        self.client.force_login(self.worker)
+        self.assertEqual(self.client.get('/api/export/water/').status_code, 403)
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        metrics_registry.clear()
+        self.staff = CustomUser.objects.create_user(username='staff', password='secret123', is_staff=True)
+        self.worker = CustomUser.objects.create_user(
+            username='9000000006', email='9000000006@worker.aquaalert.com', password='secret123', role='worker'
+        )
+
+    def test_only_staff_or_the_token_may_scrape(self):
+        self.assertEqual(self.client.get('/metrics/').status_code, 403)
+        # No token configured: an empty bearer token must not match it
+        self.assertEqual(self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer ').status_code, 403)
+        with override_settings(METRICS_TOKEN='scrape-me'):
+            self.assertEqual(self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+            self.assertEqual(self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer scrape-me').status_code, 200)
+        self.client.force_login(self.worker)
+        self.assertEqual(self.client.get('/metrics/').status_code, 403)
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get('/metrics/').status_code, 200)
+
+    def test_records_each_view(self):
+        self.client.get('/api/dashboard-data/')
+        self.client.get('/api/villages/nearby/', {'village': 'majuli_assam', 'k': 2})
+        self.client.force_login(self.staff)
+        response = self.client.get('/metrics/')
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        lines = response.content.decode().splitlines()
+        for view in ('dashboard_data_api', 'villages_nearby_api'):
+            with self.subTest(view):
+                self.assertIn(f'aquaalert_http_requests_total{{view="{view}",method="GET",status="200"}} 1', lines)
+                self.assertIn(f'aquaalert_http_request_duration_seconds_count{{view="{view}"}} 1', lines)
+                serialized = [line for line in lines if line.startswith(f'aquaalert_json_serialize_seconds_total{{view="{view}"}}')]
+                self.assertGreater(float(serialized[0].split()[-1]), 0)
+        # The nearby query is answered from the in-process index, the dashboard from the database
+        self.assertIn('aquaalert_db_queries_total{view="villages_nearby_api"} 0', lines)
+        queries = [line for line in lines if line.startswith('aquaalert_db_queries_total{view="dashboard_data_api"}')]
+        self.assertGreater(int(queries[0].split()[-1]), 0)
+        self.assertIn('# TYPE aquaalert_http_request_duration_seconds histogram', lines)
+
+
+class BenchmarkCommandTests(TestCase):
+    def test_seed_and_benchmark_report(self):
+        call_command('seed_reports', health=300, water=300, days=3, seed=1, stdout=StringIO())
+        self.assertEqual(HealthReport.objects.count(), 300)
+        self.assertEqual(sum(VillageCaseBucket.objects.values_list('count', flat=True)), 300)
+        self.assertEqual(LatestWaterReading.objects.count(), len(VILLAGES))
+        latest = set(LatestWaterReading.objects.values_list('id', 'report_id'))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, 'report.json')
+            call_command('benchmark', iterations=5, warmup=1, batch_size=20, output=output, stdout=StringIO())
+            with open(output) as f:
+                report = json.load(f)
+
+        self.assertEqual(report['row_counts']['health_reports'], 300)
+        for name in ('dashboard_data_api', 'water_quality_api', 'water_quality_api_batch', 'submit_health_report_api'):
+            scenario = report['scenarios'][name]
+            self.assertLessEqual(scenario['p50_ms'], scenario['p99_ms'])
+            self.assertLessEqual(scenario['queries_max'], scenario['thresholds']['max_queries'], name)
+        self.assertEqual(report['scenarios']['dashboard_data_api_not_modified']['queries_max'], 0)
+        self.assertEqual(report['scenarios']['session_status_api']['queries_max'], 0)
+        # The benchmark's own writes are cleaned up
+        self.assertEqual(HealthReport.objects.count(), 300)
+        self.assertEqual(WaterQualityReport.objects.count(), 300)
+        self.assertEqual(sum(VillageCaseBucket.objects.values_list('count', flat=True)), 300)
+        self.assertEqual(set(LatestWaterReading.objects.values_list('id', 'report_id')), latest)
+        self.assertFalse(CustomUser.objects.filter(username__startswith='benchmark-').exists())
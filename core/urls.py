@@ -10,11 +10,21 @@ urlpatterns = [
 
     # Add this new line for the API
     path('api/submit-report/', views.submit_health_report_api, name='submit_health_report_api'),
+    path('api/submit-reports/', views.submit_health_reports_batch_api, name='submit_health_reports_batch_api'),
     # core/urls.py
 # ... inside urlpatterns list
 path('serviceworker.js', views.service_worker_view, name='serviceworker'),
 path('api/water-quality/', views.water_quality_api, name='water_quality_api'),
+path('api/ingest-buffer/', views.ingest_buffer_status_api, name='ingest_buffer_status_api'),
+path('metrics/', views.metrics_view, name='metrics'),
 path('api/dashboard-data/', views.dashboard_data_api, name='dashboard_data_api'),
+path('api/dashboard-stream/', views.dashboard_stream_api, name='dashboard_stream_api'),
+path('api/villages/', views.villages_api, name='villages_api'),
+path('api/villages/nearby/', views.villages_nearby_api, name='villages_nearby_api'),
+path('api/history/water/', views.water_history_api, name='water_history_api'),
+path('api/history/water/series/', views.water_series_api, name='water_series_api'),
+path('api/history/cases/', views.case_history_api, name='case_history_api'),
+path('api/export/<str:kind>/', views.export_reports_api, name='export_reports_api'),
     
     # ADD THIS NEW LINE FOR THE SESSION HEARTBEAT
     path('api/session-status/', views.session_status_api, name='session_status_api'),
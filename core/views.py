@@ -4,24 +4,57 @@
 # core/views.py (add to imports)
 from django.utils.translation import gettext as _
 import random 
+import secrets
 from django.views.decorators.csrf import csrf_exempt
-from datetime import datetime, timedelta
-from django.db.models import Count
+from datetime import timedelta
+from django.db.models import Count, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
 from django.utils import timezone
-from .models import WaterQualityReport # Import the WaterQualityReport model
+from .models import LatestWaterReading
 import json # Make sure json is imported
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
+from .metrics import TimedJsonResponse # JsonResponse that records how long serializing it takes
 import json
-from .models import HealthReport # Make sure HealthReport is imported
+from .models import HealthReport, VillageCaseBucket # Make sure HealthReport is imported
 from django.shortcuts import render, redirect
-from django.contrib.auth import authenticate, login, logout
+from django.contrib.auth import SESSION_KEY, authenticate, login, logout
 from django.contrib import messages
-from .models import CustomUser
+from .models import Alert, CustomUser
+from .ingest import (
+    BatchValidationError, clean_binary_water_batch, clean_health_report, clean_water_batch, clean_water_reading,
+    parse_water_payload, save_health_reports, save_water_readings,
+)
+from . import binary_format
 # core/views.py
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from asgiref.sync import sync_to_async
+from .live import cached_dashboard_payload, dashboard_state
+from .villages import get_village, get_villages
+from .history import (
+    INTERVALS, RESOLUTIONS, case_history, decode_cursor, water_quality_history, water_quality_series,
+)
+from .alerts import active_alerts
+from .detection import detection_settings
+from .spatial import get_spatial_index
+from .ingest_buffer import get_water_buffer
+from .symptoms import symptom_breakdown as symptom_breakdown_since
+from .metrics import buffer_gauges, registry as metrics_registry
+from .routers import read_alias, read_database, reads_from_replica
+from .signals import SESSION_ROLE_KEY
+from django.utils.crypto import constant_time_compare
+from .export import EXPORTS, FORMATS as EXPORT_FORMATS, export_queryset, iter_export, parse_time as parse_export_time
+from django.utils.dateparse import parse_datetime
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+import asyncio
+import base64
+import math
 import os
+import time
+from collections import Counter
+from functools import partial
 
 def service_worker_view(request):
     sw_path = os.path.join(settings.BASE_DIR, 'serviceworker.js')
@@ -54,21 +87,11 @@ def auth_view(request):
 def login_view(request):
     identifier = request.POST.get('identifier')
     password = request.POST.get('password')
-    user = None
 
-    # Try to authenticate with the identifier as a username (for phone numbers)
+    # The identifier may be a phone number (workers), an email (officials) or a username;
+    # IdentifierBackend resolves all three in one query
     user = authenticate(request, username=identifier, password=password)
 
-    # If that fails, try to authenticate with it as an email (for officials)
-    if user is None:
-        try:
-            # Find the user by email
-            user_by_email = CustomUser.objects.get(email=identifier)
-            # Then authenticate with their username
-            user = authenticate(request, username=user_by_email.username, password=password)
-        except CustomUser.DoesNotExist:
-            user = None
-
     if user is not None:
         login(request, user)
         # Redirect based on role after successful login
@@ -116,7 +139,7 @@ def signup_view(request):
             username = identifier.split('@')[0]
             # Ensure username is unique
             if CustomUser.objects.filter(username=username).exists():
-                username = f"{username}{CustomUser.objects.count()}" # Append count to make it unique
+                username = f"{username}-{secrets.token_hex(3)}" # Random suffix to make it unique
 
             user = CustomUser.objects.create_user(
                 username=username,
@@ -153,7 +176,7 @@ def worker_dashboard_view(request):
 
     # This view's main job is just to render the page. 
     # The form data will be sent to a different API view via JavaScript.
-    return render(request, 'core/worker_dashboard.html')
+    return render(request, 'core/worker_dashboard.html', {'villages': get_villages().values()})
 # core/views.py
 
 # core/views.py
@@ -169,80 +192,135 @@ def official_dashboard_view(request):
     return render(request, 'core/official_dashboard.html')
 
 
-# This is our new, dedicated API view for the live dashboard data
-def dashboard_data_api(request):
-    # --- 1. Data Fetching & "AI" Analysis ---
-    forty_eight_hours_ago = timezone.now() - timedelta(hours=48)
-    recent_reports = HealthReport.objects.filter(timestamp__gte=forty_eight_hours_ago)
+MAP_MODES = ('points', 'village', 'grid')
+DASHBOARD_MAP_WINDOW = timedelta(hours=48)
+DASHBOARD_ALERT_OVERLAP = timedelta(seconds=30)
 
-    all_villages = [
-        'mawlynnong_meghalaya', 'ziro_arunachal', 'majuli_assam',
-        'khonoma_nagaland', 'moirang_manipur', 'pelling_sikkim',
-        'champhai_mizoram', 'unakoti_tripura'
-    ]
-    village_coordinates = {
-        'mawlynnong_meghalaya': {'lat': 25.195, 'lng': 92.019, 'name': 'Mawlynnong'},
-        'ziro_arunachal': {'lat': 27.63, 'lng': 93.83, 'name': 'Ziro'},
-        'majuli_assam': {'lat': 26.91, 'lng': 94.13, 'name': 'Majuli'},
-        'khonoma_nagaland': {'lat': 25.67, 'lng': 94.01, 'name': 'Khonoma'},
-        'moirang_manipur': {'lat': 24.50, 'lng': 93.77, 'name': 'Moirang'},
-        'pelling_sikkim': {'lat': 27.32, 'lng': 88.24, 'name': 'Pelling'},
-        'champhai_mizoram': {'lat': 23.46, 'lng': 93.33, 'name': 'Champhai'},
-        'unakoti_tripura': {'lat': 24.08, 'lng': 92.07, 'name': 'Unakoti'}
-    }
 
-    # --- FIX FOR PREDICTIVE ALERTS ---
-    village_case_counts = {village: 0 for village in all_villages}
-    for report in recent_reports:
-        if report.village in village_case_counts:
-            village_case_counts[report.village] += 1
-
-    alerts = []
-    villages_with_outbreak_alerts = set()
-
-    # First, process outbreak-level alerts
-    for village_id, count in village_case_counts.items():
-        if count > 4:
-            village_name = village_coordinates.get(village_id, {}).get('name', 'Unknown')
-            latest_water_report = WaterQualityReport.objects.filter(village=village_id).last()
-            is_water_contaminated = latest_water_report and latest_water_report.turbidity > 5.0
-
-            alert_type = 'critical'
-            message = f"OUTBREAK: {count} cases reported in {village_name}. Immediate action required."
-            if is_water_contaminated:
-                alert_type = 'critical-water'
-                message = f"CRITICAL: Outbreak in {village_name} ({count} cases) linked to contaminated water (Turbidity: {latest_water_report.turbidity})."
-
-            alerts.append({'type': alert_type, 'message': message, 'village_id': village_id})
-            villages_with_outbreak_alerts.add(village_id)
-
-    # Now, process predictive alerts for all other villages
-    for village_id in all_villages:
-        if village_id not in villages_with_outbreak_alerts:
-            latest_water_report = WaterQualityReport.objects.filter(village=village_id).last()
-            if latest_water_report and latest_water_report.turbidity > 5.0:
-                village_name = village_coordinates.get(village_id, {}).get('name', 'Unknown')
-                alerts.append({
-                    'type': 'predictive',
-                    'message': f"PREDICTIVE: Water in {village_name} is contaminated (Turbidity: {latest_water_report.turbidity}). High risk of an outbreak.",
-                    'village_id': village_id
-                })
+def _report_jitter(report_id):
+    """A small offset (about +/-500 m) seeded by the report id, so a report's marker never moves between refreshes."""
+    rng = random.Random(report_id)
+    return rng.uniform(-0.005, 0.005), rng.uniform(-0.005, 0.005)
 
-    # --- FIX FOR MAP DOTS ---
-    map_report_data = []
-    for report in recent_reports:
-        coords = village_coordinates.get(report.village)
-        if coords:
-            # Add a small random offset (jitter) to each coordinate
-            jitter_lat = random.uniform(-0.005, 0.005)
-            jitter_lng = random.uniform(-0.005, 0.005)
-            map_report_data.append({
+
+def build_map_data(recent_reports, village_coordinates, mode='points', cell_size=None, symptom_breakdown=None, last_report_id=None):
+    """
+    Builds the map markers for the reports in the window.
+    - 'points': one jittered marker per report.
+    - 'village': one marker per village with its case count and symptom breakdown.
+    - 'grid': like 'village', but villages are merged into square cells of `cell_size` degrees.
+    No cell ever returns more than MAP_POINTS_PER_CELL individual points (newest first).
+    For 'village' and 'grid', passing the window's `symptom_breakdown` (see core.symptoms)
+    saves decoding every report's symptom list. Reports after `last_report_id` are left out.
+    """
+    per_cell_cap = getattr(settings, 'MAP_POINTS_PER_CELL', 200)
+    cell_size = cell_size or getattr(settings, 'MAP_GRID_CELL_DEGREES', 0.5)
+
+    cells = {}
+    if mode != 'points' and symptom_breakdown is not None:
+        rows = recent_reports.order_by('-timestamp', '-id').values_list('id', 'village')
+        rows = ((report_id, village, ()) for report_id, village in rows.iterator(chunk_size=2000))
+    else:
+        rows = recent_reports.order_by('-timestamp', '-id').values_list('id', 'village', 'symptoms').iterator(chunk_size=2000)
+    for report_id, village, symptoms in rows:
+        coords = village_coordinates.get(village)
+        # (Filtered here rather than in SQL, where an id bound would take the query off the timestamp index)
+        if not coords or (last_report_id is not None and report_id > last_report_id):
+            continue
+        if mode == 'grid':
+            cell_key = (math.floor(coords['lat'] / cell_size), math.floor(coords['lng'] / cell_size))
+        else:
+            cell_key = village
+        cell = cells.get(cell_key)
+        if cell is None:
+            cell = cells[cell_key] = {'villages': {}, 'count': 0, 'symptom_counts': Counter(), 'points': []}
+        if village not in cell['villages']:
+            cell['villages'][village] = coords
+            if symptom_breakdown is not None:
+                cell['symptom_counts'].update(symptom_breakdown.get(village, {}))
+        cell['count'] += 1
+        cell['symptom_counts'].update(symptoms)
+        if len(cell['points']) < per_cell_cap:
+            jitter_lat, jitter_lng = _report_jitter(report_id)
+            cell['points'].append({
                 'lat': coords['lat'] + jitter_lat,
                 'lng': coords['lng'] + jitter_lng,
                 'village': coords['name'],
-                'symptoms': ', '.join(report.symptoms)
+                'symptoms': ', '.join(symptoms)
             })
 
+    if mode == 'points':
+        return [point for cell in cells.values() for point in cell['points']]
+
+    map_data = []
+    for cell in cells.values():
+        members = list(cell['villages'].values())
+        symptom_counts = dict(cell['symptom_counts'].most_common())
+        marker = {
+            'lat': sum(c['lat'] for c in members) / len(members),
+            'lng': sum(c['lng'] for c in members) / len(members),
+            'village': ', '.join(sorted(c['name'] for c in members)),
+            'count': cell['count'],
+            'symptom_counts': symptom_counts,
+            'symptoms': ', '.join(f"{name} ({n})" for name, n in symptom_counts.items()),
+            'points': [{'lat': p['lat'], 'lng': p['lng']} for p in cell['points']],
+        }
+        if mode == 'village':
+            marker['village_id'] = members[0]['id']
+        map_data.append(marker)
+    return map_data
+
+
+def _window_case_counts(window_start, last_report_id):
+    """
+    Cases per village in the hourly buckets since `window_start`, less the reports newer than
+    `last_report_id`, so the chart holds exactly the reports the cursor covers. It is one statement,
+    so the buckets and the newer reports are read from the same snapshot.
+    """
+    newer = (
+        HealthReport.objects.filter(village=OuterRef('village'), id__gt=last_report_id, timestamp__gte=window_start)
+        .order_by().values('village').annotate(reports=Count('id')).values('reports')
+    )
+    rows = (
+        VillageCaseBucket.objects.filter(hour__gte=window_start).values('village')
+        .annotate(cases=Sum('count') - Coalesce(Subquery(newer), 0)).order_by()
+    )
+    return {row['village']: row['cases'] for row in rows}
+
+
+def build_dashboard_data(map_mode='points', cell_size=None, state=''):
+    """
+    Computes the alerts, map points, chart data and symptom breakdown shown on the official dashboard.
+    `state` is the dashboard state (see core.live.dashboard_state) read before building, kept in the cursor.
+    """
+    # --- 1. Data Fetching & "AI" Analysis ---
+    now = timezone.now()
+    forty_eight_hours_ago = now - DASHBOARD_MAP_WINDOW
+    # The map and symptoms stop at the newest report now, which the cursor for deltas names
+    last_report_id = HealthReport.objects.aggregate(last=Max('id'))['last'] or 0
+    recent_reports = HealthReport.objects.filter(timestamp__gte=forty_eight_hours_ago)
+
+    # Villages come from the registry, which is cached in memory for the whole process
+    village_coordinates = get_villages()
+    all_villages = list(village_coordinates)
+
+    # --- FIX FOR PREDICTIVE ALERTS ---
+    # Case counts come from the hourly buckets kept up to date on submission, so this stays a
+    # fixed-size read no matter how many reports are in the window.
+    window_hours = detection_settings()['WINDOW_HOURS']
+    window_start = VillageCaseBucket.bucket_start(now) - timedelta(hours=window_hours - 1)
+    window_counts = _window_case_counts(window_start, last_report_id)
+    village_case_counts = {village: window_counts.get(village, 0) for village in all_villages}
+
+    # Alerts are evaluated as reports and readings arrive (see core.alerts); here we only read the active ones
+    alerts = active_alerts()
+
+    # Symptom x village counts for the window, from one grouped query on the symptom index
+    symptom_breakdown = symptom_breakdown_since(forty_eight_hours_ago, report_ids=(None, last_report_id))
+
+    # --- FIX FOR MAP DOTS ---
+    map_report_data = build_map_data(recent_reports, village_coordinates, map_mode, cell_size, symptom_breakdown, last_report_id)
+
     # Prepare chart data based on the processed counts
     sorted_counts = sorted(village_case_counts.items(), key=lambda item: item[1], reverse=True)
     chart_data = {
@@ -251,12 +329,250 @@ def dashboard_data_api(request):
     }
 
     # Consolidate all data into one JSON response
-    data = {
+    return {
+        'cursor': _encode_dashboard_cursor(last_report_id, now, now, state),
         'alerts': alerts,
         'map_report_data': map_report_data,
-        'chart_data': chart_data
+        'map_mode': map_mode,
+        'chart_data': chart_data,
+        'chart_villages': [v[0] for v in sorted_counts], # Village ids of the chart labels, for merging deltas
+        'symptom_breakdown': [
+            {'village_id': village, 'village': village_coordinates[village]['name'], 'counts': counts}
+            for village, counts in sorted(symptom_breakdown.items(), key=lambda item: sum(item[1].values()), reverse=True)
+            if village in village_coordinates
+        ],
     }
-    return JsonResponse(data)
+
+
+def _encode_dashboard_cursor(last_report_id, built_at, loaded_at, state=''):
+    cursor = f"{last_report_id}|{built_at.isoformat()}|{loaded_at.isoformat()}|{state}"
+    return base64.urlsafe_b64encode(cursor.encode()).decode()
+
+
+def _decode_dashboard_cursor(cursor):
+    """
+    Returns (last report id, time it was issued, time of the last full load, dashboard state it was
+    issued in). Raises ValueError if the cursor is malformed.
+    """
+    try:
+        last_report_id, built_at, loaded_at, *state = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        last_report_id, built_at, loaded_at = int(last_report_id), parse_datetime(built_at), parse_datetime(loaded_at)
+    except ValueError:
+        built_at = loaded_at = None
+    # Cursors are always issued with an offset; a naive time could not be compared with them
+    if built_at is None or loaded_at is None or timezone.is_naive(built_at) or timezone.is_naive(loaded_at):
+        raise ValueError("Invalid cursor.")
+    return last_report_id, built_at, loaded_at, ''.join(state)
+
+
+def build_dashboard_delta(cursor, map_mode='village', state=''):
+    """
+    What changed on the dashboard since the payload or delta that returned `cursor`:
+    - 'villages': per village, the change in map cases ('cases'), chart cases ('chart') and
+      symptom counts, counting reports that arrived minus reports that left the window since;
+    - 'alerts': alerts opened or changed since, and 'resolved_alerts': ids of those resolved;
+    - 'cursor': the cursor for the next delta.
+    Every query is a range on report ids or timestamps, so the work follows the amount of new data.
+    Returns None when the client should load the full payload instead: for 'points' and 'grid'
+    maps, whose capped point lists and merged cells a client cannot update from per-village
+    changes, and once DASHBOARD_DELTA_RESYNC_SECONDS have passed since its last full load.
+    That periodic reload also picks up any report whose id became visible out of order.
+    `state` is the current dashboard state: while it is still the one the cursor was issued in,
+    nothing has been written since, and the empty delta is answered without touching the database.
+    """
+    last_report_id, since, loaded_at, cursor_state = _decode_dashboard_cursor(cursor)
+    now = timezone.now()
+    resync = timedelta(seconds=getattr(settings, 'DASHBOARD_DELTA_RESYNC_SECONDS', 3600))
+    if map_mode != 'village' or now - loaded_at > resync or since > now:
+        return None
+    if state and state == cursor_state:
+        return {
+            'delta': True, 'cursor': cursor, 'map_mode': map_mode, 'villages': {}, 'alerts': [], 'resolved_alerts': [],
+        }
+
+    village_coordinates = get_villages()
+    newest_report_id = HealthReport.objects.aggregate(last=Max('id'))['last'] or 0
+    map_start, old_map_start = now - DASHBOARD_MAP_WINDOW, since - DASHBOARD_MAP_WINDOW
+    window_hours = detection_settings()['WINDOW_HOURS']
+    chart_start = VillageCaseBucket.bucket_start(now) - timedelta(hours=window_hours - 1)
+    old_chart_start = VillageCaseBucket.bucket_start(since) - timedelta(hours=window_hours - 1)
+
+    changes = {}
+
+    def change(village):
+        entry = changes.get(village)
+        if entry is None:
+            coords = village_coordinates[village]
+            entry = changes[village] = {
+                'name': coords['name'], 'lat': coords['lat'], 'lng': coords['lng'], 'cases': 0, 'chart': 0, 'symptoms': {},
+            }
+        return entry
+
+    # Reports that arrived since the cursor
+    if newest_report_id > last_report_id:
+        # Only an id range, so the query stays on the primary key; old timestamps are skipped below
+        arrived = HealthReport.objects.filter(
+            id__gt=last_report_id, id__lte=newest_report_id,
+        ).values_list('village', 'timestamp')
+        for village, timestamp in arrived:
+            if village not in village_coordinates or timestamp < map_start:
+                continue
+            entry = change(village)
+            entry['cases'] += 1
+            if timestamp >= chart_start:
+                entry['chart'] += 1
+        for village, counts in symptom_breakdown_since(map_start, report_ids=(last_report_id, newest_report_id)).items():
+            if village in village_coordinates:
+                symptoms = change(village)['symptoms']
+                for name, n in counts.items():
+                    symptoms[name] = symptoms.get(name, 0) + n
+
+    # Reports the client counted that have since left the windows
+    expired = (('cases', old_map_start, map_start), ('chart', old_chart_start, chart_start))
+    for key, start, end in expired:
+        if start >= end:
+            continue
+        rows = (
+            HealthReport.objects.filter(id__lte=last_report_id, timestamp__gte=start, timestamp__lt=end)
+            .values_list('village').annotate(reports=Count('id')).order_by()
+        )
+        for village, reports in rows:
+            if village in village_coordinates:
+                change(village)[key] -= reports
+    if old_map_start < map_start:
+        expired_symptoms = symptom_breakdown_since(old_map_start, until=map_start, report_ids=(None, last_report_id))
+        for village, counts in expired_symptoms.items():
+            if village in village_coordinates:
+                symptoms = change(village)['symptoms']
+                for name, n in counts.items():
+                    symptoms[name] = symptoms.get(name, 0) - n
+
+    # Alerts change in place; re-send a little before the cursor so none committed late are missed
+    changed_alerts = Alert.objects.filter(updated_at__gte=since - DASHBOARD_ALERT_OVERLAP)
+    alerts, resolved_alerts = [], []
+    for alert in changed_alerts:
+        if alert.state in Alert.ACTIVE_STATES:
+            alerts.append(alert.as_dict())
+        else:
+            resolved_alerts.append(alert.id)
+
+    return {
+        'delta': True,
+        'cursor': _encode_dashboard_cursor(max(newest_report_id, last_report_id), now, loaded_at, state),
+        'map_mode': map_mode,
+        'villages': {
+            village: entry for village, entry in changes.items()
+            if entry['cases'] or entry['chart'] or any(entry['symptoms'].values())
+        },
+        'alerts': alerts,
+        'resolved_alerts': resolved_alerts,
+    }
+
+
+def _dashboard_map_options(request):
+    """Reads ?map=points|village|grid and ?cell=<degrees> from the query string."""
+    map_mode = request.GET.get('map', 'points')
+    if map_mode not in MAP_MODES:
+        map_mode = 'points'
+    try:
+        cell_size = float(request.GET['cell']) if map_mode == 'grid' and 'cell' in request.GET else None
+    except ValueError:
+        cell_size = None
+    if cell_size is not None and not 0.01 <= cell_size <= 10:
+        cell_size = None
+    return map_mode, cell_size
+
+
+def _cached_dashboard_payload(state, map_mode, cell_size):
+    return cached_dashboard_payload(
+        state, partial(build_dashboard_data, map_mode, cell_size, state), variant=f"{map_mode}:{cell_size}"
+    )
+
+
+def _dashboard_etag(request):
+    # Remember the state so the view serves exactly the version this ETag names
+    request.dashboard_state = dashboard_state()
+    return request.dashboard_state
+
+
+# This is our new, dedicated API view for the live dashboard data
+# Polls that send back the last ETag get a 304 until ingestion changes the data.
+# With ?since=<cursor> (from the previous response) only the changes since then are returned;
+# see build_dashboard_delta().
+# The full payload is built on the primary: it is cached under the current version, so one
+# built from a replica that is behind would be served as that version until the next bump.
+@condition(etag_func=_dashboard_etag)
+def dashboard_data_api(request):
+    map_mode, cell_size = _dashboard_map_options(request)
+    if 'since' in request.GET:
+        try:
+            with read_database():
+                delta = build_dashboard_delta(request.GET['since'], map_mode, request.dashboard_state)
+        except ValueError as e:
+            return TimedJsonResponse({'status': 'error', 'message': str(e)}, status=400)
+        if delta is not None:
+            response = TimedJsonResponse(delta)
+            # Each delta applies once: never let a cache replay it
+            patch_cache_control(response, no_store=True)
+            return response
+    payload = _cached_dashboard_payload(request.dashboard_state, map_mode, cell_size)
+    response = HttpResponse(payload, content_type='application/json')
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+async def dashboard_stream_api(request):
+    """
+    Server-Sent Events stream of dashboard data for officials. A `dashboard` event is pushed
+    when ingestion changes the data, instead of the page polling /api/dashboard-data/.
+    Only available when served through the ASGI application; under WSGI it answers 204 so
+    the page falls back to polling.
+    """
+    user = await request.auser()
+    if not user.is_authenticated or user.role != 'official':
+        return TimedJsonResponse({'status': 'error', 'message': 'Not authorized.'}, status=403)
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+
+    map_mode, cell_size = _dashboard_map_options(request)
+    check_interval = getattr(settings, 'DASHBOARD_STREAM_CHECK_SECONDS', 1)
+    max_duration = getattr(settings, 'DASHBOARD_STREAM_MAX_SECONDS', 300)
+    keepalive_interval = 15
+
+    async def event_stream():
+        started = last_sent = time.monotonic()
+        last_state = None
+        # The browser reconnects on its own when the stream ends, which recycles long-lived connections
+        yield f"retry: {check_interval * 1000}\n\n"
+        while time.monotonic() - started < max_duration:
+            state = await sync_to_async(dashboard_state)()
+            if state != last_state:
+                # Every listener gets the payload cached for this state, so it is built once per version
+                payload = await sync_to_async(_cached_dashboard_payload)(state, map_mode, cell_size)
+                yield f"event: dashboard\nid: {state}\ndata: {payload}\n\n"
+                last_state, last_sent = state, time.monotonic()
+            elif time.monotonic() - last_sent >= keepalive_interval:
+                yield ": keep-alive\n\n"
+                last_sent = time.monotonic()
+            await asyncio.sleep(check_interval)
+
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no' # Stop proxies such as nginx from buffering the stream
+    return response
+
+def metrics_view(request):
+    """
+    Per-view request metrics in the Prometheus text format. Allowed for staff users, or for
+    scrapers that send "Authorization: Bearer <METRICS_TOKEN>".
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    authorized = bool(token) and constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')
+    if not (authorized or (request.user.is_authenticated and request.user.is_staff)):
+        return HttpResponse('Not authorized.\n', status=403, content_type='text/plain')
+    return HttpResponse(
+        metrics_registry.render(buffer_gauges()), content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
 
 # core/views.py (add at the end)
 
@@ -265,43 +581,304 @@ def submit_health_report_api(request):
     if request.method == 'POST' and request.user.role == 'worker':
         try:
             data = json.loads(request.body)
-            report = HealthReport.objects.create(
-                reported_by=request.user,
-                village=data.get('village'),
-                age_group=data.get('ageGroup'),
-                symptoms=data.get('symptoms')
-            )
-            return JsonResponse({'status': 'success', 'message': 'Report saved.'})
+            save_health_reports(request.user, [clean_health_report(data)])
+            return TimedJsonResponse({'status': 'success', 'message': 'Report saved.'})
         except Exception as e:
-            return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
-    return JsonResponse({'status': 'error', 'message': 'Invalid request.'}, status=400)
+            return TimedJsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    return TimedJsonResponse({'status': 'error', 'message': 'Invalid request.'}, status=400)
+
+
+@login_required
+def submit_health_reports_batch_api(request):
+    """
+    Offline sync endpoint. Accepts {"reports": [...]} where every report carries a client-generated
+    `clientId`. Valid reports are stored in one bulk insert (replays are ignored), and the response
+    lists the clientIds the device may now delete, plus any reports that were rejected.
+    """
+    if request.method == 'POST' and request.user.role == 'worker':
+        try:
+            data = json.loads(request.body)
+            items = data.get('reports') if isinstance(data, dict) else data
+            if not isinstance(items, list):
+                raise ValueError("'reports' must be a list.")
+            max_batch = getattr(settings, 'HEALTH_REPORT_MAX_BATCH', 500)
+            if len(items) > max_batch:
+                raise ValueError(f"A batch may contain at most {max_batch} reports.")
+
+            villages = get_villages()
+            reports, rejected = [], []
+            for item in items:
+                try:
+                    reports.append(clean_health_report(item, require_client_id=True, villages=villages))
+                except ValueError as e:
+                    client_id = item.get('clientId') if isinstance(item, dict) else None
+                    rejected.append({'clientId': client_id, 'message': str(e)})
+
+            acknowledged = save_health_reports(request.user, reports) if reports else []
+            return TimedJsonResponse({
+                'status': 'success',
+                'message': f'{len(acknowledged)} report(s) saved.',
+                'acknowledged': [str(client_id) for client_id in acknowledged],
+                'rejected': rejected,
+            })
+        except Exception as e:
+            return TimedJsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    return TimedJsonResponse({'status': 'error', 'message': 'Invalid request.'}, status=400)
 
 # core/views.py (add at the end)
 
 @csrf_exempt # Disable CSRF for this API endpoint
 def water_quality_api(request):
+    """
+    Accepts one reading as a JSON object, or a batch as a JSON array, an NDJSON body or
+    a packed binary payload (Content-Type application/vnd.aquaalert.water+binary).
+    A batch is validated as a whole: if any reading is invalid nothing is saved and
+    the response lists the error for each bad item.
+    With WATER_INGEST_BUFFERED on, valid readings are queued for a background writer and the
+    response is 202, or 429 when the queue is full.
+    """
     if request.method == 'POST':
         try:
-            data = json.loads(request.body)
-            WaterQualityReport.objects.create(
-                village=data.get('village'),
-                ph=data.get('ph'),
-                turbidity=data.get('turbidity'),
-                contaminants=data.get('contaminants', {})
-            )
-            return JsonResponse({'status': 'success', 'message': 'Water quality data received.'})
+            if request.content_type == binary_format.CONTENT_TYPE:
+                readings, is_batch = clean_binary_water_batch(request.body), True
+            else:
+                items, is_batch = parse_water_payload(request.body, request.content_type)
+                readings = clean_water_batch(items) if is_batch else [clean_water_reading(items[0])]
+            if getattr(settings, 'WATER_INGEST_BUFFERED', False):
+                return _buffer_water_readings(readings)
+            save_water_readings(readings)
+            if is_batch:
+                return TimedJsonResponse({'status': 'success', 'message': f'{len(readings)} water quality readings received.', 'received': len(readings)})
+            return TimedJsonResponse({'status': 'success', 'message': 'Water quality data received.'})
+        except BatchValidationError as e:
+            return TimedJsonResponse({'status': 'error', 'message': str(e), 'errors': e.errors}, status=400)
         except Exception as e:
-            return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
-    return JsonResponse({'status': 'error', 'message': 'Invalid request method.'}, status=405)
+            return TimedJsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    return TimedJsonResponse({'status': 'error', 'message': 'Invalid request method.'}, status=405)
+
+def _buffer_water_readings(readings):
+    # Stamp the time of receipt now; the rows are written later by the flusher thread
+    received_at = timezone.now()
+    for reading in readings:
+        reading['timestamp'] = received_at
+    if not get_water_buffer().offer(readings):
+        response = TimedJsonResponse({'status': 'error', 'message': 'Ingestion queue is full. Retry shortly.'}, status=429)
+        response['Retry-After'] = '1'
+        return response
+    return TimedJsonResponse({'status': 'accepted', 'message': f'{len(readings)} water quality reading(s) queued.', 'queued': len(readings)}, status=202)
 
-# core/views.py (add at the end)
 
 @login_required
+def ingest_buffer_status_api(request):
+    """Queue depth and flush statistics of this process's water ingestion buffer (staff only)."""
+    if not request.user.is_staff:
+        return TimedJsonResponse({'status': 'error', 'message': 'Not authorized.'}, status=403)
+    return TimedJsonResponse({
+        'enabled': getattr(settings, 'WATER_INGEST_BUFFERED', False),
+        **get_water_buffer().metrics(),
+    })
+
+# core/views.py (add at the end)
+
 def session_status_api(request):
     """
     A simple API to report the current user's authentication status and role.
+    The role is stored in the session at login, so a heartbeat only reads the session
+    (from the cache with the cached_db engine) and never loads the user.
     """
-    return JsonResponse({
+    if SESSION_KEY not in request.session:
+        return TimedJsonResponse({'authenticated': False, 'role': None}, status=403)
+    role = request.session.get(SESSION_ROLE_KEY)
+    if role is None:
+        # Sessions from before the role was stored: look it up once and keep it
+        if not request.user.is_authenticated:
+            return TimedJsonResponse({'authenticated': False, 'role': None}, status=403)
+        role = request.session[SESSION_ROLE_KEY] = request.user.role
+    return TimedJsonResponse({
         'authenticated': True,
-        'role': request.user.role
-    })
\ No newline at end of file
+        'role': role
+    })
+
+
+def villages_api(request):
+    """
+    The village registry as JSON. The simulator and other clients read the village list
+    from here instead of keeping their own copy.
+    """
+    return TimedJsonResponse({'villages': list(get_villages().values())})
+
+
+def _nearby_params(request):
+    """Reads the centre (lat and lng, or village) and the query (radius_km or k) from the query string."""
+    if 'village' in request.GET:
+        village = get_village(request.GET['village'])
+        if village is None:
+            raise ValueError(f"Unknown village '{request.GET['village']}'.")
+        lat, lng = village['lat'], village['lng']
+    else:
+        try:
+            lat, lng = float(request.GET['lat']), float(request.GET['lng'])
+        except (KeyError, ValueError):
+            raise ValueError("Give either 'village' or numeric 'lat' and 'lng'.")
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            raise ValueError("'lat' and 'lng' are out of range.")
+    try:
+        radius_km = float(request.GET['radius_km']) if 'radius_km' in request.GET else None
+        k = int(request.GET['k']) if 'k' in request.GET else None
+    except ValueError:
+        raise ValueError("'radius_km' must be a number and 'k' an integer.")
+    if (radius_km is None) == (k is None):
+        raise ValueError("Give exactly one of 'radius_km' or 'k'.")
+    if radius_km is not None and not 0 < radius_km <= 1000:
+        raise ValueError("'radius_km' must be between 0 and 1000.")
+    if k is not None and not 0 < k <= 100:
+        raise ValueError("'k' must be between 1 and 100.")
+    return lat, lng, radius_km, k
+
+
+def villages_nearby_api(request):
+    """
+    Villages near a point, nearest first, from the in-process spatial index.
+    Query parameters: village (an id) or lat and lng for the centre, then either radius_km
+    ("villages within R km") or k ("the k nearest"). With sensors=1 only villages whose water
+    sensor has reported are returned, with the time of their latest reading.
+    """
+    try:
+        lat, lng, radius_km, k = _nearby_params(request)
+    except ValueError as e:
+        return TimedJsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    index = get_spatial_index()
+    sensors = request.GET.get('sensors') == '1'
+    last_readings = dict(LatestWaterReading.objects.values_list('village', 'timestamp')) if sensors else None
+    if radius_km is not None:
+        found = index.within(lat, lng, radius_km)
+        if sensors:
+            found = [item for item in found if item[0] in last_readings]
+    else:
+        found = index.nearest(lat, lng, k, allowed=last_readings)
+
+    villages = get_villages()
+    results = []
+    for village_id, distance in found:
+        entry = {**villages[village_id], 'distance_km': round(distance, 3)}
+        if sensors:
+            entry['last_reading'] = last_readings[village_id].isoformat()
+        results.append(entry)
+    return TimedJsonResponse({'lat': lat, 'lng': lng, 'villages': results})
+
+
+def _history_params(request):
+    """Reads village, start, end (ISO 8601, default: the last 7 days) and resolution from the query string."""
+    village = request.GET.get('village')
+    if get_village(village) is None:
+        raise ValueError(f"Unknown village '{village}'.")
+    resolution = request.GET.get('resolution', 'hour')
+    if resolution not in RESOLUTIONS:
+        raise ValueError("'resolution' must be 'hour' or 'day'.")
+    start, end = _history_range(request)
+    return village, start, end, resolution
+
+
+def _history_range(request):
+    """Reads start and end (ISO 8601, default: the last 7 days) from the query string."""
+    end = parse_datetime(request.GET['end']) if 'end' in request.GET else timezone.now()
+    start = parse_datetime(request.GET['start']) if 'start' in request.GET else end - timedelta(days=7)
+    if start is None or end is None:
+        raise ValueError("'start' and 'end' must be ISO 8601 dates and times.")
+    if timezone.is_naive(start):
+        start = timezone.make_aware(start)
+    if timezone.is_naive(end):
+        end = timezone.make_aware(end)
+    return start, end
+
+
+@login_required
+@reads_from_replica
+def water_history_api(request):
+    """Hourly or daily pH and turbidity for one village, read from summaries and raw readings."""
+    if request.user.role != 'official':
+        return TimedJsonResponse({'status': 'error', 'message': 'Not authorized.'}, status=403)
+    try:
+        village, start, end, resolution = _history_params(request)
+    except ValueError as e:
+        return TimedJsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    return TimedJsonResponse({
+        'village': village,
+        'resolution': resolution,
+        'points': water_quality_history(village, start, end, resolution),
+    })
+
+
+@login_required
+@reads_from_replica
+def water_series_api(request):
+    """
+    pH and turbidity series for several villages, bucketed in the database.
+    Query parameters: villages (comma-separated ids, default all), start, end, interval
+    (5min, 15min, 30min, hour or day), limit (buckets per page) and cursor (from the previous page's 'next').
+    """
+    if request.user.role != 'official':
+        return TimedJsonResponse({'status': 'error', 'message': 'Not authorized.'}, status=403)
+    max_points = getattr(settings, 'HISTORY_SERIES_MAX_POINTS', 5000)
+    try:
+        start, end = _history_range(request)
+        interval = request.GET.get('interval', 'hour')
+        if interval not in INTERVALS:
+            raise ValueError(f"'interval' must be one of {', '.join(INTERVALS)}.")
+        registry = get_villages()
+        villages = [v for v in request.GET.get('villages', '').split(',') if v] or sorted(registry)
+        unknown = [v for v in villages if v not in registry]
+        if unknown:
+            raise ValueError(f"Unknown village '{unknown[0]}'.")
+        limit = int(request.GET.get('limit', 1000))
+        if not 1 <= limit <= max_points:
+            raise ValueError(f"'limit' must be between 1 and {max_points}.")
+        after = decode_cursor(request.GET['cursor']) if 'cursor' in request.GET else None
+    except ValueError as e:
+        return TimedJsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    series, next_cursor = water_quality_series(villages, start, end, interval, after, limit)
+    return TimedJsonResponse({'interval': interval, 'series': series, 'next': next_cursor})
+
+
+@login_required
+def export_reports_api(request, kind):
+    """
+    Streams raw health or water quality reports as CSV or NDJSON (officials only).
+    Query parameters: format (csv or ndjson), villages (comma-separated ids), start and end (ISO 8601).
+    """
+    if request.user.role != 'official':
+        return TimedJsonResponse({'status': 'error', 'message': 'Not authorized.'}, status=403)
+    if kind not in EXPORTS:
+        return TimedJsonResponse({'status': 'error', 'message': f"Unknown export '{kind}'."}, status=404)
+    fmt = request.GET.get('format', 'csv')
+    try:
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"'format' must be one of {', '.join(EXPORT_FORMATS)}.")
+        villages = [v for v in request.GET.get('villages', '').split(',') if v]
+        start = parse_export_time(request.GET['start'], 'start') if 'start' in request.GET else None
+        end = parse_export_time(request.GET['end'], 'end') if 'end' in request.GET else None
+    except ValueError as e:
+        return TimedJsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    # Rows are fetched while the response streams, after this view has returned, so pick the database now
+    queryset = export_queryset(kind, villages, start, end).using(read_alias())
+    response = StreamingHttpResponse(iter_export(kind, fmt, queryset), content_type=EXPORT_FORMATS[fmt])
+    filename = f"aquaalert-{kind}-{timezone.now():%Y%m%d-%H%M}.{fmt}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+@login_required
+@reads_from_replica
+def case_history_api(request):
+    """Hourly or daily case counts and symptom tallies for one village, read from summaries and raw reports."""
+    if request.user.role != 'official':
+        return TimedJsonResponse({'status': 'error', 'message': 'Not authorized.'}, status=403)
+    try:
+        village, start, end, resolution = _history_params(request)
+    except ValueError as e:
+        return TimedJsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    return TimedJsonResponse({
+        'village': village,
+        'resolution': resolution,
+        'points': case_history(village, start, end, resolution),
+    })
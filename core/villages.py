@@ -0,0 +1,61 @@
+# core/villages.py
+# Process-wide cache of the village registry.
+# The Village table is loaded once per process and then served from memory, so the dashboard
+# and ingestion validation get O(1) lookups without a query. Saving or deleting a Village
+# bumps a generation number in the cache, which makes every process sharing that cache reload
+# it. With a process-local cache (the default LocMemCache) only the process that made the change
+# reloads, and other worker processes keep their copy until they restart; see core.checks.
+# Each get_villages() call reads the generation from the cache, so code validating a batch
+# should look the registry up once and reuse it rather than calling get_village() per item.
+
+from django.core.cache import cache
+
+REGISTRY_GENERATION_KEY = 'aquaalert:village-registry-generation'
+
+_registry = {'generation': None, 'villages': None, 'by_code': None}
+
+
+def _load():
+    from .models import Village
+    return {
+        village.id: {
+            'id': village.id,
+            'name': village.name,
+            'lat': village.latitude,
+            'lng': village.longitude,
+            'region': village.region,
+            'code': village.code,
+        }
+        for village in Village.objects.all()
+    }
+
+
+def get_villages():
+    """Returns {village_id: {'id', 'name', 'lat', 'lng', 'region', 'code'}} for every registered village."""
+    generation = cache.get(REGISTRY_GENERATION_KEY, 0)
+    if _registry['villages'] is None or _registry['generation'] != generation:
+        villages = _load()
+        _registry['by_code'] = {village['code']: village for village in villages.values() if village['code'] is not None}
+        _registry['villages'] = villages
+        _registry['generation'] = generation
+    return _registry['villages']
+
+
+def get_village(village_id):
+    """Returns the registry entry for one village, or None if it is not registered."""
+    return get_villages().get(village_id)
+
+
+def get_villages_by_code():
+    """Returns {code: registry entry} for the villages that have a binary format code."""
+    get_villages()
+    return _registry['by_code']
+
+
+def invalidate_villages():
+    """Drops this process's copy and tells every process sharing the cache to reload on its next lookup."""
+    _registry['villages'] = None
+    try:
+        cache.incr(REGISTRY_GENERATION_KEY)
+    except ValueError:
+        cache.set(REGISTRY_GENERATION_KEY, 1, timeout=None)
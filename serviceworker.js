@@ -1,6 +1,6 @@
 // serviceworker.js (Updated Code)
 
-const CACHE_NAME = 'aquaalert-v2'; // Increment the version to trigger an update
+const CACHE_NAME = 'aquaalert-v5'; // Increment the version to trigger an update
 const urlsToCache = [
     '/',
     '/static/css/style.css',
@@ -7,24 +7,80 @@ import time
 import schedule
 from datetime import datetime, timedelta
 import os
+from urllib.parse import urljoin
+import argparse
+import asyncio
+import subprocess
+import sys
+from collections import Counter
+
+from core import binary_format
+
+try:
+    import httpx # Only needed for the --async load mode
+except ImportError:
+    httpx = None
 
 # --- CONFIGURATION ---
 # The URL will be provided by an environment variable on Render
 API_URL = os.environ.get("WEB_SERVICE_URL")
+# The village registry served by the web app. Defaults to /api/villages/ on the same host as API_URL.
+VILLAGES_URL = os.environ.get("VILLAGES_URL") or (urljoin(API_URL, "/api/villages/") if API_URL else None)
 SIMULATION_INTERVAL_SECONDS = 10 # How often to send data for all villages
+# A batch the server pushes back on (429, its ingestion queue is full) is retried this many times in all
+MAX_SEND_ATTEMPTS = 3
+# 'json' sends a JSON array per tick; 'binary' sends the packed format from core/binary_format.py
+PAYLOAD_FORMAT = os.environ.get("SENSOR_PAYLOAD_FORMAT", "json")
+# Only used when the village registry can't be reached
 VILLAGES = [
     'mawlynnong_meghalaya', 'ziro_arunachal', 'majuli_assam',
     'khonoma_nagaland', 'moirang_manipur', 'pelling_sikkim',
     'champhai_mizoram', 'unakoti_tripura'
 ]
 
+# One keep-alive session for the whole run, so every tick reuses the same pooled connection
+session = requests.Session()
+session.headers.update({'Content-Type': 'application/json'})
+
+# Village id -> numeric code for the binary format. The built-in villages were numbered in id order.
+village_codes = {village: code for code, village in enumerate(sorted(VILLAGES), start=1)}
+
+def load_villages():
+    """Reads the village ids (and binary codes) from the web app's registry, falling back to the built-in list."""
+    if VILLAGES_URL:
+        try:
+            response = session.get(VILLAGES_URL, timeout=10)
+            response.raise_for_status()
+            villages = response.json()["villages"]
+            village_codes.clear()
+            village_codes.update({village["id"]: village.get("code") for village in villages if village.get("code")})
+            return [village["id"] for village in villages]
+        except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+            print(f"⚠️ Could not load villages from {VILLAGES_URL} ({e}). Using the built-in list.")
+    return list(VILLAGES)
+
+def encode_batch(readings):
+    """Returns (body, content_type) for a batch in the configured PAYLOAD_FORMAT."""
+    if PAYLOAD_FORMAT == "binary":
+        missing = sorted({reading["village"] for reading in readings} - village_codes.keys())
+        if not missing:
+            return binary_format.encode_readings(readings, village_codes), binary_format.CONTENT_TYPE
+        print(f"  ⚠️ No binary code for {', '.join(missing)}; sending this batch as JSON.")
+    return json.dumps(readings).encode(), "application/json"
+
 # --- STATE MANAGEMENT (THE "MEMORY") ---
 village_states = {}
-for village in VILLAGES:
-    village_states[village] = {
-        "status": "normal",
-        "contaminated_until": None
-    }
+
+def init_village_states(villages):
+    """Starts every village in the "normal" state."""
+    village_states.clear()
+    for village in villages:
+        village_states[village] = {
+            "status": "normal",
+            "contaminated_until": None
+        }
+
+init_village_states(VILLAGES)
 
 def update_village_states():
     """
@@ -75,43 +131,216 @@ def generate_water_data(village, status):
 
     return { "village": village, "ph": ph, "turbidity": turbidity, "contaminants": contaminants }
 
+def post_batch(body, content_type):
+    """
+    Posts one batch. Any 2xx counts as delivered (the buffered ingestion path answers 202). A 429
+    is retried after the server's Retry-After, backing off further each time. Returns the last response.
+    """
+    for attempt in range(1, MAX_SEND_ATTEMPTS + 1):
+        response = session.post(API_URL, data=body, headers={'Content-Type': content_type})
+        if response.status_code != 429 or attempt == MAX_SEND_ATTEMPTS:
+            return response
+        try:
+            delay = float(response.headers.get('Retry-After', 1))
+        except ValueError:
+            delay = 1.0
+        print(f"  ⏳ Server busy (429), retrying in {delay * attempt:.0f}s...")
+        time.sleep(delay * attempt)
+
 def send_all_village_data():
     """
-    Updates states, then generates and sends data for ALL villages.
+    Updates states, then generates data for ALL villages and sends it as one batch.
     """
     print("--- Sending new batch of sensor data ---")
     update_village_states()
 
+    batch = []
     for village, state in village_states.items():
         # For the demo, Majuli's status is forced inside generate_water_data
         current_status = 'contaminated' if village == 'majuli_assam' else state["status"]
-        data = generate_water_data(village, current_status)
-        
-        try:
-            # Check if API_URL is set before trying to post
-            if API_URL:
-                requests.post(API_URL, data=json.dumps(data), headers={'Content-Type': 'application/json'})
-            else:
-                print("  ⚠️ API_URL not set. Skipping send.")
-                
-            status_emoji = "🔴" if current_status == "contaminated" else "🟢"
-            # Add a special emoji for the demo village
-            if village == 'majuli_assam':
-                status_emoji = "🔴 (DEMO)"
-            
-            print(f"  {status_emoji} Sent data for {village}: Turbidity={data['turbidity']:.2f}")
-        
-        except requests.exceptions.RequestException as e:
-            print(f"  ❌ Connection Error for {village}: {e}")
-            # Continue to the next village instead of stopping the whole batch
-            continue 
+        batch.append((village, current_status, generate_water_data(village, current_status)))
+
+    readings = [data for _, _, data in batch]
+    body, content_type = encode_batch(readings)
+    json_size = len(json.dumps(readings).encode())
+    print(f"  📦 {PAYLOAD_FORMAT} payload: {len(body)} bytes (JSON: {json_size} bytes, {len(body) / json_size:.0%})")
+
+    try:
+        # Check if API_URL is set before trying to post
+        if API_URL:
+            response = post_batch(body, content_type)
+            if not 200 <= response.status_code < 300:
+                print(f"  ❌ Batch rejected ({response.status_code}): {response.text}")
+                return
+        else:
+            print("  ⚠️ API_URL not set. Skipping send.")
+    except requests.exceptions.RequestException as e:
+        print(f"  ❌ Connection Error: {e}")
+        return
+
+    for village, current_status, data in batch:
+        status_emoji = "🔴" if current_status == "contaminated" else "🟢"
+        # Add a special emoji for the demo village
+        if village == 'majuli_assam':
+            status_emoji = "🔴 (DEMO)"
+
+        print(f"  {status_emoji} Sent data for {village}: Turbidity={data['turbidity']:.2f}")
     print("-------------------------------------------\n")
 
 
+# --- ASYNC LOAD MODE ---
+# `python simulator.py --async` simulates many sensors at once for capacity testing. Every sensor
+# belongs to a village, sends its own readings at its own rate and shares the village's
+# contamination state. All requests go through one pooled httpx client, with a cap on how
+# many are in flight, and the run ends with throughput and latency percentiles.
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+class LoadStats:
+    def __init__(self):
+        self.latencies = []
+        self.statuses = Counter()
+        self.errors = 0
+
+    def record(self, seconds, status_code):
+        self.latencies.append(seconds)
+        self.statuses[status_code] += 1
+
+    def summary(self, elapsed):
+        sent = len(self.latencies) + self.errors
+        lines = [
+            f"Requests: {sent} in {elapsed:.1f}s ({sent / elapsed:.1f}/s), connection errors: {self.errors}",
+            "Status codes: " + ", ".join(f"{code}={count}" for code, count in sorted(self.statuses.items())),
+        ]
+        if self.latencies:
+            lines.append(
+                "Latency ms: " + ", ".join(
+                    f"p{pct}={percentile(self.latencies, pct) * 1000:.1f}" for pct in (50, 95, 99)
+                ) + f", max={max(self.latencies) * 1000:.1f}"
+            )
+        return "\n".join(lines)
+
+async def run_sensor(client, url, village, rate, semaphore, stats, stop_at):
+    """Sends one reading every 1/rate seconds until stop_at."""
+    interval = 1.0 / rate
+    next_at = time.monotonic() + random.uniform(0, interval) # Spread the sensors' first readings out
+    # A sensor that falls behind (server too slow) sends straight away, but never past stop_at
+    while next_at < stop_at and time.monotonic() < stop_at:
+        await asyncio.sleep(max(0.0, next_at - time.monotonic()))
+        next_at += interval
+        status = "contaminated" if village == "majuli_assam" else village_states[village]["status"]
+        body, content_type = encode_batch([generate_water_data(village, status)])
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                response = await client.post(url, content=body, headers={"Content-Type": content_type})
+            except httpx.HTTPError:
+                stats.errors += 1
+                continue
+            stats.record(time.perf_counter() - started, response.status_code)
+
+async def update_states_periodically(stop_at):
+    while time.monotonic() < stop_at:
+        update_village_states()
+        await asyncio.sleep(min(SIMULATION_INTERVAL_SECONDS, max(0.0, stop_at - time.monotonic())))
+
+async def report_progress(stats, started):
+    while True:
+        await asyncio.sleep(5)
+        elapsed = time.monotonic() - started
+        print(f"  ⏱️ {elapsed:.0f}s: {len(stats.latencies)} responses ({len(stats.latencies) / elapsed:.1f}/s), {stats.errors} errors")
+
+async def run_load(url, villages, sensors, rate, duration, concurrency):
+    init_village_states(villages)
+    stats = LoadStats()
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    started = time.monotonic()
+    stop_at = started + duration
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        reporter = asyncio.create_task(report_progress(stats, started))
+        # Each sensor gets its own rate, within ±50% of the requested one
+        await asyncio.gather(
+            update_states_periodically(stop_at),
+            *(
+                run_sensor(client, url, villages[i % len(villages)], rate * random.uniform(0.5, 1.5), semaphore, stats, stop_at)
+                for i in range(sensors)
+            ),
+        )
+        reporter.cancel()
+    print("--- Load test results ---")
+    print(stats.summary(time.monotonic() - started))
+
+def start_local_server(port):
+    """Starts `manage.py runserver` on 127.0.0.1:port and waits until it answers. Returns the process."""
+    env = dict(os.environ, ALLOWED_HOSTS="127.0.0.1,localhost")
+    process = subprocess.Popen(
+        [sys.executable, "manage.py", "runserver", "--noreload", f"127.0.0.1:{port}"],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"The local server exited with code {process.returncode}.")
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/api/villages/", timeout=1).status_code == 200:
+                return process
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(0.5)
+    process.terminate()
+    raise SystemExit("The local server did not answer within 30 seconds. Did you run `manage.py migrate`?")
+
+def main_async(args):
+    global API_URL, VILLAGES_URL
+    if httpx is None:
+        raise SystemExit("The --async mode needs httpx (pip install httpx).")
+    server = None
+    if args.local:
+        server = start_local_server(args.port)
+        API_URL = f"http://127.0.0.1:{args.port}/api/water-quality/"
+        VILLAGES_URL = f"http://127.0.0.1:{args.port}/api/villages/"
+    if not API_URL:
+        raise SystemExit("Set WEB_SERVICE_URL or use --local.")
+    try:
+        villages = load_villages()
+        if args.villages:
+            villages = villages[:args.villages]
+        print(f"Simulating {args.sensors} sensors across {len(villages)} villages for {args.duration}s "
+              f"(~{args.sensors * args.rate:.0f} requests/s offered, at most {args.concurrency} in flight, {PAYLOAD_FORMAT} payloads).")
+        asyncio.run(run_load(API_URL, villages, args.sensors, args.rate, args.duration, args.concurrency))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulates IoT water quality sensors.")
+    parser.add_argument("--async", dest="async_mode", action="store_true", help="High-scale load mode using asyncio and httpx.")
+    parser.add_argument("--sensors", type=int, default=100, help="--async: number of simulated sensors.")
+    parser.add_argument("--villages", type=int, help="--async: spread the sensors over only this many villages.")
+    parser.add_argument("--rate", type=float, default=1.0, help="--async: average readings per second per sensor.")
+    parser.add_argument("--duration", type=float, default=60, help="--async: seconds to run for.")
+    parser.add_argument("--concurrency", type=int, default=50, help="--async: most requests in flight at once.")
+    parser.add_argument("--local", action="store_true", help="--async: start a local dev server (manage.py runserver) and target it.")
+    parser.add_argument("--port", type=int, default=8765, help="--local: port for the dev server.")
+    args = parser.parse_args()
+    if args.async_mode:
+        main_async(args)
+        sys.exit(0)
+
     print("Starting Stateful IoT Water Quality Simulator...")
     if not API_URL:
         print("WARNING: WEB_SERVICE_URL environment variable is not set. Simulator will run but not send data.")
+    init_village_states(load_villages())
+    print(f"Simulating {len(village_states)} villages.")
+    print(f"Sending {PAYLOAD_FORMAT} payloads.")
     print(f"Sending data for all villages every {SIMULATION_INTERVAL_SECONDS} seconds.")
     print("Press CTRL+C to stop.")
     
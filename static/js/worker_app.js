@@ -11,10 +11,12 @@ document.addEventListener('DOMContentLoaded', () => {
     const reportForm = document.getElementById('report-form');
     const syncStatus = document.getElementById('sync-status');
     const dbName = 'aquaalertDB';
+    // The server accepts at most HEALTH_REPORT_MAX_BATCH (500) reports per sync request
+    const SYNC_BATCH_SIZE = 500;
     let db;
 
     // 1. Open the IndexedDB database
-    const request = indexedDB.open(dbName, 1);
+    const request = indexedDB.open(dbName, 2);
 
     request.onerror = (event) => {
         console.error("Database error: " + event.target.errorCode);
@@ -22,8 +24,14 @@ document.addEventListener('DOMContentLoaded', () => {
 
     request.onupgradeneeded = (event) => {
         db = event.target.result;
-        const objectStore = db.createObjectStore("offlineReports", { keyPath: "id", autoIncrement:true });
-        console.log("Object store created.");
+        if (!db.objectStoreNames.contains("offlineReports")) {
+            db.createObjectStore("offlineReports", { keyPath: "id", autoIncrement:true });
+        }
+        // Reports the server rejected are parked here instead of being retried forever
+        if (!db.objectStoreNames.contains("rejectedReports")) {
+            db.createObjectStore("rejectedReports", { keyPath: "id" });
+        }
+        console.log("Object stores ready.");
     };
 
     request.onsuccess = (event) => {
@@ -46,7 +54,8 @@ document.addEventListener('DOMContentLoaded', () => {
             return;
         }
 
-        const report = { village, ageGroup, symptoms, timestamp: new Date().toISOString() };
+        // clientId lets the server recognise this report if it is ever sent twice
+        const report = { clientId: generateClientId(), village, ageGroup, symptoms, timestamp: new Date().toISOString() };
 
         // Check if online
         if (navigator.onLine) {
@@ -57,9 +66,24 @@ document.addEventListener('DOMContentLoaded', () => {
         reportForm.reset();
     });
 
+    function generateClientId() {
+        if (window.crypto && crypto.randomUUID) {
+            return crypto.randomUUID();
+        }
+        // Fallback for older browsers: a random version 4 UUID
+        return 'xxxxxxxx-xxxx-4xxx-yxxx-xxxxxxxxxxxx'.replace(/[xy]/g, c => {
+            const r = Math.random() * 16 | 0;
+            return (c === 'x' ? r : (r & 0x3 | 0x8)).toString(16);
+        });
+    }
+
+    function getCsrfToken() {
+        return document.querySelector('[name=csrfmiddlewaretoken]').value;
+    }
+
     // 3. Function to send data to the server
     function sendReportToServer(report) {
-        const csrfToken = document.querySelector('[name=csrfmiddlewaretoken]').value;
+        const csrfToken = getCsrfToken();
         fetch('/api/submit-report/', {
             method: 'POST',
             headers: {
@@ -99,30 +123,96 @@ document.addEventListener('DOMContentLoaded', () => {
     }
 
     // 5. Function to sync all offline data
+    // The queue goes to the server in batches of up to SYNC_BATCH_SIZE, one after another. Each
+    // report is only removed from IndexedDB once the server has acknowledged its clientId, so
+    // nothing is lost if the connection drops mid-sync, and replays are ignored by the server.
+    // Reports the server rejects as invalid are moved to the rejectedReports store.
     function syncOfflineReports() {
         if (!navigator.onLine) return;
 
-        const transaction = db.transaction(["offlineReports"], "readwrite");
+        const transaction = db.transaction(["offlineReports"], "readonly");
         const objectStore = transaction.objectStore("offlineReports");
         const getAllRequest = objectStore.getAll();
 
         getAllRequest.onsuccess = () => {
             const reports = getAllRequest.result;
-            if (reports.length > 0) {
-                updateSyncStatus(`Syncing ${reports.length} offline report(s)...`, 'syncing');
-                reports.forEach(report => {
-                    sendReportToServer(report);
-                    // On successful send, we should remove it from IndexedDB
-                    // A more robust implementation would wait for server confirmation before deleting.
-                    objectStore.delete(report.id);
-                });
-                updateSyncStatus('All offline reports have been synced!', 'success');
-            } else {
+            if (reports.length === 0) {
                 updateSyncStatus('App is up to date.', 'success');
+                return;
+            }
+            updateSyncStatus(`Syncing ${reports.length} offline report(s)...`, 'syncing');
+
+            // Reports queued by older versions of the app have no clientId yet
+            reports.forEach(report => {
+                if (!report.clientId) {
+                    report.clientId = generateClientId();
+                    db.transaction(["offlineReports"], "readwrite").objectStore("offlineReports").put(report);
+                }
+            });
+
+            const batches = [];
+            for (let i = 0; i < reports.length; i += SYNC_BATCH_SIZE) {
+                batches.push(reports.slice(i, i + SYNC_BATCH_SIZE));
             }
+            let synced = 0;
+            let rejected = 0;
+            batches.reduce((previous, batch) => previous.then(() => sendBatch(batch).then(result => {
+                synced += result.synced;
+                rejected += result.rejected;
+            })), Promise.resolve())
+            .then(() => {
+                if (rejected > 0) {
+                    updateSyncStatus(`${synced} report(s) synced, ${rejected} could not be accepted.`, 'error');
+                } else {
+                    updateSyncStatus('All offline reports have been synced!', 'success');
+                }
+            })
+            .catch(error => {
+                console.error('Sync Error:', error);
+                updateSyncStatus('Sync failed. Reports are kept and will be retried.', 'offline');
+            });
         };
     }
 
+    function sendBatch(reports) {
+        return fetch('/api/submit-reports/', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': getCsrfToken(),
+            },
+            body: JSON.stringify({ reports })
+        })
+        .then(response => response.json())
+        .then(data => {
+            if (data.status !== 'success') {
+                throw new Error(data.message);
+            }
+            return settleReports(reports, data.acknowledged, data.rejected);
+        });
+    }
+
+    // Deletes the acknowledged reports from the queue and parks the rejected ones
+    function settleReports(reports, acknowledged, rejected) {
+        const acknowledgedIds = new Set(acknowledged);
+        const errors = new Map(rejected.map(item => [item.clientId, item.message]));
+        const transaction = db.transaction(["offlineReports", "rejectedReports"], "readwrite");
+        const queue = transaction.objectStore("offlineReports");
+        const parked = transaction.objectStore("rejectedReports");
+        reports.forEach(report => {
+            if (acknowledgedIds.has(report.clientId)) {
+                queue.delete(report.id);
+            } else if (errors.has(report.clientId)) {
+                parked.put({ ...report, error: errors.get(report.clientId) });
+                queue.delete(report.id);
+            }
+        });
+        return new Promise((resolve, reject) => {
+            transaction.oncomplete = () => resolve({ synced: acknowledgedIds.size, rejected: errors.size });
+            transaction.onerror = () => reject(transaction.error);
+        });
+    }
+
     function updateSyncStatus(message, type) {
         syncStatus.textContent = message;
         syncStatus.className = `status-${type}`; // for styling